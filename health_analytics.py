@@ -0,0 +1,240 @@
+"""Rolling averages, goal streaks, week-over-week deltas and trend slopes for the logs.
+
+Everything comes out of ordered walks over the (profile_id, date, value)
+covering index, merged with the profile's archive file when it has one; rows
+are streamed, never collected into lists. Goal hits compare each day with the
+goal in effect that day (health_db measurements), walked alongside the rows.
+Only the last TREND_DAYS days are read on each call: the goal-streak state
+before them (entries, current run, best run) is carried over from the previous
+call through the cache, so a save costs a window's worth of rows, not the
+whole history. Results are cached per profile and kind; the cache key includes
+the goals and the day, and writers call CACHE.invalidate() after saving logs
+(with the day saved, so only a backdated edit throws the streak state away).
+"""
+import calendar
+import copy
+import threading
+from datetime import date, timedelta
+
+import health_archive
+import health_db
+
+WINDOWS = (7, 30, 90)
+TREND_DAYS = 90
+JD_OFFSET = 1721424   # date.toordinal() + JD_OFFSET == int(julianday(date))
+
+class _Streaks:
+    """Goal-hit runs and the entry count, carried over the logged days in date order."""
+    def __init__(self, changes, goal):
+        self.changes = changes; self.nxt = 1
+        self.day_goal = changes[0][1] if changes else goal
+        self.entries = self.run = self.best = 0; self.last_hit = None
+
+    def add(self, day, value):
+        """Count one (julian day, value); returns whether it met that day's goal."""
+        self.entries += 1
+        while self.nxt < len(self.changes) and self.changes[self.nxt][0] <= day:
+            self.day_goal = self.changes[self.nxt][1]; self.nxt += 1
+        hit = self.day_goal is not None and value >= self.day_goal
+        if hit:
+            self.run = self.run + 1 if self.last_hit == day - 1 else 1
+            self.last_hit = day
+            if self.run > self.best: self.best = self.run
+        else:
+            self.run = 0; self.last_hit = None
+        return hit
+
+def _log_rows(conn, profile_id, kind, first, last, exclude_flagged):
+    """(julian day, value) of the logged days from `first` (None: the start) to `last`, archive merged in."""
+    table, col = health_db.LOG_TABLES[kind]
+    skip = f" AND date NOT IN ({health_db.flagged_days_sql(kind)})" if exclude_flagged else ""
+    params = (profile_id, first.isoformat() if first else '', last.isoformat()) + ((profile_id,) if exclude_flagged else ())
+    cur = conn.execute(f"SELECT CAST(julianday(date) AS INTEGER), {col} FROM {table} WHERE profile_id=? AND date >= ? AND date <= ? "
+                       f"AND {col} IS NOT NULL AND julianday(date) IS NOT NULL{skip} ORDER BY date;", params)
+    archive = health_archive.open_archive(health_archive.archive_folder(conn), profile_id, kind)
+    if archive is None: return cur
+    # cold history first, live rows win on the same day
+    archived = ((d + JD_OFFSET, v) for d, v in archive.between(first.toordinal() if first else 1, last.toordinal()))
+    return health_archive.merge_rows(archived, cur)
+
+def log_analytics(conn, profile_id, kind, goal, as_of=None, timeline=None, exclude_flagged=False):
+    """Summary of one log up to `as_of` (default today), as a dict:
+
+    mean_7 / mean_30 / mean_90: average of the logged days in each window (None if empty)
+    streak / best_streak: consecutive days at or above goal (current streak counts if
+        the last hit was today or yesterday) and the longest ever
+    hits_30 / days_30: days at or above goal among the days logged in the last 30
+    week / prev_week / wow_delta / wow_pct: 7-day means and the change between them
+    slope: least-squares trend over the last TREND_DAYS days, in units per day
+
+    timeline: goal_timeline() output; each day is then held to the goal in effect
+    that day instead of `goal` (which is still reported as the current goal).
+    exclude_flagged: skip live days health_quality flagged (counted in 'excluded').
+    """
+    return _analytics(conn, profile_id, kind, goal, as_of, timeline, exclude_flagged)[0]
+
+def _analytics(conn, profile_id, kind, goal, as_of=None, timeline=None, exclude_flagged=False, history=None):
+    """log_analytics() plus the streak state before the trend window, (last day ordinal, _Streaks).
+
+    Given that state from an earlier call (same goals), only the days after it are
+    read: the trend window, and whatever fell out of it since.
+    """
+    table, col = health_db.LOG_TABLES[kind]
+    as_of = as_of or date.today()
+    end = as_of.toordinal() + JD_OFFSET
+    start = as_of - timedelta(days=TREND_DAYS - 1); edge = start.toordinal() - 1
+    if history is not None and history[0] <= edge:
+        state = copy.copy(history[1]); since = date.fromordinal(history[0] + 1)
+    else:
+        state = _Streaks([(d + JD_OFFSET, g) for d, g in timeline or ()], goal); since = None
+    for day, value in _log_rows(conn, profile_id, kind, since, date.fromordinal(edge), exclude_flagged):
+        state.add(day, value)
+    history = (edge, copy.copy(state))
+    sums = {w: [0, 0] for w in WINDOWS}; prev_week = [0, 0]; hits_30 = 0
+    n = sx = sy = sxx = sxy = 0
+    for day, value in _log_rows(conn, profile_id, kind, start, as_of, exclude_flagged):
+        hit = state.add(day, value)
+        age = end - day
+        if hit and age < 30: hits_30 += 1
+        for w in WINDOWS:
+            if age < w: sums[w][0] += value; sums[w][1] += 1
+        if 7 <= age < 14: prev_week[0] += value; prev_week[1] += 1
+        x = TREND_DAYS - 1 - age
+        n += 1; sx += x; sy += value; sxx += x * x; sxy += x * value
+
+    mean = lambda s: s[0] / s[1] if s[1] else None
+    out = {'entries': state.entries, 'goal': goal, 'excluded': 0}
+    if exclude_flagged:
+        out['excluded'] = conn.execute(f"SELECT count(*) FROM {table} WHERE profile_id=? AND date <= ? AND {col} IS NOT NULL "
+                                       f"AND date IN ({health_db.flagged_days_sql(kind)});",
+                                       (profile_id, as_of.isoformat(), profile_id)).fetchone()[0]
+    for w in WINDOWS: out[f'mean_{w}'] = mean(sums[w])
+    out['streak'] = state.run if state.last_hit is not None and state.last_hit >= end - 1 else 0
+    out['best_streak'] = state.best
+    out['hits_30'] = hits_30; out['days_30'] = sums[30][1]
+    out['week'] = out['mean_7']; out['prev_week'] = mean(prev_week)
+    if out['week'] is not None and out['prev_week'] is not None:
+        out['wow_delta'] = out['week'] - out['prev_week']
+        out['wow_pct'] = out['wow_delta'] / out['prev_week'] * 100 if out['prev_week'] else None
+    else:
+        out['wow_delta'] = out['wow_pct'] = None
+    denom = n * sxx - sx * sx
+    out['slope'] = (n * sxy - sx * sy) / denom if n >= 2 and denom else None
+    return out, history
+
+def _goal_units(step_goal, water_l):
+    # water goals are stored in litres, the log in ml
+    return {'steps': step_goal, 'water': None if water_l is None else water_l * 1000}
+
+def goals_for(conn, profile_id):
+    """{kind: goal in log units} from the profile."""
+    row = conn.execute("SELECT step_goal, water_l FROM profiles WHERE id=?;", (profile_id,)).fetchone()
+    return _goal_units(*row) if row else None
+
+def goals_as_of(conn, profile_id, day):
+    """{kind: goal in log units} in effect on `day` (health_db.measurement_as_of), else from the profile."""
+    row = health_db.measurement_as_of(conn, profile_id, day)
+    return _goal_units(row[6], row[5]) if row else goals_for(conn, profile_id)
+
+def goals_by_day(conn, profile_id, kind, first, n):
+    """[goal in effect on each of the n days from `first`]: the as-of lookup for the first
+    day plus the changes inside the range, both on the (profile_id, measured_at) key."""
+    goal = (goals_as_of(conn, profile_id, first) or {}).get(kind); goals = [goal] * n
+    for measured_at, step_goal, water_l in conn.execute(
+            "SELECT measured_at, step_goal, water_l FROM measurements WHERE profile_id=? "
+            "AND measured_at >= date(?, '+1 day') AND measured_at < ? ORDER BY measured_at;",
+            (profile_id, first.isoformat(), (first + timedelta(days=n)).isoformat())):
+        try: i = (date.fromisoformat(measured_at[:10]) - first).days
+        except (TypeError, ValueError): continue
+        goal = _goal_units(step_goal, water_l)[kind]; goals[i:] = [goal] * (n - i)   # last change of the day wins
+    return goals
+
+def goal_timeline(conn, profile_id):
+    """{kind: ((first day ordinal, goal), ...)} from the measurements history, one entry per change.
+
+    The first entry also covers the days before it (history logged before the profile existed).
+    """
+    out = {kind: [] for kind in health_db.LOG_TABLES}
+    for measured_at, step_goal, water_l in conn.execute(
+            "SELECT measured_at, step_goal, water_l FROM measurements WHERE profile_id=? ORDER BY measured_at;", (profile_id,)):
+        try: start = date.fromisoformat(measured_at[:10]).toordinal()
+        except (TypeError, ValueError): continue
+        for kind, goal in _goal_units(step_goal, water_l).items():
+            changes = out[kind]
+            if changes and changes[-1][0] == start: changes[-1] = (start, goal)   # last change of the day wins
+            elif not changes or changes[-1][1] != goal: changes.append((start, goal))
+    return {kind: tuple(changes) for kind, changes in out.items()}
+
+def calendar_month(conn, profile_id, kind, year, month):
+    """([value or None per day of the month], [goal per day]) for the calendar heatmap.
+
+    One range query on the (profile_id, date) index, plus a binary search in the
+    archive file for months that were compacted; goals come from goals_by_day().
+    """
+    table, col = health_db.LOG_TABLES[kind]
+    first = date(year, month, 1); n = calendar.monthrange(year, month)[1]
+    values = [None] * n
+    archive = health_archive.open_archive(health_archive.archive_folder(conn), profile_id, kind)
+    if archive is not None:
+        for day, value in archive.between(first.toordinal(), first.toordinal() + n - 1):
+            values[day - first.toordinal()] = value
+    for day, value in conn.execute(f"SELECT date, {col} FROM {table} WHERE profile_id=? AND date >= ? AND date < ?;",
+                                   (profile_id, first.isoformat(), (first + timedelta(days=n)).isoformat())):
+        try: values[date.fromisoformat(day).day - 1] = value
+        except (TypeError, ValueError): continue
+    return values, goals_by_day(conn, profile_id, kind, first, n)
+
+class AnalyticsCache:
+    """Per (profile, kind) results, plus the streak state before the trend window so a
+    miss only reads the window; safe to use from the worker threads."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}; self._history = {}; self._generations = {}; self._epoch = 0   # clear() bumps the epoch
+        self.hits = 0; self.misses = 0
+
+    def get(self, conn, profile_id, kind, goal, as_of=None, timeline=None, exclude_flagged=False):
+        as_of = as_of or date.today()
+        key = (profile_id, kind); params = (goal, as_of, timeline, exclude_flagged); basis = (goal, timeline, exclude_flagged)
+        with self._lock:
+            entry = self._entries.get(key); gen = (self._epoch, self._generations.get(key, 0))
+            if entry is not None and entry[0] == params:
+                self.hits += 1; return entry[1]
+            self.misses += 1
+            kept = self._history.get(key)
+            history = kept[1] if kept is not None and kept[0] == basis else None
+        result, history = _analytics(conn, profile_id, kind, goal, as_of, timeline, exclude_flagged, history)
+        with self._lock:
+            # a write that landed while we were scanning makes this result stale
+            if (self._epoch, self._generations.get(key, 0)) == gen:
+                self._entries[key] = (params, result); self._history[key] = (basis, history)
+        return result
+
+    def invalidate(self, profile_id, kind=None, since=None, flagged=False):
+        """Drop results after a write. since: the earliest day written (ISO date), which
+        keeps streak state covering only earlier days; flagged: only health_quality
+        flags changed, which matters only to results that leave flagged days out."""
+        try: since = date.fromisoformat(since).toordinal() if since else None
+        except (TypeError, ValueError): since = None
+        with self._lock:
+            for k in ([kind] if kind else list(health_db.LOG_TABLES)):
+                key = (profile_id, k)
+                self._generations[key] = self._generations.get(key, 0) + 1
+                entry = self._entries.get(key)
+                if entry is not None and not (flagged and not entry[0][3]): del self._entries[key]
+                kept = self._history.get(key)
+                if kept is None or (flagged and not kept[0][2]): continue
+                if since is None or since <= kept[1][0]: del self._history[key]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1; self._entries.clear(); self._history.clear()
+
+CACHE = AnalyticsCache()
+
+def profile_analytics(conn, profile_id, as_of=None, cache=CACHE, exclude_flagged=False):
+    """{kind: log_analytics(...)} for both logs, through the cache; `goal` is the one in effect on as_of."""
+    goals = goals_as_of(conn, profile_id, as_of or date.today())
+    if goals is None: return None
+    timelines = goal_timeline(conn, profile_id)
+    return {kind: cache.get(conn, profile_id, kind, goals[kind], as_of, timelines[kind] or None, exclude_flagged)
+            for kind in health_db.LOG_TABLES}
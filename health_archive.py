@@ -0,0 +1,316 @@
+"""Columnar archive files for cold log history, one file per profile and kind.
+
+Layout (little-endian):
+    header  HEADER_FMT: magic b'HCOL', version, flags, row count, first day, last day
+    days    int32[count]   date.toordinal(), ascending
+    values  int32[count]   MISSING where the log row had no value
+
+Uncompressed files are read with numpy.memmap (or mmap + memoryview without
+numpy) so nothing is copied until it is used; FLAG_ZSTD files hold the two
+arrays as one zstd frame and are decompressed on open. Files sit next to the
+database in ARCHIVE_DIR and are rewritten atomically (temp file + os.replace).
+
+compact() moves rows older than a cutoff out of the live tables. The rollup
+triggers subtract the rows as they are deleted, compact() adds them back, so
+log_totals / log_rollups keep describing the whole history. Readers merge the
+archive with the live rows; a live row wins for a day present in both (a day
+re-entered after it was archived), and resolve_overlaps() takes the archived
+value of such a day out of the rollups (see health_db._m007_archive_overlaps).
+A compaction writes the new file next to the old one, commits the delete, then
+renames the file into place; log_archives.pending covers a crash in between.
+"""
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+from datetime import date, timedelta
+
+import health_db
+
+ARCHIVE_DIR = 'archive'
+MAGIC = b'HCOL'
+VERSION = 1
+FLAG_ZSTD = 1
+HEADER_FMT = '<4sHHIii8x'   # 32 bytes
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+MISSING = -2 ** 31          # int32 sentinel for NULL values
+INT32_MAX = 2 ** 31 - 1
+
+# numpy is optional and imported on first use (like health_metrics._have_numpy), so
+# the app, which reaches this module through health_db, starts without it.
+np = None
+_numpy_tried = False
+
+def _have_numpy():
+    global np, _numpy_tried
+    if not _numpy_tried:
+        _numpy_tried = True
+        try:
+            import numpy as np
+        except Exception:
+            np = None
+    return np is not None
+
+# zstandard is optional too and only needed for compressed files, so it is not
+# imported until the first one is written or opened
+zstandard = None
+_zstandard_tried = False
+
+def load_zstandard():
+    """The zstandard module, or None when it is not installed."""
+    global zstandard, _zstandard_tried
+    if not _zstandard_tried:
+        _zstandard_tried = True
+        try:
+            import zstandard
+        except Exception:
+            zstandard = None
+    return zstandard
+
+class ArchiveError(Exception):
+    """Raised for unreadable or foreign archive files."""
+
+def archive_path(folder, profile_id, kind):
+    return os.path.join(folder, ARCHIVE_DIR, f"{int(profile_id)}_{kind}.hcol")
+
+def archive_folder(conn):
+    """Folder of the connection's database file (archives live next to it), None for :memory:."""
+    path = health_db.db_file(conn)
+    return os.path.dirname(os.path.abspath(path)) if path else None
+
+# writing
+
+def write_archive(path, days, values, compress=False, keep_tmp=False):
+    """Write ascending day ordinals and int32 values (sequences or arrays) to `path` atomically.
+
+    keep_tmp leaves the file at path + '.tmp' for the caller to os.replace().
+    """
+    if compress and load_zstandard() is None:
+        raise ArchiveError("zstd compression needs the zstandard package (pip install zstandard)")
+    if _have_numpy():
+        d = np.asarray(days, dtype='<i4'); v = np.asarray(values, dtype='<i4')
+        payload = d.tobytes() + v.tobytes()
+    else:
+        payload = struct.pack(f'<{len(days)}i', *days) + struct.pack(f'<{len(values)}i', *values)
+    count = len(days)
+    first, last = (int(days[0]), int(days[-1])) if count else (0, 0)
+    flags = 0
+    if compress:
+        payload = zstandard.ZstdCompressor(level=9).compress(payload); flags |= FLAG_ZSTD
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(struct.pack(HEADER_FMT, MAGIC, VERSION, flags, count, first, last)); fh.write(payload)
+        fh.flush(); os.fsync(fh.fileno())
+    if not keep_tmp: os.replace(tmp, path)
+
+# reading
+
+class Archive:
+    """days / values arrays of one archive file (numpy arrays, or memoryviews without numpy)."""
+    def __init__(self, path):
+        self.path = path; _have_numpy()
+        with open(path, 'rb') as fh: header = fh.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE: raise ArchiveError(f"{path}: truncated header")
+        magic, version, self.flags, self.count, self.first_day, self.last_day = struct.unpack(HEADER_FMT, header)
+        if magic != MAGIC or version > VERSION: raise ArchiveError(f"{path}: not a log archive (or a newer version)")
+        n = self.count
+        if self.flags & FLAG_ZSTD:
+            if load_zstandard() is None: raise ArchiveError(f"{path}: compressed with zstd, install zstandard to read it")
+            with open(path, 'rb') as fh:
+                fh.seek(HEADER_SIZE); raw = zstandard.ZstdDecompressor().decompress(fh.read(), max_output_size=8 * n)
+            self.days, self.values = self._arrays(memoryview(raw), 0, n)
+        elif n == 0:
+            self.days, self.values = self._arrays(memoryview(b''), 0, 0)
+        elif np is not None:
+            self.days = np.memmap(path, dtype='<i4', mode='r', offset=HEADER_SIZE, shape=(n,))
+            self.values = np.memmap(path, dtype='<i4', mode='r', offset=HEADER_SIZE + 4 * n, shape=(n,))
+        else:
+            with open(path, 'rb') as fh: self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self.days, self.values = self._arrays(memoryview(self._map), HEADER_SIZE, n)
+
+    @staticmethod
+    def _arrays(buf, offset, n):
+        if np is not None:
+            return (np.frombuffer(buf, dtype='<i4', count=n, offset=offset),
+                    np.frombuffer(buf, dtype='<i4', count=n, offset=offset + 4 * n))
+        if sys.byteorder != 'little': raise ArchiveError("reading archives without numpy needs a little-endian machine")
+        return buf[offset:offset + 4 * n].cast('i'), buf[offset + 4 * n:offset + 8 * n].cast('i')
+
+    def __len__(self): return self.count
+
+    def between(self, first, last):
+        """(ordinal, value) pairs with first <= day <= last, found by binary search."""
+        days = self.days
+        for i in range(bisect.bisect_left(days, first), bisect.bisect_right(days, last)):
+            if self.values[i] != MISSING: yield int(days[i]), int(self.values[i])
+
+    def lookup(self, day):
+        """(True, value or None when it was missing) for an archived day ordinal, else (False, None)."""
+        i = bisect.bisect_left(self.days, day)
+        if i == self.count or self.days[i] != day: return False, None
+        value = int(self.values[i])
+        return True, (None if value == MISSING else value)
+
+    def rows(self, until=None):
+        """(ordinal, value) pairs oldest first, skipping missing values and days after `until`."""
+        for day, value in zip(self.days, self.values):
+            if until is not None and day > until: return
+            if value != MISSING: yield int(day), int(value)
+
+def open_archive(folder, profile_id, kind):
+    """The Archive for one profile / kind, or None when nothing has been archived."""
+    if folder is None: return None
+    path = archive_path(folder, profile_id, kind)
+    return Archive(path) if os.path.exists(path) else None
+
+def merge_rows(archived, live):
+    """Merge two ascending (day, value) streams; the live value wins on the same day."""
+    pending = None
+    for day, source, value in heapq.merge(((d, 0, v) for d, v in archived), ((d, 1, v) for d, v in live)):
+        if pending is not None and pending[0] != day: yield pending
+        pending = (day, value)
+    if pending is not None: yield pending
+
+def delete_archives(folder, profile_id):
+    if folder is None: return
+    for kind in health_db.LOG_TABLES:
+        for path in (archive_path(folder, profile_id, kind), archive_path(folder, profile_id, kind) + '.tmp'):
+            try: os.remove(path)
+            except FileNotFoundError: pass
+
+# live rows saved over archived days
+
+def _ordinal(day):
+    try: d = date.fromisoformat(day)
+    except (TypeError, ValueError): return None
+    return d.toordinal() if d.isoformat() == day else None   # archives only hold canonical dates
+
+def resolve_overlaps(conn, folder=None):
+    """Look up the archived value of each newly noted archive_overlaps day; doesn't commit.
+
+    Days of a compaction still pending are left for finish_pending(). Returns days resolved.
+    """
+    rows = conn.execute("SELECT o.profile_id, o.kind, o.date FROM archive_overlaps o "
+                        "JOIN log_archives a ON a.profile_id = o.profile_id AND a.kind = o.kind "
+                        "WHERE o.n IS NULL AND NOT a.pending ORDER BY o.profile_id, o.kind;").fetchall()
+    if not rows: return 0
+    folder = folder or archive_folder(conn)
+    updates = []; archive = key = None
+    for pid, kind, day in rows:
+        if (pid, kind) != key: key = (pid, kind); archive = open_archive(folder, pid, kind)
+        ordinal = _ordinal(day)
+        found, value = archive.lookup(ordinal) if archive is not None and ordinal is not None else (False, None)
+        updates.append((1 if found else 0, value, pid, kind, day))
+    del archive
+    conn.executemany("UPDATE archive_overlaps SET n=?, value=? WHERE profile_id=? AND kind=? AND date=?;", updates)
+    return len(updates)
+
+def _note_archive(conn, profile_id, kind, last_day, pending):
+    """Record an archive's last day and note the live rows dated on or before it."""
+    table, _ = health_db.LOG_TABLES[kind]
+    conn.execute("INSERT INTO log_archives (profile_id, kind, last_day, pending) VALUES (?, ?, ?, ?) "
+                 "ON CONFLICT(profile_id, kind) DO UPDATE SET last_day=excluded.last_day, pending=excluded.pending;",
+                 (profile_id, kind, last_day, pending))
+    conn.execute(f"INSERT OR IGNORE INTO archive_overlaps (profile_id, kind, date) "
+                 f"SELECT profile_id, ?, date FROM {table} WHERE profile_id=? AND date <= ?;", (kind, profile_id, last_day))
+
+def finish_pending(conn, folder=None):
+    """Rename into place the files of compactions that committed before their rename; commits."""
+    rows = conn.execute("SELECT profile_id, kind FROM log_archives WHERE pending;").fetchall()
+    if not rows: return 0
+    folder = folder or archive_folder(conn)
+    for pid, kind in rows:
+        path = archive_path(folder, pid, kind)
+        if os.path.exists(path + '.tmp'): os.replace(path + '.tmp', path)   # gone if the rename itself happened
+    with conn:
+        conn.executemany("UPDATE log_archives SET pending=0 WHERE profile_id=? AND kind=?;", rows)
+        resolve_overlaps(conn, folder)
+    return len(rows)
+
+def register_archives(conn, folder=None):
+    """Fill log_archives from the files of a database compacted before it existed; doesn't commit."""
+    folder = folder or archive_folder(conn)
+    if folder is None: return
+    for pid in sorted(health_db.profile_ids(conn)):
+        for kind in health_db.LOG_TABLES:
+            try: archive = open_archive(folder, pid, kind)
+            except ArchiveError: continue
+            if archive is not None and archive.count:
+                _note_archive(conn, pid, kind, date.fromordinal(archive.last_day).isoformat(), 0)
+            del archive
+    resolve_overlaps(conn, folder)
+
+# compaction
+
+def _rollup_deltas(rows, sign, deltas):
+    """Accumulate one sign of (ordinal, value) contributions into {(period, start): [n, n_values, total]}."""
+    for day, value in rows:
+        d = date.fromordinal(day)
+        keys = (('week', (d - timedelta(days=d.weekday())).isoformat()), ('month', d.replace(day=1).isoformat()), ('total', None))
+        has = value != MISSING
+        for key in keys:
+            acc = deltas.setdefault(key, [0, 0, 0])
+            acc[0] += sign; acc[1] += sign * has; acc[2] += sign * (value if has else 0)
+
+def _apply_rollup_deltas(conn, profile_id, kind, deltas):
+    for (period, start), (n, n_values, total) in deltas.items():
+        if not (n or n_values or total): continue
+        if period == 'total':
+            conn.execute("INSERT INTO log_totals (profile_id, kind, n, n_values, total) VALUES (?, ?, ?, ?, ?) "
+                         "ON CONFLICT(profile_id, kind) DO UPDATE SET n=n+excluded.n, n_values=n_values+excluded.n_values, total=total+excluded.total;",
+                         (profile_id, kind, n, n_values, total))
+        else:
+            conn.execute("INSERT INTO log_rollups (profile_id, kind, period, start, n, n_values, total) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                         "ON CONFLICT(profile_id, kind, period, start) DO UPDATE SET n=n+excluded.n, n_values=n_values+excluded.n_values, total=total+excluded.total;",
+                         (profile_id, kind, period, start, n, n_values, total))
+
+def compact_log(conn, folder, profile_id, kind, cutoff, compress=False):
+    """Move one profile's rows dated before `cutoff` into its archive; returns rows moved."""
+    table, col = health_db.LOG_TABLES[kind]
+    finish_pending(conn, folder)
+    # rows with unparseable dates or values that don't fit int32 stay live
+    cold = conn.execute(
+        f"SELECT CAST(julianday(date) AS INTEGER) - 1721424, coalesce({col}, ?) FROM {table} "
+        f"WHERE profile_id=? AND date < ? AND julianday(date) IS NOT NULL AND date = date(date) "
+        f"AND ({col} IS NULL OR {col} BETWEEN ? AND ?) ORDER BY date;",
+        (MISSING, profile_id, cutoff.isoformat(), MISSING + 1, INT32_MAX)).fetchall()
+    if not cold: return 0
+    old = open_archive(folder, profile_id, kind)
+    old_rows = list(zip(map(int, old.days), map(int, old.values))) if old is not None else []
+    new_days = {d for d, _ in cold}
+    replaced = [(d, v) for d, v in old_rows if d in new_days]
+    merged = list(merge_rows(old_rows, cold))
+    del old   # drop the memmap before the file is replaced (Windows can't replace a mapped file)
+    # the new file waits at .tmp until the delete below commits: if the transaction fails the
+    # old archive still matches the live rows, and a crash after the commit leaves pending set
+    write_archive(archive_path(folder, profile_id, kind), [d for d, _ in merged], [v for _, v in merged], compress, keep_tmp=True)
+    with conn:
+        health_db.pause_change_log(conn, 'archive')   # archived rows aren't deleted, don't sync tombstones for them
+        conn.execute(f"DELETE FROM {table} WHERE profile_id=? AND date < ? AND julianday(date) IS NOT NULL AND date = date(date) "
+                     f"AND ({col} IS NULL OR {col} BETWEEN ? AND ?);",
+                     (profile_id, cutoff.isoformat(), MISSING + 1, INT32_MAX))
+        health_db.resume_change_log(conn)
+        # archived days aren't scanned (health_quality), so their flags go with them
+        conn.execute(f"DELETE FROM log_flags WHERE profile_id=? AND kind=? AND date < ? "
+                     f"AND date NOT IN (SELECT date FROM {table} WHERE profile_id=?);", (profile_id, kind, cutoff.isoformat(), profile_id))
+        # the delete trigger took the moved rows out of the rollups: put them back, minus
+        # the archived values they replace (counted again as their overlap rows went)
+        deltas = {}
+        _rollup_deltas(cold, 1, deltas); _rollup_deltas(replaced, -1, deltas)
+        _apply_rollup_deltas(conn, profile_id, kind, deltas)
+        _note_archive(conn, profile_id, kind, date.fromordinal(merged[-1][0]).isoformat(), 1)
+    finish_pending(conn, folder)
+    return len(cold)
+
+def compact(conn, cutoff, profile_ids=None, kinds=None, compress=False, folder=None):
+    """Archive every row older than `cutoff` (a date); returns {kind: rows moved}."""
+    folder = folder or archive_folder(conn)
+    if folder is None: raise ArchiveError("in-memory databases can't be archived")
+    ids = sorted(health_db.profile_ids(conn)) if profile_ids is None else profile_ids
+    moved = {}
+    for kind in kinds or health_db.LOG_TABLES:
+        moved[kind] = sum(compact_log(conn, folder, pid, kind, cutoff, compress) for pid in ids)
+    return moved
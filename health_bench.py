@@ -0,0 +1,306 @@
+"""Reproducible benchmarks for the hot paths, with JSON results and a regression check.
+
+Usage:
+    python health_bench.py --out bench.json                      # default sizes 1k,100k
+    python health_bench.py --sizes 1k,100k,10M --out bench.json  # 10M takes several minutes
+    python health_bench.py --compare bench.json                  # rerun and flag regressions
+    python health_bench.py --load new.json --compare bench.json  # compare two saved runs
+
+Everything runs on a throwaway database in a temp folder. The Tk benchmarks
+(history rebuild, theme frames) need a display; on servers run them under
+`xvfb-run python health_bench.py`, without one they are reported as skipped.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import health_analytics
+import health_db
+import health_insights
+import health_metrics
+from health_trace import percentile
+
+DEFAULT_SIZES = '1k,100k'
+DEFAULT_THRESHOLD = 0.10   # relative slowdown that counts as a regression
+DAYS_PER_PROFILE = 3650    # generated logs: ten years per profile, as many profiles as needed
+FILL_CHUNK = 50000
+BENCHMARKS = []            # (name, fn(ctx) -> {metric: (value, unit, higher_is_better)}, needs_tk)
+
+def benchmark(name, needs_tk=False):
+    def register(fn):
+        BENCHMARKS.append((name, fn, needs_tk)); return fn
+    return register
+
+# helpers
+
+def parse_size(text):
+    m = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kKmM]?)\s*', text)
+    if not m: raise argparse.ArgumentTypeError(f"bad size: {text!r}")
+    return int(float(m.group(1)) * {'': 1, 'k': 1000, 'm': 1000000}[m.group(2).lower()])
+
+def size_label(n):
+    if n >= 1000000 and n % 1000000 == 0: return f"{n // 1000000}M"
+    if n >= 1000 and n % 1000 == 0: return f"{n // 1000}k"
+    return str(n)
+
+def samples(fn, repeat, warmup=1):
+    for _ in range(warmup): fn()
+    out = []
+    for _ in range(repeat):
+        started = time.perf_counter(); fn(); out.append(time.perf_counter() - started)
+    return out
+
+def latency_metrics(prefix, values):
+    return {f"{prefix}.p50_ms": (percentile(values, 50) * 1000, 'ms', False),
+            f"{prefix}.p95_ms": (percentile(values, 95) * 1000, 'ms', False)}
+
+_DAYS = [(date(2015, 1, 1) + timedelta(days=i)).isoformat() for i in range(DAYS_PER_PROFILE)]
+
+def _log_rows(n_rows, first_profile=1, value_base=1000):
+    """(profile_id, date, value) rows, DAYS_PER_PROFILE consecutive days per profile."""
+    for i in range(n_rows):
+        pid, day = divmod(i, DAYS_PER_PROFILE)
+        yield first_profile + pid, _DAYS[day], value_base + (i * 7919) % 9000
+
+def _add_profiles(conn, n, prefix='bench'):
+    now = datetime.now().isoformat()
+    first = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM profiles;").fetchone()[0]
+    rows = []
+    for i in range(n):
+        h = 150.0 + (i % 50); w = 50.0 + (i * 13) % 70
+        bmi, cat, water_l, step_goal = health_metrics.profile_metrics(w, h)
+        rows.append((f"{prefix}-{first + i}", h, w, bmi, cat, water_l, step_goal, now))
+    conn.executemany("INSERT INTO profiles (name, height_cm, weight_kg, bmi, category, water_l, step_goal, created_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?);", rows)
+    conn.commit()
+    return first
+
+def fill_logs(conn, kind, n_rows):
+    """Insert n_rows fresh log rows in big transactions; returns (first profile id, seconds)."""
+    first = _add_profiles(conn, -(-n_rows // DAYS_PER_PROFILE), prefix=f"bench-{kind}")
+    rows = _log_rows(n_rows, first)
+    started = time.perf_counter()
+    while True:
+        chunk = [r for _, r in zip(range(FILL_CHUNK), rows)]
+        if not chunk: break
+        with conn: health_db.upsert_logs(conn, kind, chunk)
+    return first, time.perf_counter() - started
+
+class Context:
+    def __init__(self, folder, sizes, repeat):
+        self.folder = folder; self.sizes = sizes; self.repeat = repeat
+        self._conns = {}
+
+    def db(self, n_rows):
+        """Database with n_rows steps and n_rows water rows, built once per size."""
+        if n_rows not in self._conns:
+            conn = health_db.connect(os.path.join(self.folder, f"bench_{n_rows}.db"))
+            pids = {kind: fill_logs(conn, kind, n_rows) for kind in health_db.LOG_TABLES}
+            self._conns[n_rows] = (conn, pids)
+        return self._conns[n_rows]
+
+    def close(self):
+        for conn, _ in self._conns.values(): conn.close()
+
+# calculation helpers
+
+@benchmark('metrics')
+def bench_metrics(ctx):
+    n = 200000
+    weights = [50.0 + (i * 13) % 70 for i in range(n)]; heights = [150.0 + i % 50 for i in range(n)]
+    def scalar():
+        for w, h in zip(weights, heights): health_metrics.bmi_category(health_metrics.calculate_bmi(w, h))
+    def batch():
+        health_metrics.bmi_category_codes(health_metrics.calculate_bmi_batch(weights, heights))
+    out = {'calculate_bmi+bmi_category.scalar_per_s': (n / min(samples(scalar, ctx.repeat)), 'ops/s', True)}
+    out['calculate_bmi+bmi_category.batch_per_s'] = (n / min(samples(batch, ctx.repeat)), 'ops/s', True)
+    return out
+
+# database paths
+
+@benchmark('upserts')
+def bench_upserts(ctx):
+    out = {}
+    for n in ctx.sizes:
+        conn, pids = ctx.db(n)
+        for kind in health_db.LOG_TABLES:
+            table = health_db.LOG_TABLES[kind][0]
+            out[f"{table}.fill_{size_label(n)}.rows_per_s"] = (n / pids[kind][1], 'rows/s', True)
+            # a day's worth of saves hitting existing rows once the table is that big
+            batch = [(pid, day, v + 1) for pid, day, v in _log_rows(1000, pids[kind][0])]
+            def update():
+                with conn: health_db.upsert_logs(conn, kind, batch)
+            def single():
+                health_db.upsert_log(conn, kind, batch[0][0], batch[0][1], batch[0][2])
+            out[f"{table}.upsert_at_{size_label(n)}.rows_per_s"] = (len(batch) / min(samples(update, ctx.repeat)), 'rows/s', True)
+            out.update(latency_metrics(f"{table}.save_at_{size_label(n)}", samples(single, ctx.repeat * 10)))
+    return out
+
+@benchmark('recommendations')
+def bench_recommendations(ctx):
+    """The queries behind refresh_recommendations() plus the text they feed."""
+    out = {}
+    for n in ctx.sizes:
+        conn, pids = ctx.db(n)
+        pid = pids['steps'][0]
+        out.update(latency_metrics(f"insights_data_{size_label(n)}", samples(lambda: health_db.insights_data(conn, pid), ctx.repeat * 20)))
+        def uncached():   # the query path; the analytics cache would otherwise answer every sample after the first
+            health_analytics.CACHE.invalidate(pid); health_insights.build_insights(conn, pid)
+        out.update(latency_metrics(f"build_insights_{size_label(n)}", samples(uncached, ctx.repeat * 20)))
+        out.update(latency_metrics(f"build_insights_cached_{size_label(n)}", samples(lambda: health_insights.build_insights(conn, pid), ctx.repeat * 20)))
+    return out
+
+@benchmark('history_page')
+def bench_history_page(ctx):
+    """The query half of refresh_steps_view(): newest page plus one page further back."""
+    out = {}
+    for n in ctx.sizes:
+        conn, pids = ctx.db(n)
+        pid = pids['steps'][0]
+        def first_page(): health_db.log_page(conn, pid, 'steps')
+        out.update(latency_metrics(f"log_page_first_{size_label(n)}", samples(first_page, ctx.repeat * 20)))
+        older = health_db.log_page(conn, pid, 'steps')[-1][0]
+        def next_page(): health_db.log_page(conn, pid, 'steps', before=older)
+        out.update(latency_metrics(f"log_page_older_{size_label(n)}", samples(next_page, ctx.repeat * 20)))
+    return out
+
+# Tk paths (need a display)
+
+def load_app_module():
+    """Import the desktop app module (its file name has a space in it)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'health_metric_app final.py')
+    spec = importlib.util.spec_from_file_location('health_metric_app', path)
+    module = importlib.util.module_from_spec(spec); spec.loader.exec_module(module)
+    return module
+
+def tk_available():
+    try:
+        import tkinter
+        root = tkinter.Tk(); root.destroy()
+        return True
+    except Exception:
+        return False
+
+@benchmark('steps_view', needs_tk=True)
+def bench_steps_view(ctx):
+    """refresh_steps_view(): clear the tree and fill the newest page, with a synchronous fetch."""
+    app_mod = load_app_module()
+    import tkinter as tk
+    root = tk.Tk(); root.withdraw()
+    out = {}
+    try:
+        for n in ctx.sizes:
+            conn, pids = ctx.db(n)
+            pid = pids['steps'][0]
+            history = app_mod.HistoryTree(root, ("date", "steps"), ("Date", "Steps"),
+                                          lambda done, **kw: done(health_db.log_page(conn, pid, 'steps', **kw)))
+            history.pack(fill='both', expand=True)
+            def rebuild():
+                history.reset(); root.update_idletasks()
+            out.update(latency_metrics(f"refresh_steps_view_{size_label(n)}", samples(rebuild, ctx.repeat * 4)))
+            history.destroy()
+    finally:
+        root.destroy()
+    return out
+
+@benchmark('theme', needs_tk=True)
+def bench_theme(ctx):
+    """_apply_theme() per animation frame with every tab built (the worst case)."""
+    app_mod = load_app_module()
+    app = app_mod.HealthApp(); app.withdraw()
+    try:
+        for tab in list(app._tab_builders): app._ensure_tab(tab)
+        app.update_idletasks()
+        frames = app.theme.frames(0.0, 1.0, 18) + app.theme.frames(1.0, 0.0, 18)
+        def animate():
+            for i, colors in enumerate(frames):
+                app._apply_theme(i / (len(frames) - 1), colors); app.update_idletasks()
+        per_frame = [s / len(frames) for s in samples(animate, ctx.repeat)]
+        return latency_metrics('apply_theme.frame', per_frame)
+    finally:
+        app._on_close()
+
+# running and comparing
+
+def run(sizes, repeat=5, only=None):
+    has_tk = None
+    results = {}; skipped = {}
+    with tempfile.TemporaryDirectory(prefix='health_bench_') as folder:
+        ctx = Context(folder, sizes, repeat)
+        try:
+            for name, fn, needs_tk in BENCHMARKS:
+                if only and not any(pattern in name for pattern in only): continue
+                if needs_tk:
+                    if has_tk is None: has_tk = tk_available()
+                    if not has_tk: skipped[name] = "no display, run under xvfb-run"; continue
+                started = time.perf_counter()
+                for metric, (value, unit, higher) in fn(ctx).items():
+                    results[metric] = {'value': value, 'unit': unit, 'higher_is_better': higher}
+                print(f"{name}: done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        finally:
+            ctx.close()
+    return {
+        'meta': {'created': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                 'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(), 'machine': platform.machine(),
+                 'sizes': sizes, 'repeat': repeat, 'skipped': skipped},
+        'results': results,
+    }
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """[(metric, old, new, change, regressed)]; change > 0 always means 'got better'."""
+    rows = []
+    for metric, new in sorted(current['results'].items()):
+        old = baseline['results'].get(metric)
+        if old is None or not old['value'] or not new['value']: continue
+        ratio = new['value'] / old['value']
+        change = ratio - 1.0 if new['higher_is_better'] else 1.0 / ratio - 1.0
+        rows.append((metric, old['value'], new['value'], change, change < -threshold))
+    return rows
+
+def print_results(data, fh=sys.stdout):
+    for metric, r in sorted(data['results'].items()):
+        print(f"{metric:<48}{r['value']:>16,.3f} {r['unit']}", file=fh)
+    for name, reason in data['meta'].get('skipped', {}).items():
+        print(f"{name:<48}{'skipped':>16} ({reason})", file=fh)
+
+def print_comparison(rows, fh=sys.stdout):
+    for metric, old, new, change, regressed in rows:
+        print(f"{metric:<48}{old:>14,.3f}{new:>14,.3f}{change * 100:>+9.1f}%{'  REGRESSION' if regressed else ''}", file=fh)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the Health Metric Calculator hot paths")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"log table sizes, e.g. 1k,100k,10M (default {DEFAULT_SIZES})")
+    parser.add_argument('--repeat', type=int, default=5, help="timed repetitions per measurement")
+    parser.add_argument('--only', action='append', help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument('--out', help="write results as JSON")
+    parser.add_argument('--load', help="use saved results instead of running")
+    parser.add_argument('--compare', metavar='BASELINE', help="flag regressions against a saved run")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown before flagging (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    if args.load:
+        with open(args.load, encoding='utf-8') as fh: data = json.load(fh)
+    else:
+        sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+        data = run(sizes, max(1, args.repeat), args.only)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as fh: json.dump(data, fh, indent=2)
+    if not args.compare:
+        print_results(data); return 0
+    with open(args.compare, encoding='utf-8') as fh: baseline = json.load(fh)
+    rows = compare(baseline, data, args.threshold)
+    print_comparison(rows)
+    regressions = [r for r in rows if r[4]]
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%} in {len(rows)} metrics")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Per-profile snapshots for the GUI, so switching back to a profile skips the queries.
+
+A snapshot holds parts: the profile row, the newest history page of each log,
+the rendered Insights text and the calendar months already fetched (a part
+holding a small LRU of items, see get_item / put_item). Profiles are evicted least recently used first.
+Writers drop exactly the parts a write can change (see PARTS_FOR). Every
+invalidation bumps the profile's generation. A result whose query started
+before a write is not stored, because its token() no longer matches.
+"""
+import collections
+import threading
+
+CACHE_PROFILES = 32
+
+# what a write changes -> the snapshot parts that go stale
+PARTS_FOR = {
+    'steps': ('steps_page', 'insights', 'steps_months'),
+    'water': ('water_page', 'insights', 'water_months'),
+    'profile': ('profile', 'insights', 'steps_months', 'water_months'),   # height / weight edits change the goals
+    'flags': ('insights',),   # health_quality rescanned the profile
+}
+
+class ProfileCache:
+    def __init__(self, capacity=CACHE_PROFILES):
+        self.capacity = max(1, capacity)
+        self._lock = threading.Lock()
+        self._snapshots = collections.OrderedDict()   # profile id -> {part: value}, most recent last
+        self._generations = {}; self._epoch = 0   # clear() bumps the epoch
+        self.hits = 0; self.misses = 0; self.evictions = 0
+
+    def get(self, profile_id, part):
+        """Cached value or None; counts a hit or a miss."""
+        with self._lock:
+            snap = self._snapshots.get(profile_id)
+            if snap is not None and part in snap:
+                self._snapshots.move_to_end(profile_id); self.hits += 1
+                return snap[part]
+            self.misses += 1
+            return None
+
+    def token(self, profile_id):
+        """Take before starting the query whose result goes to put()."""
+        with self._lock: return (self._epoch, self._generations.get(profile_id, 0))
+
+    def put(self, profile_id, part, value, token=None):
+        with self._lock:
+            if token is not None and token != (self._epoch, self._generations.get(profile_id, 0)): return False
+            self._snapshot(profile_id)[part] = value
+            return True
+
+    def get_item(self, profile_id, part, key):
+        """One item of a part kept as an LRU (e.g. a calendar month), or None; counts a hit or a miss."""
+        with self._lock:
+            snap = self._snapshots.get(profile_id); items = snap.get(part) if snap is not None else None
+            if items is not None and key in items:
+                self._snapshots.move_to_end(profile_id); items.move_to_end(key); self.hits += 1
+                return items[key]
+            self.misses += 1
+            return None
+
+    def put_item(self, profile_id, part, key, value, token=None, limit=None):
+        """Add an item to an LRU part, dropping its oldest items beyond `limit`."""
+        with self._lock:
+            if token is not None and token != (self._epoch, self._generations.get(profile_id, 0)): return False
+            items = self._snapshot(profile_id).setdefault(part, collections.OrderedDict())
+            items[key] = value; items.move_to_end(key)
+            while limit and len(items) > limit: items.popitem(last=False)
+            return True
+
+    def _snapshot(self, profile_id):
+        # lock held; creates the snapshot (evicting the least recently used) or marks it used
+        snap = self._snapshots.get(profile_id)
+        if snap is None:
+            snap = self._snapshots[profile_id] = {}
+            while len(self._snapshots) > self.capacity:
+                self._snapshots.popitem(last=False); self.evictions += 1
+        else:
+            self._snapshots.move_to_end(profile_id)
+        return snap
+
+    def invalidate(self, profile_id, what=None):
+        """Drop the parts a write of `what` ('steps', 'water', 'profile') makes stale, or the whole snapshot."""
+        with self._lock:
+            self._generations[profile_id] = self._generations.get(profile_id, 0) + 1
+            if what is None:
+                self._snapshots.pop(profile_id, None); return
+            snap = self._snapshots.get(profile_id)
+            if snap is not None:
+                for part in PARTS_FOR[what]: snap.pop(part, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1; self._snapshots.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'profiles': len(self._snapshots), 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else None}
+
+    def __len__(self): return len(self._snapshots)
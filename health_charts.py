@@ -0,0 +1,258 @@
+"""Chart data and styling shared by the embedded graph panel and headless renderers.
+
+Needs matplotlib (and so numpy); callers import this module inside a try block
+the same way the app treats matplotlib as optional.
+"""
+import calendar
+import itertools
+from datetime import date
+
+import numpy as np
+import matplotlib.colors as mcolors
+import matplotlib.dates as mdates
+
+import health_analytics
+import health_archive
+import health_db
+
+# kind -> (y label, title)
+CHART_META = {
+    'steps': ("Steps", "Steps over time"),
+    'water': ("Water (ml)", "Water intake over time"),
+    'bmi': ("BMI", "BMI over time"),
+}
+
+def load_series(conn, profile_id, kind):
+    """Full history as float arrays (matplotlib date numbers, values), oldest first.
+
+    SQLite converts the ISO dates to day numbers itself, so no per-row parsing
+    happens in python and matplotlib gets a real date axis instead of string
+    categories.
+    """
+    if kind == 'bmi': return _measurement_series(conn, profile_id, 'bmi')
+    table, col = health_db.LOG_TABLES[kind]
+    epoch = mdates.get_epoch()
+    cur = conn.execute(f"SELECT julianday(date) - julianday(?), {col} FROM {table} "
+                       f"WHERE profile_id=? AND {col} IS NOT NULL AND julianday(date) IS NOT NULL ORDER BY date ASC;",
+                       (epoch, profile_id))
+    flat = np.fromiter(itertools.chain.from_iterable(cur), dtype=np.float64)
+    flat = flat.reshape(-1, 2)
+    x, y = flat[:, 0].copy(), flat[:, 1].copy()
+    archive = health_archive.open_archive(health_archive.archive_folder(conn), profile_id, kind)
+    if archive is None or not len(archive): return x, y
+    # archived days straight off the memmap, minus missing values and days re-entered live
+    ax = archive.days + (mdates.date2num(date(1, 1, 1)) - 1.0)
+    keep = (archive.values != health_archive.MISSING) & ~np.isin(ax, x)
+    x = np.concatenate((ax[keep], x)); y = np.concatenate((archive.values[keep].astype(np.float64), y))
+    if len(x) > 1 and (np.diff(x) < 0).any():   # live rows older than the archive (rare)
+        order = np.argsort(x, kind='stable'); x, y = x[order], y[order]
+    return x, y
+
+def _measurement_series(conn, profile_id, col):
+    """One measurements column over time (a point per recorded change), oldest first."""
+    cur = conn.execute(f"SELECT julianday(measured_at) - julianday(?), {col} FROM measurements "
+                       f"WHERE profile_id=? AND {col} IS NOT NULL AND julianday(measured_at) IS NOT NULL ORDER BY measured_at;",
+                       (mdates.get_epoch(), profile_id))
+    flat = np.fromiter(itertools.chain.from_iterable(cur), dtype=np.float64).reshape(-1, 2)
+    return flat[:, 0].copy(), flat[:, 1].copy()
+
+# year heatmap: one column per week (Monday first), one row per weekday
+
+YEAR_MODES = {'amount': "{label} in {year}", 'goal': "{label} goal met in {year}"}
+
+def year_matrix(conn, profile_id, kind, year):
+    """One year of a log as 7 x weeks arrays, filled from one range query (plus the archive).
+
+    Returns {'year', 'origin' (ordinal of the Monday in column 0), 'values' (NaN where
+    nothing was logged), 'goals' (the goal in effect each day), 'inside' (cells in the
+    year)}. A year has 53 week columns, or 54 when a leap year starts on a Sunday.
+    """
+    table, col = health_db.LOG_TABLES[kind]
+    first = date(year, 1, 1); last = date(year, 12, 31)
+    origin = first.toordinal() - first.weekday(); weeks = (last.toordinal() - origin) // 7 + 1
+    values = np.full((7, weeks), np.nan)
+    archive = health_archive.open_archive(health_archive.archive_folder(conn), profile_id, kind)
+    if archive is not None and len(archive):
+        lo, hi = np.searchsorted(archive.days, [first.toordinal(), last.toordinal() + 1])
+        days = np.asarray(archive.days[lo:hi]); v = np.asarray(archive.values[lo:hi])
+        keep = v != health_archive.MISSING; off = days[keep] - origin
+        values[off % 7, off // 7] = v[keep]
+    cur = conn.execute(f"SELECT CAST(julianday(date) AS INTEGER) - ?, {col} FROM {table} "
+                       f"WHERE profile_id=? AND date BETWEEN ? AND ? AND {col} IS NOT NULL AND date = date(julianday(date));",
+                       (origin + health_analytics.JD_OFFSET, profile_id, first.isoformat(), last.isoformat()))
+    flat = np.fromiter(itertools.chain.from_iterable(cur), dtype=np.float64).reshape(-1, 2)
+    off = flat[:, 0].astype(np.int64); values[off % 7, off // 7] = flat[:, 1]   # live rows win over archived ones
+    ordinals = origin + np.arange(7 * weeks).reshape(weeks, 7).T
+    changes = health_analytics.goal_timeline(conn, profile_id)[kind] \
+        or ((origin, (health_analytics.goals_for(conn, profile_id) or {}).get(kind)),)
+    starts = np.array([start for start, _ in changes])
+    goal_list = np.array([np.nan if g is None else g for _, g in changes], dtype=np.float64)
+    goals = goal_list[np.maximum(np.searchsorted(starts, ordinals, side='right') - 1, 0)]
+    inside = (ordinals >= first.toordinal()) & (ordinals <= last.toordinal())
+    return {'year': year, 'origin': origin, 'values': values, 'goals': goals, 'inside': inside}
+
+def year_summary(data):
+    """(days logged, days at or above goal) for a year_matrix()."""
+    logged = ~np.isnan(data['values'])
+    with np.errstate(invalid='ignore'): met = logged & (data['values'] >= data['goals'])
+    return int(logged.sum()), int(met.sum())
+
+def year_image(data, mode='amount', colors=None):
+    """RGBA array for imshow: amount scales from panel to accent by the year's 98th
+    percentile, goal colours met days accent and missed ones muted by how close they got.
+    Days without a log get the border colour, cells outside the year stay transparent."""
+    c = colors or DEFAULT_COLORS
+    values = data['values']; logged = ~np.isnan(values)
+    panel, accent, muted, border = (np.array(mcolors.to_rgba(c[k])) for k in ('panel', 'accent', 'muted', 'border'))
+    img = np.zeros(values.shape + (4,))
+    img[data['inside'] & ~logged] = border
+    if logged.any():
+        v = values[logged]
+        if mode == 'goal':
+            g = data['goals'][logged]
+            with np.errstate(divide='ignore', invalid='ignore'): ratio = np.where(g > 0, v / g, np.nan)
+            met = ratio >= 1; t = np.clip(np.nan_to_num(ratio, nan=0.0), 0.0, 1.0)[:, None]
+            img[logged] = np.where(met[:, None], accent, border + (muted - border) * (0.25 + 0.75 * t))
+        else:
+            scale = np.percentile(v, 98) or 1.0
+            t = 0.2 + 0.8 * np.clip(v / scale, 0.0, 1.0)[:, None]
+            img[logged] = panel + (accent - panel) * t
+    return img
+
+def plot_year(fig, ax, data, kind, mode='amount', colors=None, title=None, image=None):
+    """Draw a year heatmap with a single imshow; returns the AxesImage (pass a cached image to skip year_image)."""
+    c = colors or DEFAULT_COLORS
+    im = ax.imshow(year_image(data, mode, c) if image is None else image, aspect='equal', interpolation='nearest')
+    label_year_axes(fig, ax, data, kind, mode, c, title)
+    return im
+
+def label_year_axes(fig, ax, data, kind, mode, colors, title=None):
+    year = data['year']; origin = data['origin']
+    ax.set_yticks([0, 2, 4]); ax.set_yticklabels(['Mon', 'Wed', 'Fri'])
+    ax.set_xticks([(date(year, m, 1).toordinal() - origin) // 7 for m in range(1, 13)])
+    ax.set_xticklabels(calendar.month_abbr[1:13])
+    ax.tick_params(length=0)
+    logged, met = year_summary(data)
+    label = CHART_META[kind][0].split(' (')[0]
+    ax.set_title(title or f"{YEAR_MODES[mode].format(label=label, year=year)}: {logged} days logged, goal met on {met}")
+    style_axes(fig, ax, colors)
+    for spine in ax.spines.values(): spine.set_visible(False)
+
+# downsampling
+
+def downsample_minmax(x, y, n_buckets):
+    """Keep the first, last, min and max point of each bucket (preserves spikes)."""
+    n = len(x)
+    if n <= 2 * n_buckets: return x, y
+    size = n // n_buckets; body = n_buckets * size
+    blocks = y[:body].reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    idx = np.concatenate((offsets, offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1),
+                          np.arange(body, n), [n - 1]))
+    idx = np.unique(idx)
+    return x[idx], y[idx]
+
+def downsample_lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: n_out points that keep the visual shape."""
+    n = len(x)
+    if n_out >= n or n_out < 3: return x, y
+    every = (n - 2) / (n_out - 2)
+    idx = np.empty(n_out, dtype=np.int64); idx[0] = 0; idx[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1; end = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:nxt_end].mean(); avg_y = y[end:nxt_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax()); idx[i + 1] = a
+    return x[idx], y[idx]
+
+def downsample(x, y, n_out):
+    """LTTB down to n_out points, with a cheap min/max pre-pass for huge ranges."""
+    if len(x) <= n_out: return x, y
+    if len(x) > 8 * n_out:
+        x, y = downsample_minmax(x, y, 2 * n_out)
+    return downsample_lttb(x, y, n_out)
+
+def visible_slice(x, lo, hi):
+    """Index range covering [lo, hi] plus one neighbour each side so lines reach the edges."""
+    i0 = max(int(np.searchsorted(x, lo, side='left')) - 1, 0)
+    i1 = min(int(np.searchsorted(x, hi, side='right')) + 1, len(x))
+    return i0, i1
+
+# styling
+
+def theme_rc(c):
+    """rc params matching the app colors (c is HealthApp._get_current_colors())."""
+    return {
+        'axes.facecolor': c['panel'],
+        'figure.facecolor': c['bg'],
+        'text.color': c['button_fg'],
+        'xtick.color': c['button_fg'],
+        'ytick.color': c['button_fg'],
+        'axes.labelcolor': c['button_fg'],
+        'axes.edgecolor': c['border'],
+        'axes.titlecolor': c['button_fg'],
+    }
+
+def style_axes(fig, ax, c):
+    """Apply the theme to an existing figure (rc_context only affects new ones)."""
+    fig.set_facecolor(c['bg']); ax.set_facecolor(c['panel'])
+    for spine in ax.spines.values(): spine.set_edgecolor(c['border'])
+    ax.tick_params(colors=c['button_fg'])
+    ax.xaxis.label.set_color(c['button_fg']); ax.yaxis.label.set_color(c['button_fg']); ax.title.set_color(c['button_fg'])
+
+def setup_date_axis(ax):
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    ax.set_xlabel("Date")
+
+# headless rendering (Agg, no pyplot, safe without a display)
+
+# the app's light theme, used when nothing else is passed in
+DEFAULT_COLORS = {
+    'bg': '#f6f7fb', 'panel': '#ffffff', 'muted': '#6b7280', 'accent': '#007aff',
+    'button_bg': '#ffffff', 'button_fg': '#111827', 'tree_bg': '#ffffff', 'border': '#e6e7eb',
+    'entry_bg': '#ffffff', 'entry_fg': '#111827',
+}
+RENDER_POINTS = 2000
+
+def render_figure(x, y, kind, colors=None, title=None):
+    """An Agg-backed Figure styled like the Graph tab."""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    c = colors or DEFAULT_COLORS
+    fig = Figure(figsize=(8, 4), dpi=100); FigureCanvasAgg(fig)
+    plot_series(fig, fig.add_subplot(111), x, y, kind, c, title)
+    fig.tight_layout()
+    return fig
+
+def plot_series(fig, ax, x, y, kind, colors=None, title=None):
+    """Draw one series on `ax` the way the Graph tab does (downsampled, date axis, themed)."""
+    c = colors or DEFAULT_COLORS
+    xs, ys = downsample(x, y, RENDER_POINTS)
+    ax.plot(xs, ys, marker='o' if len(xs) <= 200 else '', color=c['accent'], linewidth=2)
+    setup_date_axis(ax)
+    ylabel, default_title = CHART_META[kind]
+    ax.set_ylabel(ylabel); ax.set_title(title or default_title)
+    style_axes(fig, ax, c)
+
+def render_year_png(conn, profile_id, kind, year, path, mode='amount', colors=None, title=None):
+    """Write one profile's year heatmap to `path`; returns False when nothing was logged that year."""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    data = year_matrix(conn, profile_id, kind, year)
+    if np.isnan(data['values']).all(): return False
+    c = colors or DEFAULT_COLORS
+    fig = Figure(figsize=(10, 2.2), dpi=100); FigureCanvasAgg(fig)
+    plot_year(fig, fig.add_subplot(111), data, kind, mode, c, title)
+    fig.tight_layout(); fig.savefig(path)
+    return True
+
+def render_png(conn, profile_id, kind, path, colors=None, title=None):
+    """Write one profile's chart to `path`; returns False when there is no data."""
+    x, y = load_series(conn, profile_id, kind)
+    if not len(x): return False
+    render_figure(x, y, kind, colors, title).savefig(path)
+    return True
@@ -0,0 +1,341 @@
+"""Headless command line for profiles.db: bulk recalculation, import/export,
+Insights summaries and PNG charts. Never imports tkinter.
+
+Usage:
+    python health_cli.py path/to/profiles.db recalc --jobs 4
+    python health_cli.py path/to/folder import steps.csv --profile "Alice"
+    python health_cli.py path/to/profiles.db export --out exports/ --format jsonl
+    python health_cli.py path/to/profiles.db export --out exports/ --format columnar --report exports/summary.pdf
+    python health_cli.py path/to/profiles.db insights --profile 3 --exclude-flagged
+    python health_cli.py path/to/profiles.db scan --list --profile 3
+    python health_cli.py path/to/profiles.db charts --out charts/ --jobs 4
+    python health_cli.py path/to/profiles.db charts --out charts/ --heatmap 2025 --heatmap-mode goal
+    python health_cli.py path/to/profiles.db cohort --days 30 --sort steps_goal_pct
+    python health_cli.py path/to/profiles.db compact --keep-days 365 --zstd --vacuum
+    python health_cli.py team_a/ combined team_b/ team_c/
+    python health_cli.py laptop/ sync shared/
+"""
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import health_archive
+import health_cohort
+import health_db
+import health_export
+import health_import
+import health_insights
+import health_pool
+import health_quality
+import health_sync
+import health_metrics
+
+# work split across processes: each one keeps its own connection
+
+_proc_conn = None
+
+def _init_process(db_path):
+    global _proc_conn
+    _proc_conn = sqlite3.connect(db_path)
+    health_db.apply_storage_profile(_proc_conn, health_db.DEFAULT_STORAGE)
+
+def _chunks(items, n):
+    size = max(1, -(-len(items) // n))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _map(fn, items, db_path, jobs):
+    """fn(conn, chunk) over chunks of items, in-process or on a process pool; flat results."""
+    if not items: return []
+    if jobs <= 1:
+        conn = sqlite3.connect(db_path)
+        try: return fn(conn, items)
+        finally: conn.close()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_process, initargs=(db_path,)) as pool:
+        parts = pool.map(_call_in_process, [fn] * jobs, _chunks(items, jobs))
+        return [r for part in parts for r in part]
+
+def _call_in_process(fn, chunk):
+    return fn(_proc_conn, chunk)
+
+def _profiles(conn, selector):
+    rows = health_db.list_profiles(conn)
+    if selector is None: return rows
+    pid = health_import.resolve_profile(conn, selector)
+    return [r for r in rows if r[0] == pid]
+
+# recalc
+
+def _recalc_chunk(conn, rows):
+    """[(id, height_cm, weight_kg)] -> [(bmi, category, water_l, step_goal, id)] in one vectorized pass.
+
+    Like health_metrics.profile_metrics, a NULL or zero height (or a NULL weight) gives
+    bmi None, 'Unknown' and the no-BMI goals.
+    """
+    ids = [r[0] for r in rows]
+    out = health_metrics.recommend_batch([r[2] for r in rows], [r[1] for r in rows])
+    labels = health_metrics.category_labels(out['category'])
+    updates = []
+    for i, pid in enumerate(ids):
+        bmi = float(out['bmi'][i])
+        updates.append((None if bmi != bmi else bmi, labels[i], float(out['water_l'][i]), int(out['step_goal'][i]), pid))
+    return updates
+
+def cmd_recalc(conn, args):
+    rows = conn.execute("SELECT id, height_cm, weight_kg FROM profiles ORDER BY id;").fetchall()
+    updates = _map(_recalc_chunk, rows, args.db_path, args.jobs)
+    with conn:
+        conn.executemany("UPDATE profiles SET bmi=?, category=?, water_l=?, step_goal=? WHERE id=?;", updates)
+    print(f"recalculated {len(updates)} profiles")
+    return 0
+
+# import / export
+
+def cmd_import(conn, args):
+    return health_import.run(conn, args)
+
+def cmd_export(conn, args):
+    pid = health_import.resolve_profile(conn, args.profile)
+    for path, n in health_export.export_folder(conn, args.out, args.format, pid, args.kinds, compress=args.zstd):
+        print(f"{path}: {n} rows")
+    if args.report:
+        try: pages = health_export.write_report(conn, args.report, profile_id=pid)
+        except ImportError:
+            print("error: the summary report needs matplotlib (pip install matplotlib)", file=sys.stderr); return 2
+        print(f"{args.report}: {pages} pages")
+    return 0
+
+# insights
+
+def _insights_chunk(conn, rows, exclude_flagged=False):
+    return [(pid, name, health_insights.build_insights(conn, pid, exclude_flagged)) for pid, name in rows]
+
+class _InsightsJob:
+    def __init__(self, exclude_flagged): self.exclude_flagged = exclude_flagged
+    def __call__(self, conn, rows): return _insights_chunk(conn, rows, self.exclude_flagged)
+
+def cmd_insights(conn, args):
+    if args.exclude_flagged: health_quality.scan(conn)   # flags must be current before they're left out
+    for pid, name, text in _map(_InsightsJob(args.exclude_flagged), _profiles(conn, args.profile), args.db_path, args.jobs):
+        print(f"== {pid}: {name} ==")
+        print(text); print()
+    return 0
+
+# charts
+
+def _safe_name(name):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'profile'
+
+def _charts_chunk(conn, rows, out_dir=None, kinds=(), year=None, mode='amount'):
+    import health_charts   # matplotlib is only needed for this command
+    written = []
+    for pid, name in rows:
+        for kind in kinds:
+            if year is not None:
+                if kind not in health_db.LOG_TABLES: continue
+                path = os.path.join(out_dir, f"{pid}_{_safe_name(name)}_{kind}_{year}.png")
+                if health_charts.render_year_png(conn, pid, kind, year, path, mode): written.append(path)
+                continue
+            path = os.path.join(out_dir, f"{pid}_{_safe_name(name)}_{kind}.png")
+            if health_charts.render_png(conn, pid, kind, path, title=f"{name}: {health_charts.CHART_META[kind][1]}"):
+                written.append(path)
+    return written
+
+class _ChartJob:
+    """Picklable wrapper so the output options travel to the worker processes."""
+    def __init__(self, out_dir, kinds, year=None, mode='amount'): self.out_dir = out_dir; self.kinds = kinds; self.year = year; self.mode = mode
+    def __call__(self, conn, rows): return _charts_chunk(conn, rows, self.out_dir, self.kinds, self.year, self.mode)
+
+def cmd_charts(conn, args):
+    os.makedirs(args.out, exist_ok=True)
+    written = _map(_ChartJob(args.out, args.kinds, args.heatmap, args.heatmap_mode), _profiles(conn, args.profile), args.db_path, args.jobs)
+    for path in written: print(path)
+    print(f"{len(written)} charts written")
+    return 0
+
+# data quality
+
+def cmd_scan(conn, args):
+    result = health_quality.scan(conn, full=args.full)
+    n = len(result['profiles'])
+    print(f"{result['rows']} rows scanned in {n} profile{'s' if n != 1 else ''}, {result['flags']} flags written")
+    pid = health_import.resolve_profile(conn, args.profile)
+    for (kind, reason), n in sorted(health_quality.flag_counts(conn, pid).items()):
+        print(f"  {kind:<6} {health_quality.REASONS[reason]:<16} {n}")
+    if args.list:
+        for fpid, name in _profiles(conn, args.profile):
+            rows = health_quality.flag_rows(conn, fpid, limit=args.limit or -1)
+            if not rows: continue
+            print(f"== {fpid}: {name} ==")
+            for kind, day, reason, value, detail in rows:
+                print(f"  {day}  {kind:<6} {health_quality.REASONS[reason]:<16} {_fmt(value):>10}  {detail}")
+    return 0
+
+# cohort
+
+class _CohortJob:
+    def __init__(self, days): self.days = days
+    def __call__(self, conn, ids): return health_cohort.cohort_rows(conn, self.days, profile_ids=ids)
+
+def _fmt(value):
+    if value is None: return "-"
+    return f"{value:,.1f}" if isinstance(value, float) else str(value)
+
+def cmd_cohort(conn, args):
+    days = None if args.days == 0 else args.days
+    if args.jobs > 1:
+        ids = [r[0] for r in conn.execute("SELECT id FROM profiles ORDER BY id;")]
+        rows = _map(_CohortJob(days), ids, args.db_path, args.jobs)
+    else:
+        rows = health_cohort.cohort_rows(conn, days)
+    rows = health_cohort.sort_rows(rows, args.sort, descending=not args.ascending)
+    if args.format == 'csv':
+        writer = csv.writer(sys.stdout); writer.writerow(health_cohort.COLUMNS); writer.writerows(rows)
+        return 0
+    shown = [[_fmt(v) for v in row] for row in rows[:args.limit or None]]
+    widths = [max([len(c)] + [len(r[i]) for r in shown]) for i, c in enumerate(health_cohort.COLUMNS)]
+    print("  ".join(c.rjust(w) for c, w in zip(health_cohort.COLUMNS, widths)))
+    for row in shown:
+        print("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+    team = health_cohort.summary(rows)
+    print(f"\n{team['profiles']} profiles, window {'all history' if days is None else f'{days} days'}: "
+          f"steps avg {_fmt(team['steps_avg'])} ({_fmt(team['steps_goal_pct'])}% of days at goal), "
+          f"water avg {_fmt(team['water_avg'])} ml ({_fmt(team['water_goal_pct'])}% at goal)")
+    print("BMI categories: " + ", ".join(f"{k} {v}" for k, v in team['categories'].items()))
+    return 0
+
+# archive
+
+def cmd_compact(conn, args):
+    cutoff = date.fromisoformat(args.before) if args.before else date.today() - timedelta(days=args.keep_days)
+    pid = health_import.resolve_profile(conn, args.profile)
+    moved = health_archive.compact(conn, cutoff, profile_ids=None if pid is None else [pid],
+                                   kinds=args.kinds, compress=args.zstd)
+    for kind, n in moved.items(): print(f"{kind}: {n} rows before {cutoff} moved to {health_archive.ARCHIVE_DIR}/")
+    if args.vacuum:
+        conn.execute("VACUUM;"); print("database vacuumed")
+    return 0
+
+# several databases at once
+
+def _db_path(path):
+    return os.path.join(path, health_db.DB_FILENAME) if os.path.isdir(path) else path
+
+def cmd_combined(conn, args):
+    with health_pool.CombinedView([args.db_path] + [_db_path(p) for p in args.others]) as view:
+        rows = view.profile_summary()
+    if args.format == 'csv':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(('folder', 'id', 'name', 'category', 'step_goal', 'steps_avg', 'water_goal_ml', 'water_avg'))
+        writer.writerows(rows)
+        return 0
+    for folder, pid, name, cat, step_goal, s_avg, w_goal, w_avg in rows:
+        print(f"{os.path.basename(folder) or folder:<20} {pid:>6}  {name:<24} {cat or '-':<12} "
+              f"steps {_fmt(s_avg):>8} / {_fmt(step_goal):<6} water {_fmt(w_avg):>8} / {_fmt(w_goal)} ml")
+    print(f"{len(rows)} profiles in {1 + len(args.others)} databases")
+    return 0
+
+def cmd_sync(conn, args):
+    pulled, pushed, secs = health_sync.sync(conn, _db_path(args.peer))
+    for what, counts in (('pulled', pulled), ('pushed', pushed)):
+        print(f"{what}: {counts['profile']} profiles, {counts['steps']} step days, {counts['water']} water days"
+              + (f" ({counts['skipped']} rows of deleted profiles skipped)" if counts['skipped'] else ""))
+    print(f"synced in {secs:.2f}s")
+    return 0
+
+# entry point
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless tools for the Health Metric Calculator database")
+    parser.add_argument('db', help="path to profiles.db (or the folder containing it)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('recalc', help="recompute BMI, category and goals for every profile")
+    p.add_argument('--jobs', type=int, default=1, help="worker processes")
+    p.set_defaults(func=cmd_recalc)
+
+    p = sub.add_parser('import', help="bulk import CSV / JSONL step or water logs")
+    health_import.add_arguments(p)
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('export', help="export profiles and step / water logs (archived history included)")
+    p.add_argument('--out', required=True, help="output folder")
+    p.add_argument('--format', choices=health_export.FORMATS, default='csv', help="columnar: int32 row groups, see health_export")
+    p.add_argument('--zstd', action='store_true', help="compress columnar row groups (needs the zstandard package)")
+    p.add_argument('--report', metavar='PDF', help="also write a summary report with charts (needs matplotlib)")
+    p.add_argument('--profile', help="profile id or name (default: all)")
+    p.add_argument('--kind', dest='kinds', action='append', choices=sorted(health_db.LOG_TABLES), help="default: both")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('insights', help="print the Insights summary")
+    p.add_argument('--profile', help="profile id or name (default: all)")
+    p.add_argument('--exclude-flagged', action='store_true', help="leave days flagged by `scan` out of the averages")
+    p.add_argument('--jobs', type=int, default=1, help="worker processes")
+    p.set_defaults(func=cmd_insights)
+
+    p = sub.add_parser('charts', help="render steps / water charts to PNG")
+    p.add_argument('--out', required=True, help="output folder")
+    p.add_argument('--profile', help="profile id or name (default: all)")
+    p.add_argument('--kind', dest='kinds', action='append', choices=sorted(health_db.LOG_TABLES) + ['bmi'], help="default: steps and water")
+    p.add_argument('--heatmap', type=int, metavar='YEAR', help="write year-at-a-glance heatmaps for YEAR instead of line charts")
+    p.add_argument('--heatmap-mode', choices=['amount', 'goal'], default='amount', help="shade by amount or by goal met")
+    p.add_argument('--jobs', type=int, default=1, help="worker processes")
+    p.set_defaults(func=cmd_charts)
+
+    p = sub.add_parser('cohort', help="leaderboard and team statistics across all profiles")
+    p.add_argument('--days', type=int, default=30, help="window for averages and goal attainment, 0 = all history")
+    p.add_argument('--sort', choices=health_cohort.COLUMNS, default='steps_avg')
+    p.add_argument('--ascending', action='store_true')
+    p.add_argument('--limit', type=int, default=0, help="rows to print (default: all)")
+    p.add_argument('--format', choices=['table', 'csv'], default='table')
+    p.add_argument('--jobs', type=int, default=1, help="worker processes (one profile partition each)")
+    p.set_defaults(func=cmd_cohort)
+
+    p = sub.add_parser('scan', help="flag impossible values, outliers, repeated imports and gaps (only rows changed since the last scan)")
+    p.add_argument('--full', action='store_true', help="rescan all history")
+    p.add_argument('--list', action='store_true', help="print the flagged days")
+    p.add_argument('--profile', help="profile id or name (default: all)")
+    p.add_argument('--limit', type=int, default=200, help="flagged days listed per profile, 0 = all")
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser('compact', help="move old log rows into columnar archive files next to the database")
+    when = p.add_mutually_exclusive_group()
+    when.add_argument('--before', help="archive rows dated before this day (YYYY-MM-DD)")
+    when.add_argument('--keep-days', type=int, default=365, help="keep this many recent days live (default 365)")
+    p.add_argument('--profile', help="profile id or name (default: all)")
+    p.add_argument('--kind', dest='kinds', action='append', choices=sorted(health_db.LOG_TABLES), help="default: both")
+    p.add_argument('--zstd', action='store_true', help="compress archives (needs the zstandard package)")
+    p.add_argument('--vacuum', action='store_true', help="shrink the database file afterwards")
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser('combined', help="lifetime averages for every profile across several databases (read-only ATTACH)")
+    p.add_argument('others', nargs='+', help="more profiles.db files or folders")
+    p.add_argument('--format', choices=['table', 'csv'], default='table')
+    p.set_defaults(func=cmd_combined)
+
+    p = sub.add_parser('sync', help="exchange changes with another copy of the database (newest write wins)")
+    p.add_argument('peer', help="the other profiles.db or its folder")
+    p.set_defaults(func=cmd_sync)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.db_path = _db_path(args.db)
+    if hasattr(args, 'kinds') and not args.kinds: args.kinds = sorted(health_db.LOG_TABLES)
+    if hasattr(args, 'jobs'): args.jobs = max(1, args.jobs)
+    else: args.jobs = 1
+    conn = health_db.connect(args.db_path)   # creates / migrates the schema once, before any workers start
+    try:
+        return args.func(conn, args)
+    except (health_import.ImportFileError, health_archive.ArchiveError, health_export.ExportError,
+            health_sync.SyncError, health_pool.CombinedViewError, FileNotFoundError) as e:
+        print(f"error: {e}", file=sys.stderr); return 2
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Cohort view over every profile in a database: averages, goal attainment, BMI mix.
+
+Each log kind is one grouped query. The profiles table drives a nested loop
+into the (profile_id, date, value) covering index, so a recent window only
+touches that window's index entries. Lifetime averages come from the
+trigger-maintained log_totals table and never scan the logs. Pass
+`profile_ids` to work on one partition (the CLI fans partitions out to a
+process pool with --jobs).
+"""
+import collections
+from datetime import date, timedelta
+
+import health_db
+import health_metrics
+
+# one row per profile, in this column order
+COLUMNS = ('id', 'name', 'bmi', 'category', 'step_goal', 'water_goal_ml',
+           'steps_avg', 'steps_days', 'steps_goal_pct', 'steps_avg_all',
+           'water_avg', 'water_days', 'water_goal_pct', 'water_avg_all')
+
+# kind -> SQL goal in log units for the joined profile row
+_GOAL_SQL = {'steps': "p.step_goal", 'water': "p.water_l * 1000"}
+
+def _id_filter(profile_ids):
+    if profile_ids is None: return "", ()
+    ids = list(profile_ids)
+    return f" AND p.id IN ({','.join('?' * len(ids))})", tuple(ids)
+
+def _window_stats(conn, kind, since, profile_ids):
+    """{profile_id: (days logged, average, days at or above goal)} inside the window."""
+    table, col = health_db.LOG_TABLES[kind]
+    where, params = _id_filter(profile_ids)
+    sql = (f"SELECT p.id, count(l.{col}), avg(l.{col}), sum(l.{col} >= {_GOAL_SQL[kind]}) "
+           f"FROM profiles p JOIN {table} l ON l.profile_id = p.id AND l.date >= ? "
+           f"WHERE 1{where} GROUP BY p.id;")
+    return {pid: (n, avg, hits) for pid, n, avg, hits in conn.execute(sql, (since,) + params)}
+
+def cohort_rows(conn, days=30, profile_ids=None, as_of=None):
+    """Rows shaped like COLUMNS for every profile (or just profile_ids).
+
+    days: window for the averages / goal attainment, None for all history.
+    Profiles without logs in the window get None averages and percentages.
+    """
+    since = '' if days is None else ((as_of or date.today()) - timedelta(days=days - 1)).isoformat()
+    window = {kind: _window_stats(conn, kind, since, profile_ids) for kind in health_db.LOG_TABLES}
+    where, params = _id_filter(profile_ids)
+    cur = conn.execute(
+        "SELECT p.id, p.name, p.bmi, p.category, p.step_goal, p.water_l, "
+        "       s.n_values, s.total, w.n_values, w.total "
+        "FROM profiles p "
+        "LEFT JOIN log_totals s ON s.profile_id = p.id AND s.kind = 'steps' "
+        f"LEFT JOIN log_totals w ON w.profile_id = p.id AND w.kind = 'water' WHERE 1{where} ORDER BY p.id;", params)
+    rows = []
+    for pid, name, bmi, cat, step_goal, water_l, s_n, s_total, w_n, w_total in cur:
+        row = [pid, name, bmi, cat, step_goal, None if water_l is None else water_l * 1000]
+        for kind, n_all, total_all in (('steps', s_n, s_total), ('water', w_n, w_total)):
+            n, avg, hits = window[kind].get(pid, (0, None, 0))
+            row += [avg, n, (hits or 0) * 100.0 / n if n else None, total_all / n_all if n_all else None]
+        rows.append(tuple(row))
+    return rows
+
+def sort_rows(rows, column, descending=False):
+    """Rows sorted by one of COLUMNS; profiles without a value go last either way."""
+    i = COLUMNS.index(column)
+    present = sorted((r for r in rows if r[i] is not None), key=lambda r: r[i], reverse=descending)
+    return present + [r for r in rows if r[i] is None]
+
+def category_distribution(rows):
+    """{category: profile count} from cohort_rows() output, in BMI_CATEGORIES order."""
+    counts = collections.Counter(r[3] or "Unknown" for r in rows)
+    order = [label for _, _, label in health_metrics.BMI_CATEGORIES] + ["Unknown"]
+    return {label: counts[label] for label in order + sorted(set(counts) - set(order)) if counts[label]}
+
+def summary(rows):
+    """Team-level numbers: profile count, mean of the per-profile averages / goal percentages."""
+    def mean(i):
+        values = [r[i] for r in rows if r[i] is not None]
+        return sum(values) / len(values) if values else None
+    ix = COLUMNS.index
+    return {'profiles': len(rows), 'steps_avg': mean(ix('steps_avg')), 'steps_goal_pct': mean(ix('steps_goal_pct')),
+            'water_avg': mean(ix('water_avg')), 'water_goal_pct': mean(ix('water_goal_pct')),
+            'categories': category_distribution(rows)}
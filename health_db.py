@@ -0,0 +1,558 @@
+"""SQLite schema and write paths for profiles.db (no GUI imports)."""
+import os
+import sqlite3
+
+import health_metrics
+
+DB_FILENAME = "profiles.db"
+
+# Storage profiles are pragma sets applied on every connect. "fast" is the default;
+# SQLite's WAL needs shared memory, so folders on network shares should use
+# "network" (rollback journal, but without the per-commit directory fsync of FULL).
+# "safe" is the stock SQLite behaviour the app shipped with.
+STORAGE_PROFILES = {
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -32000,          # negative = KiB, so ~32 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    'network': {
+        'journal_mode': 'TRUNCATE',
+        'synchronous': 'NORMAL',
+        'mmap_size': 0,
+        'cache_size': -32000,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 15000,
+    },
+    'safe': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+    },
+}
+DEFAULT_STORAGE = os.environ.get('HEALTH_DB_STORAGE', 'fast')
+
+# log kind -> (table, value column)
+LOG_TABLES = {
+    'steps': ('steps', 'steps'),
+    'water': ('water_logs', 'ml'),
+}
+
+CACHED_STATEMENTS = 256   # prepared statements kept per connection (sqlite3 default is 128)
+
+def connect(db_path, storage=None, factory=sqlite3.Connection):
+    conn = sqlite3.connect(db_path, factory=factory, cached_statements=CACHED_STATEMENTS)
+    apply_storage_profile(conn, storage or DEFAULT_STORAGE)
+    init_schema(conn)
+    if conn.execute("SELECT 1 FROM log_archives WHERE pending LIMIT 1;").fetchone():
+        import health_archive   # a compaction committed but its archive file wasn't renamed into place
+        health_archive.finish_pending(conn)
+    return conn
+
+def db_file(conn):
+    """Path of the connection's main database file ('' for in-memory databases)."""
+    for _, name, path in conn.execute("PRAGMA database_list;"):
+        if name == 'main': return path or ''
+    return ''
+
+def apply_storage_profile(conn, storage):
+    """Apply one of STORAGE_PROFILES (by name) or a dict of pragmas."""
+    pragmas = STORAGE_PROFILES[storage] if isinstance(storage, str) else storage
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value};")
+    return pragmas
+
+def init_schema(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE,
+            height_cm REAL,
+            weight_kg REAL,
+            bmi REAL,
+            category TEXT,
+            water_l REAL,
+            step_goal INTEGER,
+            created_at TEXT
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS steps (
+            id INTEGER PRIMARY KEY,
+            profile_id INTEGER,
+            date TEXT,
+            steps INTEGER,
+            UNIQUE(profile_id, date)
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS water_logs (
+            id INTEGER PRIMARY KEY,
+            profile_id INTEGER,
+            date TEXT,
+            ml INTEGER,
+            UNIQUE(profile_id, date)
+        );
+    """)
+    conn.commit()
+    migrate(conn)
+
+# Versioned migrations, tracked in PRAGMA user_version. Each entry upgrades a
+# database from version N-1 to N; never edit a shipped step, append a new one.
+
+def _m001_covering_indexes(cur):
+    # cover "WHERE profile_id=? ORDER BY date DESC LIMIT 100" and the count/avg
+    # aggregates without touching the table rows
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_steps_profile_date_value ON steps(profile_id, date, steps);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_water_profile_date_value ON water_logs(profile_id, date, ml);")
+
+# Rollups: per-profile running totals plus weekly / monthly aggregates, kept
+# current by triggers so every writer (buttons, importer, other tools) and every
+# ON CONFLICT DO UPDATE overwrite is accounted for. The log tables themselves
+# hold one row per day, so they already are the daily level.
+ROLLUP_PERIODS = {
+    'week': "date({d}, 'weekday 0', '-6 days')",   # monday of the week
+    'month': "strftime('%Y-%m-01', {d})",
+}
+
+def _rollup_statements(kind, table, col, row, sign):
+    """Statements adding (sign=1) or removing (sign=-1) one log row from the rollups."""
+    val = f"coalesce({row}.{col}, 0)"; has_val = f"({row}.{col} IS NOT NULL)"
+    op = '+' if sign > 0 else '-'
+    stmts = [
+        f"INSERT INTO log_totals (profile_id, kind, n, n_values, total) "
+        f"VALUES ({row}.profile_id, '{kind}', {sign}, {sign}*{has_val}, {sign}*{val}) "
+        f"ON CONFLICT(profile_id, kind) DO UPDATE SET n=n{op}1, n_values=n_values{op}{has_val}, total=total{op}{val};"
+    ]
+    for period, expr in ROLLUP_PERIODS.items():
+        start = f"coalesce({expr.format(d=row + '.date')}, '')"
+        stmts.append(
+            f"INSERT INTO log_rollups (profile_id, kind, period, start, n, n_values, total) "
+            f"VALUES ({row}.profile_id, '{kind}', '{period}', {start}, {sign}, {sign}*{has_val}, {sign}*{val}) "
+            f"ON CONFLICT(profile_id, kind, period, start) DO UPDATE SET n=n{op}1, n_values=n_values{op}{has_val}, total=total{op}{val};")
+    return stmts
+
+def _rollup_triggers(kind, table, col):
+    add_new = _rollup_statements(kind, table, col, 'NEW', 1)
+    drop_old = _rollup_statements(kind, table, col, 'OLD', -1)
+    body = lambda stmts: "\n    ".join(stmts)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_ins AFTER INSERT ON {table} BEGIN\n    {body(add_new)}\nEND;",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_upd AFTER UPDATE OF profile_id, date, {col} ON {table} BEGIN\n    {body(drop_old + add_new)}\nEND;",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_del AFTER DELETE ON {table} BEGIN\n    {body(drop_old)}\nEND;",
+    ]
+
+def _m002_rollups(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS log_totals (
+            profile_id INTEGER,
+            kind TEXT,
+            n INTEGER NOT NULL,
+            n_values INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY(profile_id, kind)
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS log_rollups (
+            profile_id INTEGER,
+            kind TEXT,
+            period TEXT,
+            start TEXT,
+            n INTEGER NOT NULL,
+            n_values INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY(profile_id, kind, period, start)
+        );
+    """)
+    for kind, (table, col) in LOG_TABLES.items():
+        # backfill from existing history, then let the triggers take over
+        cur.execute(f"INSERT INTO log_totals (profile_id, kind, n, n_values, total) "
+                    f"SELECT profile_id, '{kind}', count(*), count({col}), coalesce(sum({col}), 0) FROM {table} GROUP BY profile_id;")
+        for period, expr in ROLLUP_PERIODS.items():
+            start = f"coalesce({expr.format(d='date')}, '')"
+            cur.execute(f"INSERT INTO log_rollups (profile_id, kind, period, start, n, n_values, total) "
+                        f"SELECT profile_id, '{kind}', '{period}', {start}, count(*), count({col}), coalesce(sum({col}), 0) "
+                        f"FROM {table} GROUP BY profile_id, {start};")
+        for sql in _rollup_triggers(kind, table, col):
+            cur.execute(sql)
+
+# Intraday events (per-minute steps, several drinks a day), one clustered table
+# per kind keyed by (profile_id, ts) so a time range is a single index range.
+# ts is local wall-clock time in seconds since 1970-01-01, so date(ts, 'unixepoch')
+# is the same calendar day the daily tables use. health_intraday keeps log_hourly
+# and the daily rows in sync with them.
+EVENT_TABLES = {'steps': 'steps_events', 'water': 'water_events'}
+
+def _m003_intraday_events(cur):
+    for table in EVENT_TABLES.values():
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                profile_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                PRIMARY KEY(profile_id, ts)
+            ) WITHOUT ROWID;
+        """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS log_hourly (
+            profile_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY(profile_id, kind, hour)
+        ) WITHOUT ROWID;
+    """)
+
+# Measurements: append-only history of each profile's body values and goals.
+# Triggers on profiles add a row whenever a profile is created or one of these
+# values changes, so every writer (edit, recalculate, the CLI) is recorded.
+MEASURED_COLUMNS = ('height_cm', 'weight_kg', 'bmi', 'category', 'water_l', 'step_goal')
+_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+def _m004_measurements(cur):
+    cols = ", ".join(MEASURED_COLUMNS); new = ", ".join(f"NEW.{c}" for c in MEASURED_COLUMNS)
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in MEASURED_COLUMNS)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS measurements (
+            profile_id INTEGER NOT NULL,
+            measured_at TEXT NOT NULL,
+            height_cm REAL,
+            weight_kg REAL,
+            bmi REAL,
+            category TEXT,
+            water_l REAL,
+            step_goal INTEGER,
+            PRIMARY KEY(profile_id, measured_at)
+        ) WITHOUT ROWID;
+    """)
+    # existing profiles start their history at creation (or now, if that isn't a readable time)
+    cur.execute(f"INSERT OR IGNORE INTO measurements (profile_id, measured_at, {cols}) "
+                f"SELECT id, coalesce(strftime('%Y-%m-%d %H:%M:%f', created_at), {_NOW}), {cols} FROM profiles;")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_profiles_measure_ins AFTER INSERT ON profiles BEGIN\n"
+                f"    INSERT OR REPLACE INTO measurements (profile_id, measured_at, {cols}) VALUES (NEW.id, {_NOW}, {new});\nEND;")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_profiles_measure_upd AFTER UPDATE OF {cols} ON profiles WHEN {changed} BEGIN\n"
+                f"    INSERT OR REPLACE INTO measurements (profile_id, measured_at, {cols}) VALUES (NEW.id, {_NOW}, {new});\nEND;")
+
+# Change log for delta sync (health_sync): one row per profile (keyed by name,
+# ids differ between copies) and per log day, with the UTC time it last changed,
+# a tombstone flag and a database-wide sequence number that sync watermarks
+# point into. Triggers keep it current for every writer. A 'paused' row in
+# sync_meta turns them off for one transaction (archiving, applying a sync).
+SYNC_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+_SYNC_NEXT = "(SELECT coalesce(max(seq), 0) + 1 FROM sync_rows)"
+_SYNC_ON = "NOT EXISTS (SELECT 1 FROM sync_meta WHERE key = 'paused')"
+
+def _sync_record(kind, name, day, deleted):
+    return (f"INSERT INTO sync_rows (kind, name, day, mtime, deleted, seq) "
+            f"VALUES ('{kind}', {name}, {day}, {SYNC_NOW}, {deleted}, {_SYNC_NEXT}) "
+            f"ON CONFLICT(kind, name, day) DO UPDATE SET mtime=excluded.mtime, deleted=excluded.deleted, seq=excluded.seq;")
+
+def _m005_sync_log(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sync_rows (
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            day TEXT NOT NULL,
+            mtime TEXT NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            seq INTEGER NOT NULL,
+            PRIMARY KEY(kind, name, day)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_rows_seq ON sync_rows(seq);")
+    cur.execute("CREATE TABLE IF NOT EXISTS sync_meta (key TEXT PRIMARY KEY, value TEXT);")
+    cur.execute("INSERT OR IGNORE INTO sync_meta (key, value) VALUES ('db_id', lower(hex(randomblob(16))));")
+    # what exists now counts as changed now, so the first sync with a peer sends everything once
+    cur.execute(f"INSERT OR IGNORE INTO sync_rows (kind, name, day, mtime, deleted, seq) "
+                f"SELECT 'profile', name, '', {SYNC_NOW}, 0, row_number() OVER (ORDER BY id) FROM profiles WHERE name IS NOT NULL;")
+    for kind, (table, col) in LOG_TABLES.items():
+        last = cur.execute("SELECT coalesce(max(seq), 0) FROM sync_rows;").fetchone()[0]
+        cur.execute(f"INSERT OR IGNORE INTO sync_rows (kind, name, day, mtime, deleted, seq) "
+                    f"SELECT '{kind}', p.name, l.date, {SYNC_NOW}, 0, {last} + row_number() OVER (ORDER BY l.id) "
+                    f"FROM {table} l JOIN profiles p ON p.id = l.profile_id WHERE p.name IS NOT NULL AND l.date IS NOT NULL;")
+    on = f"WHEN {_SYNC_ON} AND NEW.name IS NOT NULL"
+    upsert = _sync_record('profile', 'NEW.name', "''", 0); tombstone = _sync_record('profile', 'OLD.name', "''", 1)
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_profiles_sync_ins AFTER INSERT ON profiles {on} BEGIN\n    {upsert}\nEND;")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_profiles_sync_upd AFTER UPDATE ON profiles {on} BEGIN\n    {upsert}\nEND;")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_profiles_sync_del AFTER DELETE ON profiles "
+                f"WHEN {_SYNC_ON} AND OLD.name IS NOT NULL BEGIN\n    {tombstone}\nEND;")
+    for kind, (table, col) in LOG_TABLES.items():
+        for event, row, deleted in (('INSERT', 'NEW', 0), (f'UPDATE OF profile_id, date, {col}', 'NEW', 0), ('DELETE', 'OLD', 1)):
+            name = f"(SELECT name FROM profiles WHERE id = {row}.profile_id)"
+            cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_{event.split()[0].lower()} AFTER {event} ON {table} "
+                        f"WHEN {_SYNC_ON} AND {name} IS NOT NULL AND {row}.date IS NOT NULL BEGIN\n"
+                        f"    {_sync_record(kind, name, f'{row}.date', deleted)}\nEND;")
+
+def pause_change_log(conn, reason='paused'):
+    """Stop recording sync changes until resume_change_log(); call both inside one transaction."""
+    conn.execute("INSERT OR REPLACE INTO sync_meta (key, value) VALUES ('paused', ?);", (reason,))
+
+def resume_change_log(conn):
+    conn.execute("DELETE FROM sync_meta WHERE key = 'paused';")
+
+# Data-quality flags (health_quality): one row per flagged log day and reason,
+# and the scanner's checkpoint per kind, a position in sync_rows' seq (plus the
+# profile to resume from when a pass was cut short).
+EXCLUDED_FLAGS = ('range', 'outlier', 'repeat')   # reasons Insights can leave out; a 'gap' flag marks a valid day
+
+def _m006_log_flags(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS log_flags (
+            profile_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            date TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            value NUMERIC,
+            detail TEXT,
+            PRIMARY KEY(profile_id, kind, date, reason)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_log_flags_reason ON log_flags(kind, reason);")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS scan_state (
+            kind TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL DEFAULT 0,
+            target INTEGER,
+            next_profile INTEGER
+        );
+    """)
+
+# Archived days (health_archive) stay counted in the rollups, and a live row saved
+# again for an archived day replaces it on reads. log_archives holds each archive's
+# last day; the triggers below note live rows dated on or before it in
+# archive_overlaps, and health_archive.resolve_overlaps() fills in the archived value
+# (n = 1 when the day is in the archive, 0 when it isn't). Setting n = 1 takes the
+# archived value out of the rollups, deleting the row (the live row went) puts it
+# back. pending marks a compaction whose transaction committed before its file was
+# renamed into place (connect() finishes it).
+
+def _m007_archive_overlaps(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS log_archives (
+            profile_id INTEGER,
+            kind TEXT,
+            last_day TEXT NOT NULL,
+            pending INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(profile_id, kind)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS archive_overlaps (
+            profile_id INTEGER,
+            kind TEXT,
+            date TEXT,
+            n INTEGER,
+            value INTEGER,
+            PRIMARY KEY(profile_id, kind, date)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_archive_overlaps_open ON archive_overlaps(profile_id) WHERE n IS NULL;")
+    for kind, (table, col) in LOG_TABLES.items():
+        archived = f"NEW.date <= (SELECT last_day FROM log_archives WHERE profile_id = NEW.profile_id AND kind = '{kind}')"
+        note = f"INSERT OR IGNORE INTO archive_overlaps (profile_id, kind, date) SELECT NEW.profile_id, '{kind}', NEW.date"
+        forget = f"DELETE FROM archive_overlaps WHERE profile_id = OLD.profile_id AND kind = '{kind}' AND date = OLD.date;"
+        drop_archived = _rollup_statements(kind, 'archive_overlaps', 'value', 'NEW', -1)
+        add_archived = _rollup_statements(kind, 'archive_overlaps', 'value', 'OLD', 1)
+        body = lambda stmts: "\n    ".join(stmts)
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_overlap_ins AFTER INSERT ON {table} WHEN {archived} BEGIN\n    {note};\nEND;")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_overlap_upd AFTER UPDATE OF profile_id, date ON {table} BEGIN\n"
+                    f"    {forget}\n    {note} WHERE {archived};\nEND;")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_overlap_del AFTER DELETE ON {table} BEGIN\n    {forget}\nEND;")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_archive_overlaps_{kind}_resolve AFTER UPDATE OF n ON archive_overlaps "
+                    f"WHEN NEW.kind = '{kind}' AND OLD.n IS NULL AND NEW.n = 1 BEGIN\n    {body(drop_archived)}\nEND;")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_archive_overlaps_{kind}_del AFTER DELETE ON archive_overlaps "
+                    f"WHEN OLD.kind = '{kind}' AND OLD.n = 1 BEGIN\n    {body(add_archived)}\nEND;")
+    if db_file(cur.connection):
+        import health_archive   # databases compacted before this step already have archives
+        health_archive.register_archives(cur.connection)
+
+MIGRATIONS = [
+    _m001_covering_indexes,
+    _m002_rollups,
+    _m003_intraday_events,
+    _m004_measurements,
+    _m005_sync_log,
+    _m006_log_flags,
+    _m007_archive_overlaps,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+def migrate(conn):
+    """Bring an existing profiles.db up to SCHEMA_VERSION; returns the steps applied."""
+    version = schema_version(conn); applied = []
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        step = MIGRATIONS[target - 1]
+        with conn:
+            cur = conn.cursor()
+            step(cur)
+            cur.execute(f"PRAGMA user_version={target};")
+        applied.append(step.__name__)
+    if applied: conn.execute("ANALYZE;")
+    return applied
+
+def _upsert_sql(kind):
+    table, col = LOG_TABLES[kind]
+    return (f"INSERT INTO {table} (profile_id, date, {col}) VALUES (?, ?, ?) "
+            f"ON CONFLICT(profile_id, date) DO UPDATE SET {col}=excluded.{col};")
+
+def upsert_log(conn, kind, profile_id, day, value):
+    """Single-row upsert used by the Add / Update buttons; commits immediately."""
+    conn.execute(_upsert_sql(kind), (profile_id, day, value))
+    resolve_archive_overlaps(conn)
+    conn.commit()
+
+def upsert_logs(conn, kind, rows):
+    """Bulk upsert of (profile_id, date, value) rows with one executemany.
+
+    Does not commit: callers group many batches into one transaction.
+    Later rows for the same (profile_id, date) win, like repeated single saves.
+    """
+    cur = conn.executemany(_upsert_sql(kind), rows)
+    resolve_archive_overlaps(conn)
+    return cur.rowcount
+
+def resolve_archive_overlaps(conn):
+    """Take archived days saved again out of the rollups (see _m007_archive_overlaps); doesn't commit."""
+    if conn.execute("SELECT 1 FROM archive_overlaps WHERE n IS NULL LIMIT 1;").fetchone():
+        import health_archive
+        health_archive.resolve_overlaps(conn)
+
+# profiles
+
+def list_profiles(conn):
+    return conn.execute("SELECT id, name FROM profiles ORDER BY name;").fetchall()
+
+def get_profile(conn, profile_id):
+    """(id, name, height_cm, weight_kg, bmi, category, water_l, step_goal) or None."""
+    return conn.execute("SELECT id, name, height_cm, weight_kg, bmi, category, water_l, step_goal FROM profiles WHERE id=?;",
+                        (profile_id,)).fetchone()
+
+def create_profile(conn, name, height_cm, weight_kg, bmi, category, water_l, step_goal, created_at):
+    """Insert (or replace, by name) a profile and return its id."""
+    conn.execute("""INSERT OR REPLACE INTO profiles (name, height_cm, weight_kg, bmi, category, water_l, step_goal, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?);""", (name, height_cm, weight_kg, bmi, category, water_l, step_goal, created_at))
+    conn.commit()
+    return profile_id_by_name(conn, name)
+
+def update_profile(conn, profile_id, height_cm, weight_kg, bmi, category, water_l, step_goal):
+    conn.execute("UPDATE profiles SET height_cm=?, weight_kg=?, bmi=?, category=?, water_l=?, step_goal=? WHERE id=?;",
+                 (height_cm, weight_kg, bmi, category, water_l, step_goal, profile_id))
+    conn.commit()
+
+def recalculate_profile(conn, profile_id):
+    """Recompute BMI and goals from the stored height/weight; False if the profile is gone."""
+    row = conn.execute("SELECT height_cm, weight_kg FROM profiles WHERE id=?;", (profile_id,)).fetchone()
+    if not row: return False
+    bmi, cat, water_l, step_goal = health_metrics.profile_metrics(row[1], row[0])
+    conn.execute("UPDATE profiles SET bmi=?, category=?, water_l=?, step_goal=? WHERE id=?;", (bmi, cat, water_l, step_goal, profile_id))
+    conn.commit()
+    return True
+
+def insights_data(conn, profile_id, exclude_flagged=False):
+    """Everything the Insights tab needs: ((bmi, category, step_goal, water_l), steps stats, water stats)."""
+    p_row = conn.execute("SELECT bmi, category, step_goal, water_l FROM profiles WHERE id=?;", (profile_id,)).fetchone()
+    if not p_row: return None
+    return p_row, log_stats(conn, profile_id, 'steps', exclude_flagged), log_stats(conn, profile_id, 'water', exclude_flagged)
+
+def measurements(conn, profile_id, since=None):
+    """[(measured_at, height_cm, weight_kg, bmi, category, water_l, step_goal)] oldest first."""
+    return conn.execute(f"SELECT measured_at, {', '.join(MEASURED_COLUMNS)} FROM measurements "
+                        f"WHERE profile_id=? AND measured_at >= ? ORDER BY measured_at;", (profile_id, since or '')).fetchall()
+
+def measurement_as_of(conn, profile_id, day):
+    """The measurement in effect on `day` (a date or ISO date): the last one taken that day or
+    before, else the last one of the first day (history that predates the profile uses its first goals)."""
+    day = day.isoformat() if hasattr(day, 'isoformat') else day
+    sql = (f"SELECT measured_at, {', '.join(MEASURED_COLUMNS)} FROM measurements WHERE profile_id=? "
+           f"AND measured_at < date(?, '+1 day') ORDER BY measured_at DESC LIMIT 1;")
+    row = conn.execute(sql, (profile_id, day)).fetchone()
+    if row is None:
+        first = conn.execute("SELECT min(measured_at) FROM measurements WHERE profile_id=?;", (profile_id,)).fetchone()[0]
+        row = conn.execute(sql, (profile_id, first[:10])).fetchone() if first else None
+    return row
+
+def profile_ids(conn):
+    return {r[0] for r in conn.execute("SELECT id FROM profiles;")}
+
+def profile_id_by_name(conn, name):
+    row = conn.execute("SELECT id FROM profiles WHERE name=?;", (name,)).fetchone()
+    return row[0] if row else None
+
+def delete_profile(conn, profile_id):
+    delete_profile_rows(conn.cursor(), profile_id)
+    conn.commit()
+    import health_archive   # ids get reused, so archived history must go with the profile
+    health_archive.delete_archives(health_archive.archive_folder(conn), profile_id)
+
+def delete_profile_rows(cur, profile_id):
+    """Every row of one profile, without committing (archive files are the caller's job)."""
+    cur.execute("DELETE FROM steps WHERE profile_id=?;", (profile_id,))
+    cur.execute("DELETE FROM water_logs WHERE profile_id=?;", (profile_id,))
+    cur.execute("DELETE FROM log_totals WHERE profile_id=?;", (profile_id,))
+    cur.execute("DELETE FROM log_rollups WHERE profile_id=?;", (profile_id,))
+    for table in EVENT_TABLES.values():
+        cur.execute(f"DELETE FROM {table} WHERE profile_id=?;", (profile_id,))
+    cur.execute("DELETE FROM log_hourly WHERE profile_id=?;", (profile_id,))
+    cur.execute("DELETE FROM measurements WHERE profile_id=?;", (profile_id,))
+    cur.execute("DELETE FROM log_flags WHERE profile_id=?;", (profile_id,))
+    cur.execute("DELETE FROM archive_overlaps WHERE profile_id=?;", (profile_id,))
+    cur.execute("DELETE FROM log_archives WHERE profile_id=?;", (profile_id,))
+    cur.execute("DELETE FROM profiles WHERE id=?;", (profile_id,))
+
+# rollup readers
+
+def flagged_days_sql(kind):
+    """SQL for the days of one profile (?) and kind that carry an EXCLUDED_FLAGS flag."""
+    reasons = ', '.join(f"'{r}'" for r in EXCLUDED_FLAGS)
+    return f"SELECT date FROM log_flags WHERE profile_id=? AND kind='{kind}' AND reason IN ({reasons})"
+
+def log_stats(conn, profile_id, kind, exclude_flagged=False):
+    """(entries, average value) from the maintained totals, like count(*), avg(col).
+
+    exclude_flagged leaves out the live rows health_quality flagged (see EXCLUDED_FLAGS).
+    """
+    row = conn.execute("SELECT n, n_values, total FROM log_totals WHERE profile_id=? AND kind=?;", (profile_id, kind)).fetchone()
+    if not row or not row[0]: return 0, None
+    n, n_values, total = row
+    if exclude_flagged:
+        table, col = LOG_TABLES[kind]
+        fn, fnv, ftotal = conn.execute(f"SELECT count(*), count({col}), coalesce(sum({col}), 0) FROM {table} "
+                                       f"WHERE profile_id=? AND date IN ({flagged_days_sql(kind)});", (profile_id, profile_id)).fetchone()
+        n -= fn; n_values -= fnv; total -= ftotal
+        if n <= 0: return 0, None
+    return n, (total / n_values if n_values else None)
+
+def rollups(conn, profile_id, kind, period, since=None):
+    """[(period start, entries, sum, average)] oldest first, optionally from `since` on."""
+    sql = "SELECT start, n, total, n_values FROM log_rollups WHERE profile_id=? AND kind=? AND period=? AND n > 0"
+    params = [profile_id, kind, period]
+    if since: sql += " AND start >= ?"; params.append(since)
+    rows = conn.execute(sql + " ORDER BY start;", params).fetchall()
+    return [(start, n, total, (total / nv if nv else None)) for start, n, total, nv in rows]
+
+def log_page(conn, profile_id, kind, before=None, after=None, limit=200):
+    """One page of (date, value) rows, newest first, using keyset pagination.
+
+    before: rows strictly older than this date; after: the `limit` rows right
+    after this date. Both walk the (profile_id, date, value) covering index.
+    """
+    table, col = LOG_TABLES[kind]
+    if after is not None:
+        rows = conn.execute(f"SELECT date, {col} FROM {table} WHERE profile_id=? AND date > ? ORDER BY date ASC LIMIT ?;",
+                            (profile_id, after, limit)).fetchall()
+        rows.reverse()
+        return rows
+    if before is not None:
+        return conn.execute(f"SELECT date, {col} FROM {table} WHERE profile_id=? AND date < ? ORDER BY date DESC LIMIT ?;",
+                            (profile_id, before, limit)).fetchall()
+    return conn.execute(f"SELECT date, {col} FROM {table} WHERE profile_id=? ORDER BY date DESC LIMIT ?;",
+                        (profile_id, limit)).fetchall()
@@ -0,0 +1,226 @@
+"""Streaming export of profiles and steps / water history (no GUI imports).
+
+Logs come out one profile at a time, oldest first. Archived history (see
+health_archive) is merged in, and live rows are pulled FETCH_ROWS at a time
+with fetchmany. Memory stays bounded by one batch, however large the database
+is. Formats:
+
+    csv / jsonl   columns profile_id, date, steps|ml (what health_import reads back)
+    columnar      COLUMNAR_HEADER, then row groups of up to GROUP_ROWS rows:
+                  GROUP_FMT (row count, payload bytes), then int32 profile ids,
+                  int32 date.toordinal() days and int32 values (MISSING for
+                  NULL), all little-endian. The payload is one zstd frame when
+                  the header has FLAG_ZSTD.
+
+write_report() renders a PDF summary, one page per profile, with the Graph
+tab styling on the Agg backend.
+"""
+import array
+import csv
+import json
+import os
+import struct
+import sys
+from datetime import date
+
+import health_analytics
+import health_archive
+import health_db
+
+FETCH_ROWS = 5000   # rows pulled per fetchmany, bounds memory on huge histories
+GROUP_ROWS = 65536
+COLUMNAR_MAGIC = b'HEXP'
+COLUMNAR_VERSION = 1
+COLUMNAR_HEADER = '<4sHH8s'   # magic, version, flags, kind (NUL padded)
+GROUP_FMT = '<II'
+FLAG_ZSTD = health_archive.FLAG_ZSTD
+PROFILE_COLUMNS = ('id', 'name', 'height_cm', 'weight_kg', 'bmi', 'category', 'water_l', 'step_goal', 'created_at')
+FORMATS = ('csv', 'jsonl', 'columnar')
+EXTENSIONS = {'csv': 'csv', 'jsonl': 'jsonl', 'columnar': 'hcols'}
+
+class ExportError(Exception):
+    """Raised for rows a format can't hold and for unreadable export files."""
+
+def export_ids(conn, kind, profile_id=None):
+    """Profile ids with something to export, ascending (rows left behind by deleted profiles included)."""
+    if profile_id is not None: return [profile_id]
+    ids = health_db.profile_ids(conn)
+    ids.update(r[0] for r in conn.execute("SELECT profile_id FROM log_totals WHERE kind=?;", (kind,)))
+    return sorted(ids)
+
+def _fetch(cur):
+    while True:
+        rows = cur.fetchmany(FETCH_ROWS)
+        if not rows: return
+        yield from rows
+
+def iter_logs(conn, kind, profile_id=None, ordinals=False):
+    """Yield (profile_id, date, value) rows in (profile, date) order, a batch at a time.
+
+    Dates are ISO strings, or date.toordinal() ints with ordinals=True (rows whose
+    date isn't a valid day are skipped then).
+    """
+    table, col = health_db.LOG_TABLES[kind]
+    folder = health_archive.archive_folder(conn)
+    day = f"CAST(julianday(date) AS INTEGER) - {health_analytics.JD_OFFSET}" if ordinals else "date"
+    valid = " AND julianday(date) IS NOT NULL AND date = date(date)" if ordinals else ""
+    for pid in export_ids(conn, kind, profile_id):
+        live = _fetch(conn.execute(f"SELECT {day}, {col} FROM {table} WHERE profile_id=?{valid} ORDER BY date;", (pid,)))
+        archive = health_archive.open_archive(folder, pid, kind)
+        if archive is not None:
+            archived = archive.rows() if ordinals else ((date.fromordinal(d).isoformat(), v) for d, v in archive.rows())
+            live = health_archive.merge_rows(archived, live)
+        for d, value in live: yield pid, d, value
+
+def export_logs(conn, kind, fh, fmt='csv', profile_id=None, compress=False):
+    """Write one log kind to an open file (text for csv / jsonl, binary for columnar); returns rows written.
+
+    The csv / jsonl columns match what health_import reads back (profile_id, date, steps|ml).
+    """
+    if fmt == 'columnar': return write_columnar(conn, kind, fh, profile_id, compress)
+    col = health_db.LOG_TABLES[kind][1]; n = 0
+    if fmt == 'csv':
+        writer = csv.writer(fh); writer.writerow(('profile_id', 'date', col))
+        for row in iter_logs(conn, kind, profile_id):
+            writer.writerow(row); n += 1
+    elif fmt == 'jsonl':
+        for pid, day, value in iter_logs(conn, kind, profile_id):
+            fh.write(json.dumps({'profile_id': pid, 'date': day, col: value}) + "\n"); n += 1
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
+    return n
+
+def _export_rows(fh, fmt, columns, rows):
+    n = 0
+    if fmt == 'csv':
+        writer = csv.writer(fh); writer.writerow(columns)
+        for row in rows: writer.writerow(row); n += 1
+    elif fmt == 'jsonl':
+        for row in rows: fh.write(json.dumps(dict(zip(columns, row))) + "\n"); n += 1
+    else:
+        raise ValueError(f"can't export table rows as {fmt!r}")
+    return n
+
+def export_profiles(conn, fh, fmt='csv', profile_id=None):
+    """Profiles with their BMI, category and goals as csv or jsonl; returns rows written."""
+    sql = f"SELECT {', '.join(PROFILE_COLUMNS)} FROM profiles" + (" WHERE id=?" if profile_id is not None else "") + " ORDER BY id;"
+    return _export_rows(fh, fmt, PROFILE_COLUMNS, _fetch(conn.execute(sql, () if profile_id is None else (profile_id,))))
+
+def export_measurements(conn, fh, fmt='csv', profile_id=None):
+    """The BMI / goal history (health_db measurements) as csv or jsonl; returns rows written."""
+    columns = ('profile_id', 'measured_at') + health_db.MEASURED_COLUMNS
+    sql = f"SELECT {', '.join(columns)} FROM measurements" + (" WHERE profile_id=?" if profile_id is not None else "") + " ORDER BY profile_id, measured_at;"
+    return _export_rows(fh, fmt, columns, _fetch(conn.execute(sql, () if profile_id is None else (profile_id,))))
+
+def export_folder(conn, out_dir, fmt='csv', profile_id=None, kinds=None, compress=False):
+    """profiles, measurements and one file per log kind into out_dir; returns [(path, rows written)].
+
+    Profiles hold names, so next to a columnar export they (and measurements) are written as csv.
+    """
+    if compress and health_archive.load_zstandard() is None:
+        raise ExportError("zstd compression needs the zstandard package (pip install zstandard)")
+    os.makedirs(out_dir, exist_ok=True)
+    suffix = '' if profile_id is None else f'_{profile_id}'
+    text_fmt = 'csv' if fmt == 'columnar' else fmt
+    written = []
+    for name, export in (('profiles', export_profiles), ('measurements', export_measurements)):
+        path = os.path.join(out_dir, f"{name}{suffix}.{text_fmt}")
+        with open(path, 'w', newline='', encoding='utf-8') as fh:
+            written.append((path, export(conn, fh, text_fmt, profile_id)))
+    for kind in kinds or health_db.LOG_TABLES:
+        path = os.path.join(out_dir, f"{kind}{suffix}.{EXTENSIONS[fmt]}")
+        with (open(path, 'wb') if fmt == 'columnar' else open(path, 'w', newline='', encoding='utf-8')) as fh:
+            written.append((path, export_logs(conn, kind, fh, fmt, profile_id, compress)))
+    return written
+
+# columnar
+
+def _int32(values, what):
+    try: a = array.array('i', values)
+    except (OverflowError, TypeError): raise ExportError(f"a {what} doesn't fit the columnar format (int32)") from None
+    if sys.byteorder != 'little': a.byteswap()
+    return a.tobytes()
+
+def write_columnar(conn, kind, fh, profile_id=None, compress=False):
+    """Stream one log kind into the columnar format; returns rows written."""
+    if compress and health_archive.load_zstandard() is None:
+        raise ExportError("zstd compression needs the zstandard package (pip install zstandard)")
+    fh.write(struct.pack(COLUMNAR_HEADER, COLUMNAR_MAGIC, COLUMNAR_VERSION, FLAG_ZSTD if compress else 0, kind.encode()))
+    zc = health_archive.zstandard.ZstdCompressor(level=3) if compress else None
+    n = 0; pids = []; days = []; values = []
+    def flush():
+        payload = _int32(pids, 'profile id') + _int32(days, 'date') + _int32(values, 'value')
+        if zc is not None: payload = zc.compress(payload)
+        fh.write(struct.pack(GROUP_FMT, len(pids), len(payload))); fh.write(payload)
+        pids.clear(); days.clear(); values.clear()
+    missing = health_archive.MISSING
+    for pid, day, value in iter_logs(conn, kind, profile_id, ordinals=True):
+        pids.append(pid); days.append(day); values.append(missing if value is None else value); n += 1
+        if len(pids) >= GROUP_ROWS: flush()
+    if pids: flush()
+    return n
+
+def read_columnar(fh):
+    """(kind, row groups) for a columnar export; each group is (profile_ids, days, values) int32 arrays.
+
+    Groups are read one at a time, so whole exports never have to fit in memory.
+    """
+    header = fh.read(struct.calcsize(COLUMNAR_HEADER))
+    if len(header) < struct.calcsize(COLUMNAR_HEADER): raise ExportError("truncated columnar export")
+    magic, version, flags, kind = struct.unpack(COLUMNAR_HEADER, header)
+    if magic != COLUMNAR_MAGIC or version > COLUMNAR_VERSION: raise ExportError("not a columnar export (or a newer version)")
+    if flags & FLAG_ZSTD and health_archive.load_zstandard() is None:
+        raise ExportError("export is zstd compressed, install zstandard to read it")
+    def groups():
+        zd = health_archive.zstandard.ZstdDecompressor() if flags & FLAG_ZSTD else None
+        size = struct.calcsize(GROUP_FMT)
+        while True:
+            head = fh.read(size)
+            if not head: return
+            if len(head) < size: raise ExportError("truncated row group")
+            count, length = struct.unpack(GROUP_FMT, head)
+            payload = fh.read(length)
+            if len(payload) < length: raise ExportError("truncated row group")
+            if zd is not None: payload = zd.decompress(payload, max_output_size=12 * count)
+            cols = []
+            for i in range(3):
+                a = array.array('i'); a.frombytes(payload[4 * count * i:4 * count * (i + 1)])
+                if sys.byteorder != 'little': a.byteswap()
+                cols.append(a)
+            yield tuple(cols)
+    return kind.rstrip(b'\0').decode(), groups()
+
+# summary report
+
+def write_report(conn, path, profile_id=None, colors=None):
+    """PDF with one page per profile: BMI, goals, averages and the steps / water charts.
+
+    Needs matplotlib (Agg, no display). One profile's series is in memory at a
+    time, and each page is closed once written. Returns pages written.
+    """
+    import health_charts
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+    c = colors or health_charts.DEFAULT_COLORS
+    sql = "SELECT id, name, bmi, category, step_goal, water_l FROM profiles" + (" WHERE id=?" if profile_id is not None else "") + " ORDER BY id;"
+    fmt = lambda v: "—" if v is None else f"{v:,.0f}"
+    pages = 0
+    with PdfPages(path) as pdf:
+        for pid, name, bmi, cat, step_goal, water_l in conn.execute(sql, () if profile_id is None else (profile_id,)).fetchall():
+            fig = Figure(figsize=(8.27, 11.69), dpi=100)   # A4 portrait
+            analytics = health_analytics.profile_analytics(conn, pid) or {}
+            lines = [f"BMI {bmi} ({cat})   step goal {fmt(step_goal)}   water goal {fmt(None if water_l is None else water_l * 1000)} ml"]
+            for kind, unit in (('steps', 'steps'), ('water', 'ml')):
+                a = analytics.get(kind)
+                if a and a['entries']:
+                    lines.append(f"{kind.capitalize()}: {a['entries']} days logged, 7 / 30 / 90 day averages "
+                                 f"{fmt(a['mean_7'])} / {fmt(a['mean_30'])} / {fmt(a['mean_90'])} {unit}, best streak {a['best_streak']}")
+            fig.text(0.07, 0.95, f"{pid}: {name}", fontsize=16, weight='bold', color=c['button_fg'])
+            fig.text(0.07, 0.93, "\n".join(lines), fontsize=9, va='top', color=c['button_fg'])
+            for i, kind in enumerate(list(health_db.LOG_TABLES) + ['bmi']):
+                ax = fig.add_axes([0.1, 0.6 - 0.28 * i, 0.83, 0.22])
+                x, y = health_charts.load_series(conn, pid, kind)
+                health_charts.plot_series(fig, ax, x, y, kind, c)
+            fig.set_facecolor(c['bg'])
+            pdf.savefig(fig, facecolor=fig.get_facecolor()); pages += 1
+    return pages
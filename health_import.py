@@ -0,0 +1,238 @@
+"""Streaming CSV / JSONL importer for the steps and water_logs tables.
+
+Usage:
+    python health_import.py path/to/profiles.db export.csv --profile "Alice"
+    python health_import.py path/to/profiles.db watch.jsonl --kind water --profile 3
+
+Rows need a date (YYYY-MM-DD or any ISO datetime) and a value column: `steps` for
+steps, `ml` for water (or a generic `value` together with --kind). A `profile_id`
+column overrides --profile per row. Files with a timestamp column instead (see
+TIMESTAMP_COLUMNS, e.g. per-minute wearable exports) are imported as intraday
+events and summed into the daily totals.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+
+import health_db
+import health_intraday
+
+CHUNK_ROWS = 5000          # rows validated and sent to executemany at once
+COMMIT_ROWS = 200000       # rows per transaction, keeps the number of fsyncs tiny
+MAX_REJECTS_KEPT = 1000    # rejected rows beyond this are only counted
+
+VALUE_COLUMNS = {'steps': 'steps', 'ml': 'water', 'water': 'water', 'water_ml': 'water'}
+TIMESTAMP_COLUMNS = ('timestamp', 'datetime', 'time', 'ts', 'start_time')
+
+class ImportFileError(Exception):
+    """Raised for problems with the whole file (not single rows)."""
+
+class ImportReport:
+    def __init__(self, path, kind):
+        self.path = path; self.kind = kind
+        self.rows_read = 0; self.rows_written = 0; self.rows_rejected = 0
+        self.rejects = []   # (line number, reason), capped at MAX_REJECTS_KEPT
+        self.seconds = 0.0
+
+    def reject(self, line_no, reason):
+        self.rows_rejected += 1
+        if len(self.rejects) < MAX_REJECTS_KEPT:
+            self.rejects.append((line_no, reason))
+
+    @property
+    def rows_per_sec(self):
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (f"{self.path}: {self.rows_written} {self.kind} rows upserted, "
+                f"{self.rows_rejected} rejected, {self.rows_read} read in {self.seconds:.2f}s "
+                f"({self.rows_per_sec:,.0f} rows/s)")
+
+# readers yield (line number, dict row)
+
+def _read_csv(fh):
+    reader = csv.DictReader(fh)
+    for line_no, row in enumerate(reader, start=2):
+        yield line_no, row
+
+def _read_jsonl(fh):
+    for line_no, line in enumerate(fh, start=1):
+        line = line.strip()
+        if not line: continue
+        try: row = json.loads(line)
+        except ValueError: row = None
+        yield line_no, row if isinstance(row, dict) else None
+
+def _detect_format(path, fmt):
+    if fmt: return fmt
+    ext = os.path.splitext(path)[1].lower()
+    return 'jsonl' if ext in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+def _detect_kind(row, kind):
+    """Pick the value column from the first row; returns (kind, column)."""
+    keys = {k.strip().lower(): k for k in row if k}
+    if kind:
+        for col, k in VALUE_COLUMNS.items():
+            if k == kind and col in keys: return kind, keys[col]
+        if 'value' in keys: return kind, keys['value']
+        raise ImportFileError(f"no '{kind}' value column found (have: {', '.join(keys)})")
+    for col, k in VALUE_COLUMNS.items():
+        if col in keys: return k, keys[col]
+    raise ImportFileError("can't tell steps from water: add a 'steps' or 'ml' column, or pass --kind")
+
+def _detect_timestamp(row):
+    """Timestamp column of an intraday file, None for daily files."""
+    keys = {k.strip().lower(): k for k in row if k}
+    for col in TIMESTAMP_COLUMNS:
+        if col in keys: return keys[col]
+    return None
+
+def _detect_keys(row):
+    """(date column, profile_id column) as spelled in the file, matched like the value column."""
+    keys = {k.strip().lower(): k for k in row if k}
+    return keys.get('date', 'date'), keys.get('profile_id', 'profile_id')
+
+# validation
+
+_date_cache = {}
+
+def parse_day(value):
+    """Normalize to YYYY-MM-DD the way save_steps/save_water do; None if invalid."""
+    if value is None: return None
+    s = str(value).strip()
+    d = _date_cache.get(s)
+    if d is not None: return d
+    try:
+        d = date.fromisoformat(s).isoformat() if len(s) == 10 else datetime.fromisoformat(s).date().isoformat()
+    except ValueError:
+        return None
+    if len(_date_cache) < 100000: _date_cache[s] = d
+    return d
+
+def parse_int(value):
+    if isinstance(value, bool): return None
+    if isinstance(value, int): return value
+    if isinstance(value, float): return int(value) if value.is_integer() else None
+    try: return int(str(value).strip())
+    except (TypeError, ValueError): return None
+
+def _validate_chunk(chunk, value_col, default_pid, known_ids, report, ts_col=None, key_cols=('date', 'profile_id')):
+    """(profile_id, day, value) rows, or (profile_id, ts, value) events when ts_col is set."""
+    good = []; date_col, pid_col = key_cols
+    for line_no, row in chunk:
+        if row is None: report.reject(line_no, "malformed row"); continue
+        pid = default_pid
+        raw_pid = row.get(pid_col)
+        if raw_pid not in (None, ''):
+            pid = parse_int(raw_pid)
+        if pid is None or pid not in known_ids: report.reject(line_no, f"unknown profile {raw_pid or pid!r}"); continue
+        if ts_col is not None:
+            day = health_intraday.to_ts(row.get(ts_col))
+            if day is None: report.reject(line_no, f"invalid timestamp {row.get(ts_col)!r}"); continue
+        else:
+            day = parse_day(row.get(date_col))
+            if day is None: report.reject(line_no, f"invalid date {row.get(date_col)!r}"); continue
+        value = parse_int(row.get(value_col))
+        if value is None: report.reject(line_no, f"invalid integer {row.get(value_col)!r}"); continue
+        good.append((pid, day, value))
+    return good
+
+# public API
+
+def import_rows(conn, rows, kind=None, profile_id=None, report=None, chunk_rows=CHUNK_ROWS, commit_rows=COMMIT_ROWS):
+    """Import an iterable of (line number, dict) rows; returns an ImportReport."""
+    report = report or ImportReport('<rows>', kind)
+    known_ids = health_db.profile_ids(conn)
+    if profile_id is not None and profile_id not in known_ids:
+        raise ImportFileError(f"profile {profile_id} does not exist")
+    started = time.perf_counter()
+    value_col = ts_col = None; key_cols = ('date', 'profile_id'); chunk = []; pending = 0
+    touched = {}   # intraday files: time ranges whose buckets need rebuilding before a commit
+    def commit():
+        if touched: health_intraday.rebuild_buckets(conn, kind, touched); touched.clear()
+        conn.commit()
+    try:
+        for item in rows:
+            report.rows_read += 1
+            if value_col is None and item[1] is not None:
+                kind, value_col = _detect_kind(item[1], kind); report.kind = kind
+                ts_col = _detect_timestamp(item[1]); key_cols = _detect_keys(item[1])
+            chunk.append(item)
+            if len(chunk) >= chunk_rows:
+                pending += _flush(conn, kind, chunk, value_col, profile_id, known_ids, report, ts_col, touched, key_cols); chunk = []
+                if pending >= commit_rows: commit(); pending = 0
+        if chunk: _flush(conn, kind, chunk, value_col, profile_id, known_ids, report, ts_col, touched, key_cols)
+        commit()
+    except BaseException:
+        conn.rollback(); raise
+    finally:
+        report.seconds = time.perf_counter() - started
+    return report
+
+def _flush(conn, kind, chunk, value_col, profile_id, known_ids, report, ts_col=None, touched=None, key_cols=('date', 'profile_id')):
+    if value_col is None:
+        for line_no, _ in chunk: report.reject(line_no, "malformed row")
+        return 0
+    good = _validate_chunk(chunk, value_col, profile_id, known_ids, report, ts_col, key_cols)
+    if good:
+        if ts_col is not None: health_intraday.add_events(conn, kind, good, touched)
+        else: health_db.upsert_logs(conn, kind, good)
+        report.rows_written += len(good)
+    return len(good)
+
+def import_file(conn, path, kind=None, profile_id=None, fmt=None, **kwargs):
+    """Stream a CSV or JSONL export into steps / water_logs; returns an ImportReport."""
+    fmt = _detect_format(path, fmt)
+    report = ImportReport(path, kind)
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        rows = _read_jsonl(fh) if fmt == 'jsonl' else _read_csv(fh)
+        return import_rows(conn, rows, kind=kind, profile_id=profile_id, report=report, **kwargs)
+
+def resolve_profile(conn, value):
+    """--profile accepts an id or a profile name."""
+    if value is None: return None
+    pid = parse_int(value)
+    if pid is not None and pid in health_db.profile_ids(conn): return pid
+    pid = health_db.profile_id_by_name(conn, value)
+    if pid is None: raise ImportFileError(f"no profile named or numbered {value!r}")
+    return pid
+
+def add_arguments(parser):
+    parser.add_argument('files', nargs='+', help="CSV or JSONL files to import (daily rows, or intraday events with a timestamp column)")
+    parser.add_argument('--profile', help="profile id or name for rows without a profile_id column")
+    parser.add_argument('--kind', choices=sorted(health_db.LOG_TABLES), help="steps or water (default: guess from columns)")
+    parser.add_argument('--format', dest='fmt', choices=['csv', 'jsonl'], help="default: guess from the file extension")
+    parser.add_argument('--chunk', type=int, default=CHUNK_ROWS, help="rows per executemany batch")
+    parser.add_argument('--show-rejects', type=int, default=10, metavar='N', help="print the first N rejected rows")
+
+def run(conn, args, out=sys.stdout):
+    pid = resolve_profile(conn, args.profile)
+    status = 0
+    for path in args.files:
+        report = import_file(conn, path, kind=args.kind, profile_id=pid, fmt=args.fmt, chunk_rows=args.chunk)
+        print(report.summary(), file=out)
+        for line_no, reason in report.rejects[:args.show_rejects]:
+            print(f"  line {line_no}: {reason}", file=out)
+        if report.rows_rejected: status = 1
+    return status
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import steps / water logs into profiles.db")
+    parser.add_argument('db', help="path to profiles.db (or the folder containing it)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    db_path = os.path.join(args.db, health_db.DB_FILENAME) if os.path.isdir(args.db) else args.db
+    conn = health_db.connect(db_path)
+    try:
+        return run(conn, args)
+    except ImportFileError as e:
+        print(f"error: {e}", file=sys.stderr); return 2
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Insights text shared by the Insights tab and the command line (no GUI imports)."""
+import health_analytics
+import health_db
+
+def _trend_lines(a, unit):
+    """Rolling / streak / trend lines for one health_analytics.log_analytics() result."""
+    if not a or not a['entries']: return []
+    fmt = lambda v: "—" if v is None else f"{v:,.0f}"
+    lines = [f"  Averages 7 / 30 / 90 days: {fmt(a['mean_7'])} / {fmt(a['mean_30'])} / {fmt(a['mean_90'])} {unit}"]
+    if a['goal'] is not None:
+        lines.append(f"  Goal streak: {a['streak']} day{'s' if a['streak'] != 1 else ''} (best {a['best_streak']})")
+        if a['days_30']: lines.append(f"  Goal met on {a['hits_30']} of {a['days_30']} logged days in the last 30 (each against that day's goal)")
+    if a['wow_delta'] is not None:
+        pct = f" ({a['wow_pct']:+.1f}%)" if a['wow_pct'] is not None else ""
+        lines.append(f"  This week vs last: {a['wow_delta']:+,.0f} {unit}{pct}")
+    if a['slope'] is not None:
+        lines.append(f"  Trend (last {health_analytics.TREND_DAYS} days): {a['slope'] * 7:+,.0f} {unit} per week")
+    if a.get('excluded'):
+        lines.append(f"  Left out {a['excluded']} flagged day{'s' if a['excluded'] != 1 else ''} (impossible values, outliers, repeats)")
+    return lines
+
+def insights_text(data, analytics=None):
+    """Render health_db.insights_data() output (plus optional health_analytics.profile_analytics()) as the Insights tab text."""
+    if not data: return ""
+    p_row, (s_count, s_avg), (w_count, w_avg) = data
+    bmi, cat, s_goal, w_goal_l = p_row
+
+    #  analyze BMI
+    lines = []
+    lines.append(f"• BMI Status: {cat} ({bmi})")
+    if cat == "Overweight" or cat == "Obese":
+        lines.append("  Tip: Focus on a slight caloric deficit and consistent cardio.")
+    elif cat == "Underweight":
+        lines.append("  Tip: Ensure you are eating enough nutrient-dense foods.")
+    else:
+        lines.append("  Tip: Maintain your current routine!")
+    lines.append("-" * 40)
+
+    # analyze Steps
+    s_avg = int(s_avg) if s_avg else 0
+
+    lines.append(f"• Steps Analysis ({s_count} entries)")
+    if s_count < 5:
+        lines.append(f"  Result: Lacking Data (Need {5 - s_count} more entries)")
+        lines.append("  Advice: Log your steps daily to get a personalized analysis.")
+    else:
+        diff = s_avg - s_goal
+        if diff >= 0:
+            lines.append(f"  Result: Excellent! Averaging {s_avg} steps.")
+            lines.append("  Advice: You are consistently beating your goal. Consider raising it!")
+        else:
+            lines.append(f"  Result: Averaging {s_avg} steps (Goal: {s_goal})")
+            lines.append(f"  Advice: You are under by ~{abs(diff)} steps. Try a 10-minute walk after dinner.")
+    if analytics: lines.extend(_trend_lines(analytics['steps'], 'steps'))
+    lines.append("-" * 40)
+
+    #  analyze water (Convert L to ml for comparison)
+    w_goal_ml = w_goal_l * 1000
+    w_avg = int(w_avg) if w_avg else 0
+
+    lines.append(f"• Hydration Analysis ({w_count} entries)")
+    if w_count < 5:
+        lines.append(f"  Result: Lacking Data (Need {5 - w_count} more entries)")
+        lines.append("  Advice: Track your water intake for a few more days.")
+    else:
+        if w_avg >= (w_goal_ml * 0.9):
+            lines.append(f"  Result: Great hydration! Averaging {w_avg} ml.")
+            lines.append("  Advice: Keep it up. Clear skin and energy come from water.")
+        else:
+            lines.append(f"  Result: Averaging {w_avg} ml (Goal: {int(w_goal_ml)} ml)")
+            lines.append("  Advice: Try carrying a water bottle with you to meet your target.")
+    if analytics: lines.extend(_trend_lines(analytics['water'], 'ml'))
+
+    return "\n".join(lines)
+
+def insights_bundle(conn, profile_id, exclude_flagged=False):
+    """(insights_data, profile_analytics) in one call, for a single background request.
+
+    exclude_flagged leaves the days health_quality flagged out of every average.
+    """
+    data = health_db.insights_data(conn, profile_id, exclude_flagged)
+    if not data: return None
+    return data, health_analytics.profile_analytics(conn, profile_id, exclude_flagged=exclude_flagged)
+
+def build_insights(conn, profile_id, exclude_flagged=False):
+    bundle = insights_bundle(conn, profile_id, exclude_flagged)
+    return insights_text(*bundle) if bundle else ""
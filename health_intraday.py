@@ -0,0 +1,142 @@
+"""Intraday events: timestamped step counts and water entries, bucketed by hour and day.
+
+Events go into steps_events / water_events (see health_db._m003_intraday_events).
+Rebuilding the buckets after every event would slow bulk ingestion down, so
+writers collect the touched time range per profile. rebuild_buckets() then
+recomputes log_hourly for those whole days. It also sets each day's row in
+steps / water_logs to the sum of that day's events. The daily tables stay the
+source for the history views, rollups and Insights. For a day that has events,
+the event total replaces a value typed in by hand. A later manual save still
+overwrites the day until that day gets new events.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import health_db
+
+DAY = 86400
+HOUR = 3600
+CHUNK_ROWS = 50000
+COMMIT_ROWS = 1000000
+_EPOCH = datetime(1970, 1, 1)
+
+def to_ts(value):
+    """Local wall-clock seconds for a datetime, ISO string or unix timestamp (s or ms); None if invalid.
+
+    Aware datetimes and unix timestamps are converted to this machine's local time,
+    naive ones are taken as local already.
+    """
+    if isinstance(value, bool) or value is None: return None
+    try:
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.strip().replace('.', '', 1).isdigit()):
+            secs = float(value)
+            if secs > 1e11: secs /= 1000.0   # milliseconds
+            dt = datetime.fromtimestamp(secs, tz=timezone.utc).astimezone().replace(tzinfo=None)
+        else:
+            dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+            if dt.tzinfo is not None: dt = dt.astimezone().replace(tzinfo=None)
+    except (ValueError, OverflowError, OSError):
+        return None
+    ts = (dt - _EPOCH) // timedelta(seconds=1)
+    return ts if ts >= 0 else None
+
+def from_ts(ts):
+    return _EPOCH + timedelta(seconds=ts)
+
+# writing
+
+def _upsert_sql(kind):
+    return (f"INSERT INTO {health_db.EVENT_TABLES[kind]} (profile_id, ts, value) VALUES (?, ?, ?) "
+            f"ON CONFLICT(profile_id, ts) DO UPDATE SET value=excluded.value;")
+
+def add_events(conn, kind, rows, touched=None):
+    """Upsert (profile_id, ts, value) rows (a repeated timestamp replaces the value).
+
+    Does not commit or touch the buckets; returns `touched` ({profile_id: [first ts, last ts]})
+    to hand to rebuild_buckets() before committing.
+    """
+    touched = {} if touched is None else touched
+    rows = rows if isinstance(rows, list) else list(rows)
+    for pid, ts, _ in rows:
+        span = touched.get(pid)
+        if span is None: touched[pid] = [ts, ts]
+        elif ts < span[0]: span[0] = ts
+        elif ts > span[1]: span[1] = ts
+    conn.executemany(_upsert_sql(kind), rows)
+    return touched
+
+def rebuild_buckets(conn, kind, touched):
+    """Recompute log_hourly and the daily rows for every whole day in the touched ranges."""
+    table, col = health_db.LOG_TABLES[kind]; events = health_db.EVENT_TABLES[kind]
+    for pid, (lo, hi) in touched.items():
+        lo = lo - lo % DAY; hi = hi - hi % DAY + DAY - 1
+        conn.execute("DELETE FROM log_hourly WHERE profile_id=? AND kind=? AND hour BETWEEN ? AND ?;",
+                     (pid, kind, lo // HOUR, hi // HOUR))
+        conn.execute(f"INSERT INTO log_hourly (profile_id, kind, hour, n, total) "
+                     f"SELECT profile_id, ?, ts / {HOUR}, count(*), sum(value) FROM {events} "
+                     f"WHERE profile_id=? AND ts BETWEEN ? AND ? GROUP BY ts / {HOUR};", (kind, pid, lo, hi))
+        conn.execute(f"INSERT INTO {table} (profile_id, date, {col}) "
+                     f"SELECT profile_id, date(hour * {HOUR}, 'unixepoch'), sum(total) FROM log_hourly "
+                     f"WHERE profile_id=? AND kind=? AND hour BETWEEN ? AND ? GROUP BY hour / 24 "
+                     f"ON CONFLICT(profile_id, date) DO UPDATE SET {col}=excluded.{col};",
+                     (pid, kind, lo // HOUR, hi // HOUR))
+    health_db.resolve_archive_overlaps(conn)   # daily rows rebuilt over archived days
+
+def ingest_events(conn, kind, rows, chunk_rows=CHUNK_ROWS, commit_rows=COMMIT_ROWS):
+    """Stream any number of (profile_id, ts, value) rows in; returns (rows written, seconds)."""
+    started = time.perf_counter(); written = pending = 0; touched = {}; chunk = []
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                add_events(conn, kind, chunk, touched); written += len(chunk); pending += len(chunk); chunk = []
+                if pending >= commit_rows:
+                    rebuild_buckets(conn, kind, touched); conn.commit(); touched = {}; pending = 0
+        if chunk: add_events(conn, kind, chunk, touched); written += len(chunk)
+        rebuild_buckets(conn, kind, touched); conn.commit()
+    except BaseException:
+        conn.rollback(); raise
+    return written, time.perf_counter() - started
+
+def add_event(conn, kind, profile_id, when, value):
+    """One more entry (e.g. a glass of water) at `when`; commits and returns the new day total.
+
+    Unlike imports this never replaces anything: a taken second moves to the next free
+    one, and a day total typed in by hand becomes the day's first event so it is kept.
+    """
+    ts = to_ts(when)
+    if ts is None: raise ValueError(f"invalid time {when!r}")
+    table, col = health_db.LOG_TABLES[kind]; events_table = health_db.EVENT_TABLES[kind]
+    lo = ts - ts % DAY; rows = [(profile_id, ts, value)]
+    if not conn.execute(f"SELECT 1 FROM {events_table} WHERE profile_id=? AND ts BETWEEN ? AND ? LIMIT 1;",
+                        (profile_id, lo, lo + DAY - 1)).fetchone():
+        manual = conn.execute(f"SELECT {col} FROM {table} WHERE profile_id=? AND date=?;",
+                              (profile_id, from_ts(lo).date().isoformat())).fetchone()
+        if manual and manual[0]:
+            rows.insert(0, (profile_id, lo, manual[0]))
+            if ts == lo: rows[1] = (profile_id, lo + 1, value)
+    else:
+        while conn.execute(f"SELECT 1 FROM {events_table} WHERE profile_id=? AND ts=?;", (profile_id, rows[-1][1])).fetchone():
+            rows[-1] = (profile_id, rows[-1][1] + 1, value)
+    touched = add_events(conn, kind, rows)
+    rebuild_buckets(conn, kind, touched); conn.commit()
+    return day_total(conn, kind, profile_id, ts)
+
+# reading
+
+def day_total(conn, kind, profile_id, ts):
+    lo = ts - ts % DAY
+    row = conn.execute("SELECT sum(total) FROM log_hourly WHERE profile_id=? AND kind=? AND hour BETWEEN ? AND ?;",
+                       (profile_id, kind, lo // HOUR, (lo + DAY - 1) // HOUR)).fetchone()
+    return row[0] or 0
+
+def events(conn, kind, profile_id, start_ts, end_ts):
+    """[(ts, value)] with start_ts <= ts < end_ts, oldest first (one primary key range)."""
+    return conn.execute(f"SELECT ts, value FROM {health_db.EVENT_TABLES[kind]} WHERE profile_id=? AND ts >= ? AND ts < ? ORDER BY ts;",
+                        (profile_id, start_ts, end_ts)).fetchall()
+
+def hourly(conn, kind, profile_id, start_ts, end_ts):
+    """[(hour start ts, entries, total)] for the hours overlapping [start_ts, end_ts)."""
+    rows = conn.execute("SELECT hour, n, total FROM log_hourly WHERE profile_id=? AND kind=? AND hour >= ? AND hour < ? ORDER BY hour;",
+                        (profile_id, kind, start_ts // HOUR, -(-end_ts // HOUR))).fetchall()
+    return [(hour * HOUR, n, total) for hour, n, total in rows]
@@ -1,24 +1,61 @@
+import time
+_STARTUP_T0 = time.perf_counter()   # before any other import, for --profile-startup
+
 import os
-import sqlite3
+import argparse
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 from datetime import datetime, date
 import calendar
-
-#importing matplotlib for graphs
-try:
-    import matplotlib.pyplot as plt
-except Exception:
-    plt = None
-
-DB_FILENAME = "profiles.db"
-
-BMI_CATEGORIES = [
-    (0, 18.5, "Underweight"),
-    (18.5, 24.9, "Normal"),
-    (25.0, 29.9, "Overweight"),
-    (30.0, 1000, "Obese"),
-]
+import bisect
+import collections
+
+# matplotlib (embedded in the Graph tab, no pyplot windows) is imported on the first graph,
+# it is by far the slowest import and most sessions never open a chart
+Figure = FigureCanvasTkAgg = NavigationToolbar2Tk = health_charts = None
+_plotting_state = None   # None = not tried yet, True / False = import result
+
+def _load_plotting():
+    """Import matplotlib and the chart helpers once; returns False when unavailable."""
+    global Figure, FigureCanvasTkAgg, NavigationToolbar2Tk, health_charts, _plotting_state
+    if _plotting_state is None:
+        try:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+            import health_charts
+            _plotting_state = True
+        except Exception:
+            _plotting_state = False
+    return _plotting_state
+
+# team, export, server, intraday and quality modules are imported by the handlers that use them
+# (a repeat import is a dict lookup), so a session that never opens those pays nothing at startup
+
+# the math lives in a GUI-free module so batch jobs can import it without tkinter
+from health_metrics import (BMI_CATEGORIES, calculate_bmi, bmi_category, recommend_water_liters,
+                            recommend_step_goal, kg_to_lb, lb_to_kg, cm_to_inches, inches_to_cm,
+                            cm_to_ft_in, ft_in_to_cm)
+import health_db
+from health_db import DB_FILENAME
+from health_pool import WorkerPool
+import health_insights
+import health_analytics
+import health_cache
+from health_trace import TRACER, traced
+
+class StartupTimer:
+    """Named checkpoints since process start, printed by --profile-startup."""
+    def __init__(self, t0=_STARTUP_T0):
+        self.t0 = t0; self.last = t0; self.marks = []
+
+    def mark(self, name):
+        now = time.perf_counter(); self.marks.append((name, now - self.last, now - self.t0)); self.last = now
+
+    def report(self, extra=()):
+        lines = ["startup profile (ms)   step    total"]
+        for name, step, total in self.marks: lines.append(f"  {name:<20}{step*1000:7.1f}{total*1000:9.1f}")
+        for name, seconds in extra: lines.append(f"  {name:<20}{seconds*1000:7.1f}")
+        return "\n".join(lines)
 
 #  color & anim util
 def hex_to_rgb(h):
@@ -33,50 +70,19 @@ def interp(a, b, t):
     rb, gb, bb = hex_to_rgb(b)
     return rgb_to_hex((int(ra + (rb - ra) * t), int(ga + (gb - ga) * t), int(ba + (bb - ba) * t)))
 
-# calculation helpers 
-def calculate_bmi(weight_kg, height_cm):
-    try:
-        h_m = height_cm / 100.0
-        bmi = weight_kg / (h_m * h_m)
-        return round(bmi, 2)
-    except Exception:
-        return None
-
-def bmi_category(bmi):
-    for low, high, label in BMI_CATEGORIES:
-        if bmi >= low and bmi <= high:
-            return label
-    return "Unknown"
-
-def recommend_water_liters(bmi):
-    if bmi is None: return 2.0
-    cat = bmi_category(bmi)
-    return {"Underweight":2.5,"Normal":3.0,"Overweight":3.5,"Obese":4.0}.get(cat,3.0)
-
-def recommend_step_goal(bmi):
-    if bmi is None: return 10000
-    cat = bmi_category(bmi)
-    return {"Underweight":11000,"Normal":10000,"Overweight":8000,"Obese":6000}.get(cat,10000)
-
-def kg_to_lb(kg): return kg * 2.2046226218
-def lb_to_kg(lb): return lb / 2.2046226218
-def cm_to_inches(cm): return cm / 2.54
-def inches_to_cm(inches): return inches * 2.54
-def cm_to_ft_in(cm):
-    total_inches = cm_to_inches(cm)
-    ft = int(total_inches // 12)
-    inches = round(total_inches - ft*12, 2)
-    return ft, inches
-def ft_in_to_cm(ft, inches): return inches_to_cm(ft*12 + inches)
-
 # custom widgets
 
 class CalendarPopup(tk.Toplevel):
-    """A simple calendar widget that returns YYYY-MM-DD via callback(date_iso)."""
-    def __init__(self, master, year=None, month=None, callback=None, theme_colors=None):
+    """A simple calendar widget that returns YYYY-MM-DD via callback(date_iso).
+
+    The 6x7 grid of day buttons is built once; changing month only relabels it.
+    With load_month(year, month, done), logged days are tinted by value versus
+    goal once done((values, goals)) is called (see health_analytics.calendar_month).
+    """
+    def __init__(self, master, year=None, month=None, callback=None, theme_colors=None, load_month=None):
         super().__init__(master)
         self.transient(master); self.grab_set()
-        self.callback = callback
+        self.callback = callback; self.load_month = load_month
         self.title("Select date"); self.resizable(False, False)
 
         today = date.today()
@@ -84,9 +90,9 @@ class CalendarPopup(tk.Toplevel):
         self.month = month if month is not None else today.month
 
         self.theme = theme_colors or {}
-        bg = self.theme.get('bg', '#f6f7fb')
-        fg = self.theme.get('fg', '#000000')
-        btn_bg = self.theme.get('btn_bg', '#ffffff')
+        bg = self.bg = self.theme.get('bg', '#f6f7fb')
+        fg = self.fg = self.theme.get('fg', '#000000')
+        btn_bg = self.btn_bg = self.theme.get('btn_bg', '#ffffff')
         
         self.configure(bg=bg)
 
@@ -101,39 +107,55 @@ class CalendarPopup(tk.Toplevel):
         nxt.pack(side='left')
 
         self.body = tk.Frame(self, bg=bg); self.body.pack(padx=6, pady=(0,8))
-        self._draw_calendar(fg, btn_bg)
-
-    def _draw_calendar(self, fg_color, btn_bg):
-        for w in self.body.winfo_children(): w.destroy()
-        cal = calendar.monthcalendar(self.year, self.month)
-        days = ['Mo','Tu','We','Th','Fr','Sa','Su']
-        for c, d in enumerate(days):
-            lbl = tk.Label(self.body, text=d, width=4, anchor='center', bg=self.body.cget('bg'), fg=fg_color)
-            lbl.grid(row=0, column=c, padx=2, pady=2)
-        for r, week in enumerate(cal, start=1):
-            for c, day in enumerate(week):
-                if day == 0:
-                    lbl = tk.Label(self.body, text='', width=4, bg=self.body.cget('bg'))
-                    lbl.grid(row=r, column=c, padx=2, pady=2)
-                else:
-                    b = tk.Button(self.body, text=str(day), width=4, command=lambda d=day: self._select_day(d), 
-                                  bg=btn_bg, fg=fg_color, relief='flat')
-                    b.grid(row=r, column=c, padx=2, pady=2)
+        for c, d in enumerate(['Mo','Tu','We','Th','Fr','Sa','Su']):
+            tk.Label(self.body, text=d, width=4, anchor='center', bg=bg, fg=fg).grid(row=0, column=c, padx=2, pady=2)
+        self.cells = []   # 42 buttons, reused for every month
+        for i in range(42):
+            b = tk.Button(self.body, width=4, relief='flat', command=lambda i=i: self._select_cell(i))
+            b.grid(row=1 + i // 7, column=i % 7, padx=2, pady=2); self.cells.append(b)
+        self._draw_calendar()
+
+    def _draw_calendar(self):
+        self.offset, self.ndays = calendar.monthrange(self.year, self.month)
+        for i, b in enumerate(self.cells):
+            day = i - self.offset + 1
+            if 1 <= day <= self.ndays: b.config(text=str(day), state='normal', bg=self.btn_bg, fg=self.fg, activebackground=self.btn_bg)
+            else: b.config(text='', state='disabled', bg=self.bg, activebackground=self.bg)
         self.lbl_month.config(text=f"{calendar.month_name[self.month]} {self.year}")
+        if self.load_month is not None:
+            shown = (self.year, self.month)
+            self.load_month(self.year, self.month, lambda data: self._tint(shown, data))
+
+    def _tint(self, shown, data):
+        if shown != (self.year, self.month) or not self.winfo_exists(): return   # paged on, or closed
+        accent = self.theme.get('accent', '#007aff'); muted = self.theme.get('muted', '#6b7280'); today = date.today()
+        for day, (value, goal) in enumerate(zip(*data), start=1):
+            b = self.cells[self.offset + day - 1]
+            if value is None:
+                # a past day without a log is a gap
+                if date(self.year, self.month, day) < today: b.config(fg=muted)
+                continue
+            t = 0.25 + 0.75 * min(1.0, max(0.0, value / goal)) if goal else 0.5
+            tint = interp(self.btn_bg, accent, t)
+            b.config(bg=tint, activebackground=tint, fg='#ffffff' if t >= 0.6 else self.fg)
 
     def _prev_month(self):
         if self.month == 1:
             self.month = 12; self.year -= 1
         else:
             self.month -= 1
-        self._draw_calendar(self.theme.get('fg', 'black'), self.theme.get('btn_bg', 'white'))
+        self._draw_calendar()
 
     def _next_month(self):
         if self.month == 12:
             self.month = 1; self.year += 1
         else:
             self.month += 1
-        self._draw_calendar(self.theme.get('fg', 'black'), self.theme.get('btn_bg', 'white'))
+        self._draw_calendar()
+
+    def _select_cell(self, i):
+        day = i - self.offset + 1
+        if 1 <= day <= self.ndays: self._select_day(day)
 
     def _select_day(self, day):
         d = date(self.year, self.month, day).isoformat()
@@ -237,13 +259,377 @@ class AnimatedToggle(ttk.Frame):
             self.canvas.itemconfig(self.knob, fill=self.knob_color)
         except Exception: pass
 
+class HistoryTree(ttk.Frame):
+    """Treeview over a date-keyed log that pages rows in lazily, newest first.
+
+    fetch_page(done, before=None, after=None, limit=n) must call done(rows) on the
+    Tk thread with (date, value) rows newest first (see health_db.log_page); it
+    may answer later, from a background query. Only a sliding window of max_rows
+    is kept in the widget, so scrolling through years of history stays cheap.
+    """
+    def __init__(self, master, columns, headings, fetch_page, page_size=200, max_rows=1000, height=12, **kwargs):
+        super().__init__(master, **kwargs)
+        self.fetch_page = fetch_page; self.page_size = page_size; self.max_rows = max(max_rows, 2*page_size)
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=height)
+        for col, text in zip(columns, headings):
+            self.tree.heading(col, text=text); self.tree.column(col, width=150 if col == 'date' else 120, anchor='center')
+        self.vsb = ttk.Scrollbar(self, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        self.tree.pack(side='left', fill='both', expand=True); self.vsb.pack(side='right', fill='y')
+        self._asc = []   # dates currently in the tree, oldest first
+        self._at_newest = True; self._at_oldest = True
+        self._loading = False; self._gen = 0   # _gen drops pages that arrive after a reset/clear
+        self._deferred = {}   # saves that landed while a page was in flight
+
+    def clear(self):
+        self._gen += 1; self._loading = False; self._deferred = {}
+        self.tree.delete(*self.tree.get_children())
+        self._asc = []; self._at_newest = True; self._at_oldest = True
+
+    def reset(self):
+        """Drop everything and load the newest page."""
+        self.clear()
+        self._request(self._fill_first, limit=self.page_size)
+
+    def _request(self, handler, **kw):
+        gen = self._gen; self._loading = True
+        def done(rows):
+            if gen != self._gen: return
+            self._loading = False; handler(rows)
+            deferred, self._deferred = self._deferred, {}
+            for day, value in deferred.items(): self.upsert(day, value)
+        self.fetch_page(done, **kw)
+
+    @traced('tree.fill_first', 'tree')
+    def _fill_first(self, rows):
+        for d, v in rows: self.tree.insert("", "end", iid=d, values=(d, v))
+        self._asc = [r[0] for r in reversed(rows)]
+        self._at_oldest = len(rows) < self.page_size
+        self.tree.yview_moveto(0)
+
+    def upsert(self, day, value):
+        """Patch a single row after a save instead of rebuilding the tree."""
+        if self._loading:
+            self._deferred[day] = value; return
+        if self.tree.exists(day):
+            self.tree.item(day, values=(day, value)); return
+        if self._asc and ((day > self._asc[-1] and not self._at_newest) or (day < self._asc[0] and not self._at_oldest)):
+            return   # outside the loaded window, it shows up when paged in
+        pos = bisect.bisect_left(self._asc, day)
+        self.tree.insert("", len(self._asc) - pos, iid=day, values=(day, value))
+        self._asc.insert(pos, day)
+
+    def delete(self, day):
+        if self.tree.exists(day):
+            self.tree.delete(day); self._asc.remove(day)
+
+    def _on_scroll(self, first, last):
+        self.vsb.set(first, last)
+        first, last = float(first), float(last)
+        if self._loading or not self._asc: return
+        if last > 0.9 and not self._at_oldest: self._request(self._add_older, before=self._asc[0], limit=self.page_size)
+        elif first < 0.1 and not self._at_newest: self._request(self._add_newer, after=self._asc[-1], limit=self.page_size)
+
+    def _top_index(self):
+        return int(round(float(self.tree.yview()[0]) * max(len(self._asc), 1)))
+
+    @traced('tree.add_older', 'tree')
+    def _add_older(self, rows):
+        self._at_oldest = len(rows) < self.page_size
+        if not rows: return
+        top = self._top_index()
+        for d, v in rows: self.tree.insert("", "end", iid=d, values=(d, v))
+        self._asc[:0] = [r[0] for r in reversed(rows)]
+        excess = len(self._asc) - self.max_rows
+        if excess > 0:   # trim the newest rows off the top and keep the view still
+            self.tree.delete(*self._asc[-excess:]); del self._asc[-excess:]
+            self._at_newest = False
+            self.tree.yview_moveto(max(top - excess, 0) / len(self._asc))
+
+    @traced('tree.add_newer', 'tree')
+    def _add_newer(self, rows):
+        self._at_newest = len(rows) < self.page_size
+        if not rows: return
+        top = self._top_index()
+        for i, (d, v) in enumerate(rows): self.tree.insert("", i, iid=d, values=(d, v))
+        self._asc.extend(r[0] for r in reversed(rows))
+        excess = len(self._asc) - self.max_rows
+        if excess > 0:   # trim the oldest rows off the bottom
+            self.tree.delete(*self._asc[:excess]); del self._asc[:excess]
+            self._at_oldest = False
+        self.tree.yview_moveto((top + len(rows)) / len(self._asc))
+
+class ThemeEngine:
+    """Pushes interpolated theme colors to the ttk styles and a registry of tk widgets.
+
+    Palettes are computed once per animation frame and cached; each frame then
+    only reconfigures the styles and widget roles whose colors changed. Plain tk
+    widgets register themselves when first mapped and drop out when destroyed,
+    so a frame never has to walk the widget tree.
+    """
+    WIDGET_ROLES = (('Listbox', tk.Listbox, 'listbox'), ('Text', tk.Text, 'text'), ('Entry', tk.Entry, 'entry'),
+                    ('Label', tk.Label, 'label'), ('Button', tk.Button, 'button'), ('Canvas', tk.Canvas, 'canvas'))
+
+    def __init__(self, root, style, light, dark, extra=None):
+        self.root = root; self.style = style; self.light = light; self.dark = dark
+        self.extra = extra or {}   # key -> (light color, dark color) for colors outside the theme dicts
+        self.widgets = {role: set() for _, _, role in self.WIDGET_ROLES}
+        self._role_of = {}; self._fresh = set(); self._excluded = set()
+        self._palettes = {}; self._frames = {}
+        self._applied_styles = {}; self._applied_roles = {}; self._root_bg = None
+        self.frame_times = collections.deque(maxlen=256)   # seconds per applied frame
+        for cls, _, _ in self.WIDGET_ROLES:
+            root.bind_class(cls, '<Map>', self._on_map, add='+')
+            root.bind_class(cls, '<Destroy>', self._on_destroy, add='+')
+
+    # palettes
+    def palette(self, t):
+        key = round(t, 4)
+        colors = self._palettes.get(key)
+        if colors is None:
+            colors = {k: interp(self.light[k], self.dark[k], t) for k in self.light}
+            for k, (a, b) in self.extra.items(): colors[k] = interp(a, b, t)
+            self._palettes[key] = colors
+        return colors
+
+    def frames(self, start, target, steps):
+        """Palettes for every frame of an animation from start to target, computed once."""
+        key = (round(start, 4), target, steps)
+        frames = self._frames.get(key)
+        if frames is None:
+            frames = self._frames[key] = tuple(self.palette(start + (target - start) * (i/steps)) for i in range(steps + 1))
+        return frames
+
+    # widget registry
+    def register(self, widget):
+        if widget in self._role_of or str(widget) in self._excluded: return
+        for _, cls, role in self.WIDGET_ROLES:
+            if isinstance(widget, cls):
+                if role == 'canvas' and isinstance(widget.master, AnimatedToggle): return
+                self.widgets[role].add(widget); self._role_of[widget] = role; self._fresh.add(widget)
+                return
+
+    def exclude(self, widget):
+        """Keep a widget out of theming (it manages its own colors)."""
+        self._excluded.add(str(widget)); self._forget(widget)
+
+    def scan(self, widget):
+        """Register every existing themeable widget under `widget` (used once after a build)."""
+        for child in widget.winfo_children():
+            self.register(child); self.scan(child)
+
+    def _forget(self, widget):
+        role = self._role_of.pop(widget, None)
+        if role: self.widgets[role].discard(widget)
+        self._fresh.discard(widget)
+
+    def _on_map(self, event):
+        if not isinstance(event.widget, str): self.register(event.widget)
+
+    def _on_destroy(self, event):
+        if not isinstance(event.widget, str):
+            self._forget(event.widget); self._excluded.discard(str(event.widget))
+
+    # applying
+    @staticmethod
+    def _style_options(c):
+        bg = c['bg']; panel = c['panel']; muted = c['muted']; accent = c['accent']
+        btn_bg = c['button_bg']; btn_fg = c['button_fg']; tree_bg = c['tree_bg']; border = c['border']
+        return {
+            ('configure', '.'): {'background': bg, 'foreground': btn_fg},
+            ('configure', 'Header.TLabel'): {'background': bg, 'foreground': muted},
+            ('configure', 'Secondary.TLabel'): {'background': bg, 'foreground': muted},
+            ('configure', 'Big.TLabel'): {'background': panel, 'foreground': btn_fg},
+            ('configure', 'Card.TFrame'): {'background': panel},
+            ('configure', 'Accent.TButton'): {'background': accent, 'foreground': '#ffffff'},
+            ('map', 'Accent.TButton'): {'background': [('active', accent)]},
+            ('configure', 'Ghost.TButton'): {'background': btn_bg, 'foreground': btn_fg},
+            ('map', 'Ghost.TButton'): {'background': [('active', border)]},
+            ('configure', 'Treeview'): {'background': tree_bg, 'fieldbackground': tree_bg, 'foreground': btn_fg},
+            ('configure', 'TNotebook.Tab'): {'background': panel, 'foreground': btn_fg},
+            ('configure', 'TNotebook'): {'background': bg},
+        }
+
+    @staticmethod
+    def _role_options(c):
+        panel = c['panel']; btn_fg = c['button_fg']; border = c['border']
+        return {
+            'listbox': {'bg': panel, 'fg': btn_fg, 'highlightbackground': border, 'selectbackground': c['accent'], 'selectforeground': '#ffffff'},
+            'text': {'bg': panel, 'fg': btn_fg, 'insertbackground': btn_fg},
+            'entry': {'bg': c['entry_bg'], 'fg': c['entry_fg'], 'insertbackground': c['entry_fg'], 'highlightthickness': 1,
+                      'highlightbackground': border, 'disabledbackground': panel, 'disabledforeground': c['muted']},
+            'label': {'bg': panel, 'fg': btn_fg},
+            'button': {'bg': c['button_bg'], 'fg': c['button_fg']},
+            'canvas': {'bg': panel},
+        }
+
+    @staticmethod
+    def _changed(new, old):
+        if old is None: return new
+        return {k: v for k, v in new.items() if old.get(k) != v}
+
+    def apply(self, c):
+        started = time.perf_counter()
+        for (kind, name), opts in self._style_options(c).items():
+            changed = self._changed(opts, self._applied_styles.get((kind, name)))
+            if changed:
+                try: (self.style.configure if kind == 'configure' else self.style.map)(name, **changed)
+                except Exception: pass
+                self._applied_styles[(kind, name)] = opts
+        if c['bg'] != self._root_bg:
+            self.root.configure(bg=c['bg']); self._root_bg = c['bg']
+
+        fresh = self._fresh; self._fresh = set()
+        for role, opts in self._role_options(c).items():
+            changed = self._changed(opts, self._applied_roles.get(role))
+            self._applied_roles[role] = opts
+            targets = self.widgets[role] if changed else fresh.intersection(self.widgets[role])
+            for w in list(targets):
+                try: w.configure(**(opts if w in fresh else changed))
+                except tk.TclError: self._forget(w)
+        self.frame_times.append(time.perf_counter() - started)
+
+    def timing(self):
+        """Per-frame apply cost over the recent frames, in milliseconds."""
+        times = sorted(self.frame_times)
+        if not times: return {'frames': 0}
+        return {'frames': len(times), 'mean_ms': 1000 * sum(times) / len(times),
+                'p95_ms': 1000 * times[min(len(times) - 1, int(len(times) * 0.95))], 'max_ms': 1000 * times[-1]}
+
+class ChartPanel(ttk.Frame):
+    """Embedded matplotlib chart: one figure and one line, updated in place.
+
+    The full series is handed over once; zooming or panning only re-downsamples
+    the visible slice of the arrays already in memory.
+    """
+    MIN_POINTS = 400; MARKER_LIMIT = 200
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.figure = Figure(figsize=(8,4), dpi=100)
+        self.ax = self.figure.add_subplot(111)
+        self.line, = self.ax.plot([], [], linewidth=2)
+        health_charts.setup_date_axis(self.ax)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self)
+        self.canvas.draw = traced('plot.draw', 'plot')(self.canvas.draw)   # draw_idle() ends up here
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self, pack_toolbar=False); self.toolbar.update()
+        self.toolbar.pack(side='bottom', fill='x')
+        self.canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.x = None; self.y = None; self.key = None; self._pending = None
+        self.ax.callbacks.connect('xlim_changed', self._on_xlim)
+
+    @traced('plot.set_series', 'plot')
+    def set_series(self, key, x, y, ylabel, title, colors):
+        self.key = key; self.x = self.y = None   # so set_xlim() below doesn't queue a second update
+        if self._pending is not None: self.after_cancel(self._pending); self._pending = None
+        self.line.set_color(colors['accent'])
+        self.ax.set_ylabel(ylabel); self.ax.set_title(title)
+        health_charts.style_axes(self.figure, self.ax, colors)
+        lo, hi = float(x[0]), float(x[-1])
+        if hi == lo: lo -= 1; hi += 1
+        self.ax.set_xlim(lo, hi)
+        ymax = float(y.max()) if len(y) else 1.0
+        self.ax.set_ylim(min(0.0, float(y.min())), ymax * 1.05 or 1.0)
+        self.toolbar.update()   # reset the home view to the new series
+        self.x = x; self.y = y
+        self._update_visible()
+
+    def apply_colors(self, colors):
+        if self.x is None: return
+        self.line.set_color(colors['accent'])
+        health_charts.style_axes(self.figure, self.ax, colors); self.canvas.draw_idle()
+
+    def _on_xlim(self, ax):
+        if self.x is not None and self._pending is None:
+            self._pending = self.after_idle(self._update_visible)
+
+    @traced('plot.update_visible', 'plot')
+    def _update_visible(self):
+        self._pending = None
+        lo, hi = self.ax.get_xlim()
+        i0, i1 = health_charts.visible_slice(self.x, lo, hi)
+        n_out = max(self.canvas.get_tk_widget().winfo_width(), self.MIN_POINTS)
+        xs, ys = health_charts.downsample(self.x[i0:i1], self.y[i0:i1], n_out)
+        self.line.set_data(xs, ys)
+        self.line.set_marker('o' if len(xs) <= self.MARKER_LIMIT else '')
+        self.canvas.draw_idle()
+
+class YearPanel(ttk.Frame):
+    """Year-at-a-glance heatmap (health_charts.year_matrix): one AxesImage, updated in place.
+
+    Finished frames are kept as Agg pixel regions keyed by data, mode, colours and
+    canvas size. Going back to a year whose data hasn't changed restores the saved
+    pixels and skips the draw.
+    """
+    MODES = (('Amount', 'amount'), ('Goal met', 'goal'))
+    FRAMES = 8
+
+    def __init__(self, master, on_change, **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_change = on_change   # on_change(year, mode) asks the app for another year / mode
+        bar = ttk.Frame(self); bar.pack(side='top', fill='x', pady=(0, 4))
+        ttk.Button(bar, text='<', width=3, command=lambda: self.on_change(self.year - 1, self.mode), style='Ghost.TButton').pack(side='left')
+        self.year_var = tk.StringVar(); ttk.Label(bar, textvariable=self.year_var, width=6, anchor='center').pack(side='left', padx=4)
+        ttk.Button(bar, text='>', width=3, command=lambda: self.on_change(self.year + 1, self.mode), style='Ghost.TButton').pack(side='left')
+        self.mode_var = tk.StringVar(value=self.MODES[0][0])
+        for label, mode in self.MODES:
+            ttk.Radiobutton(bar, text=label, value=label, variable=self.mode_var,
+                            command=lambda m=mode: self.on_change(self.year, m)).pack(side='left', padx=(12, 0))
+        self.figure = Figure(figsize=(8, 2.2), dpi=100)
+        self.ax = self.figure.add_subplot(111); self.image = None
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self)
+        self.canvas.draw = traced('plot.year_draw', 'plot')(self.canvas.draw)
+        self.canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.key = None; self.year = None; self.mode = 'amount'; self.data = None; self.colors = None
+        self._frames = collections.OrderedDict()   # frame key -> (data, saved pixels)
+
+    def _frame_key(self):
+        return (self.key, self.mode, tuple(sorted(self.colors.items())), tuple(self.figure.bbox.bounds))
+
+    @traced('plot.set_year', 'plot')
+    def set_year(self, key, data, kind, mode, colors):
+        """Show one profile's year; key is (profile id, kind, year)."""
+        if (key, mode, colors) == (self.key, self.mode, self.colors) and data is self.data: return
+        self.key = key; self.year = data['year']; self.mode = mode; self.data = data; self.colors = colors; self.kind = kind
+        self.year_var.set(str(self.year)); self.mode_var.set(next(label for label, m in self.MODES if m == mode))
+        img = health_charts.year_image(data, mode, colors)
+        if self.image is None: self.image = health_charts.plot_year(self.figure, self.ax, data, kind, mode, colors, image=img)
+        else:
+            self.image.set_data(img); self.image.set_extent((-0.5, img.shape[1] - 0.5, 6.5, -0.5))
+            health_charts.label_year_axes(self.figure, self.ax, data, kind, mode, colors)
+        saved = self._frames.get(self._frame_key())
+        if saved is not None and saved[0] is data:
+            self._frames.move_to_end(self._frame_key())
+            self.canvas.restore_region(saved[1]); self.canvas.blit(self.figure.bbox)
+        else:
+            self.canvas.draw_idle()
+
+    def apply_colors(self, colors):
+        if self.data is not None: self.set_year(self.key, self.data, self.kind, self.mode, colors)
+
+    def forget(self, profile_id=None):
+        """Drop saved frames (of one profile), e.g. after its logs or goals changed."""
+        for k in [k for k in self._frames if profile_id is None or k[0][0] == profile_id]: del self._frames[k]
+
+    def _on_draw(self, event):
+        if self.data is None: return
+        self._frames[self._frame_key()] = (self.data, self.canvas.copy_from_bbox(self.figure.bbox))
+        while len(self._frames) > self.FRAMES: self._frames.popitem(last=False)
+
 # main app
 class HealthApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, startup=None):
+        self.startup = startup or StartupTimer()
+        self.startup.mark('imports')
         super().__init__()
+        self.startup.mark('tk init')
         self.title("Health Metric Calculator 1.0.1")
         self.geometry("980x640"); self.minsize(900,600)
-        self.folder = None; self.db_path = None; self.conn = None; self.current_profile_id = None
+        self.folder = None; self.db_path = None; self.db = None; self.current_profile_id = None
+        self.remote = None; self.server_url = None   # set while connected to a health_server instead of a folder
+        self.pool = WorkerPool()   # recently used folders stay open for quick switching
+        self.profile_cache = health_cache.ProfileCache()   # profile row, first history pages, Insights text
         self.unit_mode = tk.StringVar(value="Metric"); self.dark_mode = False
 
         self.light_theme = {
@@ -270,14 +656,17 @@ class HealthApp(tk.Tk):
             'entry_bg': '#374151', 
             'entry_fg': '#f3f4f6'
         }
-        self.theme_t = 0.0
+        self.theme_t = 0.0; self._theme_anim = 0
 
         self.style = ttk.Style(self)
         try: self.style.theme_use('clam')
         except Exception: pass
+        self.theme = ThemeEngine(self, self.style, self.light_theme, self.dark_theme, extra={'toggle_off': ('#cfd1d5', '#374151')})
 
-        self._setup_styles()
-        self._build_ui()
+        self._tab_builders = {}; self.tab_build_times = {}
+        self._setup_styles(); self.startup.mark('styles')
+        self._build_ui(); self.startup.mark('build ui')
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
         self.after(80, self._entrance_animation)
 
     def _setup_styles(self):
@@ -306,100 +695,34 @@ class HealthApp(tk.Tk):
 
     def _get_current_colors(self):
         """Helper to get current exact color codes based on theme_t"""
-        t = self.theme_t
-        def lerp(key): return interp(self.light_theme[key], self.dark_theme[key], t)
-        return {k: lerp(k) for k in self.light_theme}
-
-    def _apply_theme(self, t):
-        colors = self._get_current_colors()
-        bg = colors['bg']; panel = colors['panel']; muted = colors['muted']
-        accent = colors['accent']; btn_bg = colors['button_bg']; btn_fg = colors['button_fg']
-        tree_bg = colors['tree_bg']; border = colors['border']
-
-        self.style.configure('.', background=bg)
-        self.style.configure('Header.TLabel', background=bg, foreground=muted)
-        self.style.configure('Secondary.TLabel', background=bg, foreground=muted)
-        self.style.configure('Big.TLabel', background=panel, foreground=btn_fg)
-        self.style.configure('Card.TFrame', background=panel)
-        self.style.configure('Accent.TButton', background=accent, foreground='#ffffff')
-        self.style.map('Accent.TButton', background=[('active', accent)])
-        self.style.configure('Ghost.TButton', background=btn_bg, foreground=btn_fg)
-        self.style.map('Ghost.TButton', background=[('active', border)])
-        self.style.configure('Treeview', background=tree_bg, fieldbackground=tree_bg, foreground=btn_fg)
-        self.style.configure('TNotebook.Tab', background=panel, foreground=btn_fg)
-        self.style.configure('TNotebook', background=bg)
-
-        self.configure(bg=bg)
-        try: self.style.configure('.', foreground=btn_fg)
-        except Exception: pass
-
-        # Recursively apply colors to standard tk widgets (Entries, Text, Listbox)
-        self._apply_widget_colors(self, colors)
+        return self.theme.palette(self.theme_t)
 
+    @traced('theme.apply_theme', 'theme')
+    def _apply_theme(self, t, colors=None):
+        colors = colors or self.theme.palette(t)
+        self.theme.apply(colors)
         try:
-            off_track = interp('#cfd1d5', '#374151', t)
             if hasattr(self, 'dm_toggle') and isinstance(self.dm_toggle, AnimatedToggle):
-                self.dm_toggle.update_colors(on_color=accent, off_color=off_track, knob_color=btn_bg, canvas_bg=panel)
+                self.dm_toggle.update_colors(on_color=colors['accent'], off_color=colors['toggle_off'], knob_color=colors['button_bg'], canvas_bg=colors['panel'])
         except Exception: pass
 
-    def _apply_widget_colors(self, widget, colors):
-        """Recursively update standard TK widgets that don't respect TTK styles well."""
-        panel = colors['panel']
-        btn_fg = colors['button_fg']
-        accent = colors['accent']
-        border = colors['border']
-        entry_bg = colors['entry_bg']
-        entry_fg = colors['entry_fg']
-
-        for child in widget.winfo_children():
-            try: cname = child.winfo_class()
-            except Exception: cname = ''
-            
-            try:
-                # listboxes hndler
-                if isinstance(child, tk.Listbox):
-                    child.configure(bg=panel, fg=btn_fg, highlightbackground=border, 
-                                    selectbackground=accent, selectforeground='#ffffff')
-                
-                # Text widgets hndler
-                elif isinstance(child, tk.Text):
-                    child.configure(bg=panel, fg=btn_fg, insertbackground=btn_fg)
-                
-                # standard entry widgets hndler
-                elif isinstance(child, tk.Entry):
-                    child.configure(bg=entry_bg, fg=entry_fg, 
-                                    insertbackground=entry_fg, # Cursor color
-                                    highlightthickness=1,
-                                    highlightbackground=border,
-                                    disabledbackground=panel,
-                                    disabledforeground=colors['muted'])
-                
-                # handle labels that are not TTK
-                elif isinstance(child, tk.Label):
-                    child.configure(bg=panel, fg=btn_fg)
-
-                # handle standard buttons
-                elif isinstance(child, tk.Button):
-                    child.configure(bg=colors['button_bg'], fg=colors['button_fg'])
-
-                # handle canvas
-                elif isinstance(child, tk.Canvas) and not isinstance(child.master, AnimatedToggle):
-                    try: child.configure(bg=panel)
-                    except Exception: pass
-
-            except Exception: pass
-            
-            # recurse line (dont remove bruh)
-            self._apply_widget_colors(child, colors)
-
     def toggle_dark_mode(self, state):
         target = 1.0 if state else 0.0; steps = 18; start = self.theme_t
+        frames = self.theme.frames(start, target, steps)   # every frame's palette, computed once
+        interval = 0.014; started = time.perf_counter()
+        self._theme_anim += 1; anim = self._theme_anim
         def step(i):
-            nonlocal start
-            t = start + (target - start) * (i/steps)
-            self.theme_t = t; self._apply_theme(t)
-            if i < steps: self.after(14, lambda: step(i+1))
-            else: self.theme_t = target
+            if anim != self._theme_anim: return   # a newer toggle took over
+            self.theme_t = start + (target - start) * (i/steps); self._apply_theme(self.theme_t, frames[i])
+            if i < steps:
+                # schedule against the animation clock so slow frames don't pile up delay
+                delay = started + (i + 1) * interval - time.perf_counter()
+                self.after(max(int(delay * 1000), 1), lambda: step(i+1))
+            else:
+                self.theme_t = target
+                # restyle the graph once at the end, not on every animation frame
+                if self.chart_panel is not None: self.chart_panel.apply_colors(self._get_current_colors())
+                if self.year_panel is not None: self.year_panel.apply_colors(self._get_current_colors())
         step(0)
 
     #  ui build
@@ -408,10 +731,14 @@ class HealthApp(tk.Tk):
 
         left_ctrl = ttk.Frame(frm_top, style='Card.TFrame'); left_ctrl.pack(side='left', anchor='w')
         self.btn_open = ttk.Button(left_ctrl, text="Open Directory", command=self.open_directory, style='Accent.TButton')
-        self.btn_open.pack(side='left', padx=(0,8))
+        self.btn_open.pack(side='left', padx=(0,4))
+        ttk.Button(left_ctrl, text="Server…", command=self.open_server, style='Ghost.TButton').pack(side='left', padx=(0,4))
+        self.recent_menu = tk.Menu(self, tearoff=0, postcommand=self._fill_recent_menu)
+        self.btn_recent = ttk.Menubutton(left_ctrl, text="Recent", menu=self.recent_menu, style='Ghost.TButton'); self.btn_recent.pack(side='left', padx=(0,8))
         self.btn_load = ttk.Button(left_ctrl, text="Load Profile", command=self.load_profile, state="disabled", style='Ghost.TButton'); self.btn_load.pack(side='left', padx=4)
         self.btn_new = ttk.Button(left_ctrl, text="New Profile", command=self.new_profile, state="disabled", style='Ghost.TButton'); self.btn_new.pack(side='left', padx=4)
         self.btn_delete = ttk.Button(left_ctrl, text="Delete Profile", command=self.delete_profile, state="disabled", style='Ghost.TButton'); self.btn_delete.pack(side='left', padx=4)
+        self.btn_export = ttk.Button(left_ctrl, text="Export", command=self.export_data, state="disabled", style='Ghost.TButton'); self.btn_export.pack(side='left', padx=4)
 
         ttk.Label(frm_top, text='').pack(side='left', expand=True)
 
@@ -448,58 +775,161 @@ class HealthApp(tk.Tk):
         frm_bmi_actions = ttk.Frame(self.tab_bmi); frm_bmi_actions.pack(anchor='nw', pady=5)
         ttk.Button(frm_bmi_actions, text="Edit BMI / Update Profile", command=self.edit_bmi, style='Accent.TButton').pack(side='left', padx=5)
         ttk.Button(frm_bmi_actions, text="Recalculate (from stored height/weight)", command=self.recalculate_bmi, style='Ghost.TButton').pack(side='left', padx=5)
+        ttk.Button(frm_bmi_actions, text="Show BMI Trend", command=lambda: self.show_graph('bmi'), style='Ghost.TButton').pack(side='left', padx=5)
+
+        # the other tabs only get their frame now, contents are built the first time they're selected
+        self.step_goal_var = tk.StringVar(value='—'); self.water_rec_var = tk.StringVar(value='—')
+        self.steps_history = self.water_history = self.steps_tree = self.water_tree = self.txt_recs = None
+        self.chart_panel = None; self._series_cache = {}; self._rec_text = None
+        self.year_panel = None; self._year_cache = {}   # (profile id, kind, year) -> health_charts.year_matrix()
+        self.exclude_flagged_var = tk.BooleanVar(value=False)
+        self.tab_steps = self._add_lazy_tab('Steps Tracker', self._build_steps_tab, padding=10)
+        self.tab_water = self._add_lazy_tab('Water Intake', self._build_water_tab, padding=10)
+        # graph tab (the chart panel is built on the first "Show Graph" click)
+        self.tab_graph = ttk.Frame(self.notebook, padding=10, style='Card.TFrame'); self.notebook.add(self.tab_graph, text='Graph')
+        self.tab_recs = self._add_lazy_tab('Insights', self._build_recs_tab)
+        self.tab_team = self._add_lazy_tab('Team', self._build_team_tab)
+        self.tab_about = self._add_lazy_tab('About', self._build_about_tab)
+        self.tab_how = self._add_lazy_tab('How to use', self._build_how_tab)
+        # hidden until Ctrl+Shift+D (or --trace)
+        self.tab_diag = self._add_lazy_tab('Diagnostics', self._build_diag_tab); self.notebook.hide(self.tab_diag)
+        self.bind_all('<Control-Shift-D>', lambda e: self.show_diagnostics())
+        self.notebook.bind('<<NotebookTabChanged>>', self._on_tab_changed)
+        
+        # apply theme
+        self.theme.scan(self)
+        self._apply_theme(self.theme_t)
 
-        # steps tab
-        self.tab_steps = ttk.Frame(self.notebook, padding=10, style='Card.TFrame'); self.notebook.add(self.tab_steps, text='Steps Tracker')
-        self.step_goal_var = tk.StringVar(value='—')
+    def _add_lazy_tab(self, text, builder, padding=12):
+        tab = ttk.Frame(self.notebook, padding=padding, style='Card.TFrame'); self.notebook.add(tab, text=text)
+        self._tab_builders[str(tab)] = builder
+        return tab
+
+    def _on_tab_changed(self, event=None):
+        tab = self.notebook.select()
+        if tab == str(self.tab_team) and tab not in self._tab_builders: self.refresh_team()
+        self._ensure_tab(tab)
+
+    def _ensure_tab(self, tab):
+        builder = self._tab_builders.pop(str(tab), None)
+        if builder is None: return
+        started = time.perf_counter()
+        builder()
+        self.theme.scan(self.nametowidget(str(tab))); self._apply_theme(self.theme_t)
+        self.tab_build_times[builder.__name__] = time.perf_counter() - started
+
+    def _build_steps_tab(self):
         ttk.Label(self.tab_steps, text='Recommended daily step goal:').pack(anchor='nw')
         ttk.Label(self.tab_steps, textvariable=self.step_goal_var, font=('Helvetica', 16, 'bold')).pack(anchor='nw')
         frm_steps_log = ttk.Frame(self.tab_steps); frm_steps_log.pack(anchor='nw', pady=6)
         ttk.Label(frm_steps_log, text='Date (YYYY-MM-DD):').grid(row=0, column=0, sticky='w')
         self.steps_date_entry = tk.Entry(frm_steps_log, width=15, relief='flat'); self.steps_date_entry.grid(row=0, column=1, padx=5, ipady=3)
         self.steps_date_entry.insert(0, date.today().isoformat())
-        cal_btn = ttk.Button(frm_steps_log, text='📅', width=3, command=lambda e=self.steps_date_entry: self.open_calendar_for(e), style='Ghost.TButton'); cal_btn.grid(row=0, column=2, padx=(4,0))
+        cal_btn = ttk.Button(frm_steps_log, text='📅', width=3, command=lambda e=self.steps_date_entry: self.open_calendar_for(e, 'steps'), style='Ghost.TButton'); cal_btn.grid(row=0, column=2, padx=(4,0))
         ttk.Label(frm_steps_log, text='Steps:').grid(row=1, column=0, sticky='w')
         self.steps_entry = tk.Entry(frm_steps_log, width=15, relief='flat'); self.steps_entry.grid(row=1, column=1, padx=5, ipady=3)
         ttk.Button(frm_steps_log, text='Add / Update', command=self.save_steps, style='Accent.TButton').grid(row=2, column=0, columnspan=3, pady=8)
         frm_steps_actions = ttk.Frame(self.tab_steps); frm_steps_actions.pack(anchor='nw', pady=5)
         ttk.Button(frm_steps_actions, text='Show Steps Graph', command=self.plot_steps, style='Ghost.TButton').pack(side='left', padx=5)
-        self.steps_tree = ttk.Treeview(self.tab_steps, columns=("date","steps"), show='headings', height=12)
-        self.steps_tree.heading('date', text='Date'); self.steps_tree.heading('steps', text='Steps')
-        self.steps_tree.column('date', width=150, anchor='center'); self.steps_tree.column('steps', width=120, anchor='center')
-        self.steps_tree.pack(fill='both', expand=True, pady=6)
-
-        # water tab
-        self.tab_water = ttk.Frame(self.notebook, padding=10, style='Card.TFrame'); self.notebook.add(self.tab_water, text='Water Intake')
-        self.water_rec_var = tk.StringVar(value='—')
+        ttk.Button(frm_steps_actions, text='Year Heatmap', command=lambda: self.show_year('steps'), style='Ghost.TButton').pack(side='left', padx=5)
+        self.steps_history = HistoryTree(self.tab_steps, ("date","steps"), ("Date","Steps"), lambda done, **kw: self._fetch_log_page('steps', done, **kw))
+        self.steps_history.pack(fill='both', expand=True, pady=6); self.steps_tree = self.steps_history.tree
+        self.refresh_steps_view()
+
+    def _build_water_tab(self):
         ttk.Label(self.tab_water, text='Recommended daily water intake:').pack(anchor='nw')
         ttk.Label(self.tab_water, textvariable=self.water_rec_var, font=('Helvetica', 16, 'bold')).pack(anchor='nw')
         frm_water_log = ttk.Frame(self.tab_water); frm_water_log.pack(anchor='nw', pady=6)
         ttk.Label(frm_water_log, text='Date (YYYY-MM-DD):').grid(row=0, column=0, sticky='w')
         self.water_date_entry = tk.Entry(frm_water_log, width=15, relief='flat'); self.water_date_entry.grid(row=0, column=1, padx=5, ipady=3)
         self.water_date_entry.insert(0, date.today().isoformat())
-        wcal_btn = ttk.Button(frm_water_log, text='📅', width=3, command=lambda e=self.water_date_entry: self.open_calendar_for(e), style='Ghost.TButton'); wcal_btn.grid(row=0, column=2, padx=(4,0))
+        wcal_btn = ttk.Button(frm_water_log, text='📅', width=3, command=lambda e=self.water_date_entry: self.open_calendar_for(e, 'water'), style='Ghost.TButton'); wcal_btn.grid(row=0, column=2, padx=(4,0))
         ttk.Label(frm_water_log, text='Amount (ml):').grid(row=1, column=0, sticky='w')
         self.water_entry = tk.Entry(frm_water_log, width=15, relief='flat'); self.water_entry.grid(row=1, column=1, padx=5, ipady=3)
-        ttk.Button(frm_water_log, text='Add / Update', command=self.save_water, style='Accent.TButton').grid(row=2, column=0, columnspan=3, pady=8)
+        ttk.Button(frm_water_log, text='Add / Update', command=self.save_water, style='Accent.TButton').grid(row=2, column=0, columnspan=2, pady=8, sticky='w')
+        ttk.Button(frm_water_log, text='+ Add drink', command=self.add_water_entry, style='Ghost.TButton').grid(row=2, column=2, pady=8, padx=(6,0))
         frm_water_actions = ttk.Frame(self.tab_water); frm_water_actions.pack(anchor='nw', pady=5)
         ttk.Button(frm_water_actions, text='Show Water Graph', command=self.plot_water, style='Ghost.TButton').pack(side='left', padx=5)
-        self.water_tree = ttk.Treeview(self.tab_water, columns=("date","ml"), show='headings', height=12)
-        self.water_tree.heading('date', text='Date'); self.water_tree.heading('ml', text='Amount (ml)')
-        self.water_tree.column('date', width=150, anchor='center'); self.water_tree.column('ml', width=120, anchor='center')
-        self.water_tree.pack(fill='both', expand=True, pady=6)
-
-        # insights / reco tab
-        self.tab_recs = ttk.Frame(self.notebook, padding=12, style='Card.TFrame')
-        self.notebook.add(self.tab_recs, text='Insights')
+        ttk.Button(frm_water_actions, text='Year Heatmap', command=lambda: self.show_year('water'), style='Ghost.TButton').pack(side='left', padx=5)
+        self.water_history = HistoryTree(self.tab_water, ("date","ml"), ("Date","Amount (ml)"), lambda done, **kw: self._fetch_log_page('water', done, **kw))
+        self.water_history.pack(fill='both', expand=True, pady=6); self.water_tree = self.water_history.tree
+        self.refresh_water_view()
+
+    # insights / reco tab
+    def _build_recs_tab(self):
         ttk.Label(self.tab_recs, text="Health Insights & Recommendations", style='Header.TLabel').pack(anchor='nw', pady=(0, 10))
         self.txt_recs = tk.Text(self.tab_recs, height=18, width=50, bd=0, highlightthickness=0, font=('Helvetica', 11), wrap='word')
         self.txt_recs.pack(fill='both', expand=True, padx=5, pady=5)
         self.txt_recs.config(state='disabled')
-
-        # abt tab
-        self.tab_about = ttk.Frame(self.notebook, padding=12, style='Card.TFrame')
-        self.notebook.add(self.tab_about, text='About')
+        ttk.Checkbutton(self.tab_recs, text="Leave out flagged days (impossible values, outliers, repeated imports)",
+                        variable=self.exclude_flagged_var, command=self.refresh_recommendations).pack(anchor='nw', padx=5)
+        if self._rec_text is not None: self._update_rec_text(self._rec_text)
+
+    # team leaderboard: every profile in the folder, computed by grouped queries in the background
+    TEAM_COLUMNS = (('name', 'Name', 160), ('category', 'BMI category', 110), ('bmi', 'BMI', 60),
+                    ('steps_avg', 'Avg steps', 90), ('steps_goal_pct', 'Steps goal %', 95),
+                    ('water_avg', 'Avg water (ml)', 105), ('water_goal_pct', 'Water goal %', 95), ('steps_days', 'Step days', 80))
+    TEAM_WINDOWS = {'Last 7 days': 7, 'Last 30 days': 30, 'Last 90 days': 90, 'All history': None}
+
+    def _build_team_tab(self):
+        bar = ttk.Frame(self.tab_team, style='Card.TFrame'); bar.pack(fill='x', pady=(0, 8))
+        self.team_window_var = tk.StringVar(value='Last 30 days')
+        combo = ttk.Combobox(bar, textvariable=self.team_window_var, values=list(self.TEAM_WINDOWS), state='readonly', width=13)
+        combo.pack(side='left'); combo.bind('<<ComboboxSelected>>', lambda e: self.refresh_team())
+        ttk.Button(bar, text='Refresh', command=self.refresh_team, style='Ghost.TButton').pack(side='left', padx=6)
+        self.team_summary_var = tk.StringVar(value='')
+        ttk.Label(self.tab_team, textvariable=self.team_summary_var, style='Secondary.TLabel', wraplength=560, justify='left').pack(anchor='nw', pady=(0, 6))
+        frame = ttk.Frame(self.tab_team); frame.pack(fill='both', expand=True)
+        self.team_tree = ttk.Treeview(frame, columns=[c[0] for c in self.TEAM_COLUMNS], show='headings')
+        for col, text, width in self.TEAM_COLUMNS:
+            self.team_tree.heading(col, text=text, command=lambda c=col: self._sort_team(c))
+            self.team_tree.column(col, width=width, anchor='w' if col in ('name', 'category') else 'e')
+        vsb = ttk.Scrollbar(frame, orient='vertical', command=self.team_tree.yview); self.team_tree.configure(yscrollcommand=vsb.set)
+        self.team_tree.pack(side='left', fill='both', expand=True); vsb.pack(side='right', fill='y')
+        self.team_tree.bind('<Double-1>', lambda e: self.team_tree.focus() and self.load_profile(profile_id=int(self.team_tree.focus())))
+        self._team_rows = []; self._team_sort = ('steps_avg', True); self._team_fill = 0
+        self.refresh_team()
+
+    def refresh_team(self):
+        if not self.db or str(self.tab_team) in self._tab_builders: return
+        import health_cohort
+        self.team_summary_var.set('Loading…')
+        self.db.submit(health_cohort.cohort_rows, self.TEAM_WINDOWS[self.team_window_var.get()], channel='team', on_done=self._show_team)
+
+    def _show_team(self, rows):
+        import health_cohort
+        self._team_rows = rows
+        team = health_cohort.summary(rows)
+        pct = lambda v: '—' if v is None else f"{v:.0f}%"
+        cats = ', '.join(f"{k} {v}" for k, v in team['categories'].items()) or '—'
+        self.team_summary_var.set(f"{team['profiles']} profiles · steps goal met on {pct(team['steps_goal_pct'])} of logged days · "
+                                  f"water goal on {pct(team['water_goal_pct'])} · BMI: {cats}")
+        self._sort_team(*self._team_sort, toggle=False)
+
+    def _sort_team(self, column, descending=None, toggle=True):
+        if toggle:   # clicking the same heading again flips the order
+            descending = not self._team_sort[1] if self._team_sort[0] == column else column not in ('name', 'category')
+        import health_cohort
+        self._team_sort = (column, descending)
+        rows = health_cohort.sort_rows(self._team_rows, column, descending)
+        self.team_tree.delete(*self.team_tree.get_children())
+        self._team_fill += 1; self._fill_team(rows, 0, self._team_fill)
+
+    def _fill_team(self, rows, start, fill, chunk=250):
+        # insert a chunk per event loop turn so big teams don't freeze the window
+        if fill != self._team_fill: return
+        import health_cohort
+        ix = health_cohort.COLUMNS.index
+        fmt = lambda v, pct=False: '—' if v is None else (f"{v:.0f}%" if pct else (f"{v:,.0f}" if isinstance(v, float) else v))
+        for r in rows[start:start + chunk]:
+            self.team_tree.insert('', 'end', iid=str(r[0]), values=(
+                r[ix('name')], r[ix('category')] or '—', '—' if r[ix('bmi')] is None else r[ix('bmi')],
+                fmt(r[ix('steps_avg')]), fmt(r[ix('steps_goal_pct')], True), fmt(r[ix('water_avg')]),
+                fmt(r[ix('water_goal_pct')], True), r[ix('steps_days')]))
+        if start + chunk < len(rows): self.after(1, lambda: self._fill_team(rows, start + chunk, fill))
+
+    # abt tab
+    def _build_about_tab(self):
         about_inner = ttk.Frame(self.tab_about, style='Card.TFrame')
         about_inner.pack(expand=True, fill='both', padx=20, pady=40)
         ttk.Label(about_inner, text="CS121 Advanced Computer Programming", style='Header.TLabel').pack(anchor='center', pady=(10, 5))
@@ -510,10 +940,8 @@ class HealthApp(tk.Tk):
                       "CRUD operations (Create, Read, Update, Delete).")
         ttk.Label(about_inner, text=about_text, justify='center', font=('Helvetica', 11)).pack(anchor='center')
 
-
-        # How to use
-        self.tab_how = ttk.Frame(self.notebook, padding=12, style='Card.TFrame')
-        self.notebook.add(self.tab_how, text='How to use') 
+    # How to use
+    def _build_how_tab(self):
         how_inner = ttk.Frame(self.tab_how, style='Card.TFrame')
         how_inner.pack(expand=True, fill='both', padx=20, pady=40)
         ttk.Label(how_inner, text="Getting Started with the App", style='Header.TLabel').pack(anchor='center', pady=(10, 5))
@@ -526,12 +954,56 @@ class HealthApp(tk.Tk):
             "It's that simple! You can also delete, update, and share your profile data."
         )
         ttk.Label(how_inner, text=how_to_use_text, justify='left', font=('Helvetica', 11)).pack(anchor='center')
-        
-        # apply theme
-        self._apply_theme(self.theme_t)
+
+    # diagnostics
+    def _build_diag_tab(self):
+        bar = ttk.Frame(self.tab_diag, style='Card.TFrame'); bar.pack(fill='x', pady=(0, 8))
+        self.trace_var = tk.BooleanVar(value=TRACER.enabled)
+        ttk.Checkbutton(bar, text='Record timings', variable=self.trace_var,
+                        command=lambda: setattr(TRACER, 'enabled', self.trace_var.get())).pack(side='left')
+        ttk.Button(bar, text='Reset', command=lambda: (TRACER.reset(), self._refresh_diagnostics(False)), style='Ghost.TButton').pack(side='left', padx=6)
+        ttk.Button(bar, text='Export JSON', command=lambda: self._export_trace('json'), style='Ghost.TButton').pack(side='left', padx=6)
+        ttk.Button(bar, text='Export Chrome trace', command=lambda: self._export_trace('chrome'), style='Ghost.TButton').pack(side='left', padx=6)
+        self.cache_stats_var = tk.StringVar()
+        ttk.Label(bar, textvariable=self.cache_stats_var).pack(side='right', padx=6)
+        cols = ('name', 'cat', 'count', 'mean', 'p50', 'p95', 'p99', 'max')
+        self.diag_tree = ttk.Treeview(self.tab_diag, columns=cols, show='headings')
+        for col, text in zip(cols, ('Name', 'Kind', 'Count', 'Mean ms', 'p50 ms', 'p95 ms', 'p99 ms', 'Max ms')):
+            self.diag_tree.heading(col, text=text)
+            self.diag_tree.column(col, width=300 if col == 'name' else 70, anchor='w' if col == 'name' else 'e', stretch=col == 'name')
+        self.diag_tree.pack(fill='both', expand=True)
+        self._refresh_diagnostics()
+
+    def show_diagnostics(self):
+        self.notebook.add(self.tab_diag); self.notebook.select(self.tab_diag)
+
+    def _refresh_diagnostics(self, repeat=True):
+        # refreshes itself once a second while the tab is showing
+        if str(self.tab_diag) in self._tab_builders: return
+        if self.notebook.select() == str(self.tab_diag):
+            self.diag_tree.delete(*self.diag_tree.get_children())
+            rows = sorted(TRACER.stats().items(), key=lambda kv: -kv[1]['total_ms'])
+            for name, s in rows:
+                self.diag_tree.insert('', 'end', values=(name, s['cat'], s['count'], f"{s['mean_ms']:.2f}", f"{s['p50_ms']:.2f}",
+                                                         f"{s['p95_ms']:.2f}", f"{s['p99_ms']:.2f}", f"{s['max_ms']:.2f}"))
+            c = self.profile_cache.stats()
+            self.cache_stats_var.set(f"Profile cache: {c['profiles']} profiles, {c['hits']} hits / {c['misses']} misses"
+                                     + (f" ({c['hit_rate']:.0%})" if c['hit_rate'] is not None else ""))
+        if repeat: self.after(1000, self._refresh_diagnostics)
+
+    def _export_trace(self, fmt):
+        path = filedialog.asksaveasfilename(title="Export timings", defaultextension='.json',
+                                            initialfile='health_trace.json' if fmt == 'json' else 'health_chrome_trace.json',
+                                            filetypes=[("JSON", "*.json")])
+        if not path: return
+        try: TRACER.export_json(path) if fmt == 'json' else TRACER.export_chrome(path)
+        except OSError as e: messagebox.showerror("Export failed", str(e)); return
+        messagebox.showinfo("Exported", f"Saved {path}")
 
     # calendar helper
-    def open_calendar_for(self, entry_widget):
+    CALENDAR_MONTHS = 24   # months kept per profile and kind in the profile cache
+
+    def open_calendar_for(self, entry_widget, kind=None):
         txt = entry_widget.get().strip()
         try:
             d = datetime.fromisoformat(txt).date()
@@ -541,9 +1013,25 @@ class HealthApp(tk.Tk):
         
         # pass current theme colors to calendar
         colors = self._get_current_colors()
-        theme_args = {'bg': colors['panel'], 'fg': colors['button_fg'], 'btn_bg': colors['button_bg']}
-        
-        CalendarPopup(self, year=year, month=month, callback=lambda iso: (entry_widget.delete(0, tk.END), entry_widget.insert(0, iso)), theme_colors=theme_args)
+        theme_args = {'bg': colors['panel'], 'fg': colors['button_fg'], 'btn_bg': colors['button_bg'],
+                      'accent': colors['accent'], 'muted': colors['muted']}
+        load = (lambda y, m, done: self._calendar_month(kind, y, m, done)) if kind and self.db and self.current_profile_id else None
+        popup = CalendarPopup(self, year=year, month=month, callback=lambda iso: (entry_widget.delete(0, tk.END), entry_widget.insert(0, iso)),
+                              theme_colors=theme_args, load_month=load)
+        for cell in popup.cells: self.theme.exclude(cell)   # tinted by goal attainment, not by role
+
+    def _calendar_month(self, kind, year, month, done):
+        """done((values, goals)) for one month of the current profile, from the profile cache when it can."""
+        pid = self.current_profile_id; part = f'{kind}_months'
+        if not self.db or pid is None: return
+        hit = self.profile_cache.get_item(pid, part, (year, month))
+        if hit is not None: done(hit); return
+        token = self.profile_cache.token(pid)
+        def loaded(data):
+            self.profile_cache.put_item(pid, part, (year, month), data, token, limit=self.CALENDAR_MONTHS)
+            if pid == self.current_profile_id: done(data)
+        # one channel: paging quickly past a month drops its pending query
+        self.db.submit(health_analytics.calendar_month, pid, kind, year, month, channel='calendar', on_done=loaded)
 
     # entrance anim
     def _entrance_animation(self):
@@ -558,62 +1046,71 @@ class HealthApp(tk.Tk):
     # DB management
     def open_directory(self):
         folder = filedialog.askdirectory(title="Select folder to store profiles")
-        if not folder: return
+        if folder: self._open_folder(folder)
+
+    def _open_folder(self, folder):
         self.folder = folder; self.db_path = os.path.join(self.folder, DB_FILENAME)
         first_time = not os.path.exists(self.db_path)
         self.lbl_dir.config(text=self.folder)
         self._init_db()
-        self.btn_load.config(state="normal"); self.btn_new.config(state="normal"); self.btn_delete.config(state="normal")
-        self.refresh_profiles_list()
+        self.btn_load.config(state="normal"); self.btn_new.config(state="normal"); self.btn_delete.config(state="normal"); self.btn_export.config(state="normal")
+        self.refresh_profiles_list(); self.refresh_team()
         if first_time:
             messagebox.showinfo("New directory", "No database found in the chosen folder. A new database was created. Please create a new profile now.")
             self.new_profile()
 
-    def _init_db(self):
-        self.conn = sqlite3.connect(self.db_path)
-        cur = self.conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS profiles (
-                id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE,
-                height_cm REAL,
-                weight_kg REAL,
-                bmi REAL,
-                category TEXT,
-                water_l REAL,
-                step_goal INTEGER,
-                created_at TEXT
-            );
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS steps (
-                id INTEGER PRIMARY KEY,
-                profile_id INTEGER,
-                date TEXT,
-                steps INTEGER,
-                UNIQUE(profile_id, date)
-            );
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS water_logs (
-                id INTEGER PRIMARY KEY,
-                profile_id INTEGER,
-                date TEXT,
-                ml INTEGER,
-                UNIQUE(profile_id, date)
-            );
-        """)
-        self.conn.commit()
+    def open_server(self):
+        import health_remote
+        url = simpledialog.askstring("Connect to server", "Server address (e.g. http://192.168.1.20:8765):", parent=self,
+                                     initialvalue=self.server_url or f"http://127.0.0.1:{health_remote.DEFAULT_PORT}")
+        if url and url.strip(): self._open_server(url.strip())
+
+    def _open_server(self, url):
+        # same requests as a local folder, answered by health_server (which owns the database file)
+        import health_remote
+        self.folder = None; self.db_path = None; self.server_url = url
+        self.lbl_dir.config(text=f"Server: {url}")
+        self._init_db(health_remote.RemoteWorker(url, token=os.environ.get('HEALTH_SERVER_TOKEN')))
+        self.btn_load.config(state="normal"); self.btn_new.config(state="normal"); self.btn_delete.config(state="normal")
+        self.btn_export.config(state="disabled")   # exports write files next to the database, run them on the server
+        self.refresh_profiles_list(); self.refresh_team()
+
+    def _init_db(self, remote=None):
+        # every query runs on the worker's threads, results come back through poll()
+        # the previous folder's worker stays in the pool, idle, with its pending callbacks dropped
+        if self.db is not None: self.db.detach()
+        if self.remote is not None and self.remote is not remote: self.remote.close(); self.remote = None
+        self.current_profile_id = None; self._series_cache = {}; health_analytics.CACHE.clear(); self.profile_cache.clear()
+        self._forget_years()
+        if remote is not None: self.db = self.remote = remote
+        else: self.db, reused = self.pool.get(self.db_path); self.server_url = None
+        self.db.on_error = lambda e: messagebox.showerror("Database error", str(e))
+        self.db.attach(self)
+        self.scan_flags()   # catch up with rows written elsewhere (imports, sync, other machines)
+
+    def _fill_recent_menu(self):
+        self.recent_menu.delete(0, 'end')
+        folders = [os.path.dirname(p) for p in self.pool.recent()]
+        for folder in folders:
+            self.recent_menu.add_command(label=folder, command=lambda f=folder: self._open_folder(f))
+        if not folders: self.recent_menu.add_command(label="(no folders opened yet)", state='disabled')
+
+    def _on_close(self):
+        self.pool.close_all(wait=True)   # let queued writes finish and the connections close cleanly
+        if self.remote is not None: self.remote.close(wait=True)
+        self.destroy()
 
     # profiles CRUD
     def refresh_profiles_list(self):
-        if not self.conn: return
-        cur = self.conn.cursor(); cur.execute("SELECT id, name FROM profiles ORDER BY name;"); rows = cur.fetchall()
+        if not self.db: return
+        self.db.submit(health_db.list_profiles, channel='profiles', on_done=self._show_profiles)
+
+    def _show_profiles(self, rows):
         self.profile_list.delete(0, tk.END)
         for r in rows: self.profile_list.insert(tk.END, f"{r[0]}: {r[1]}")
 
     def new_profile(self):
-        if not self.conn: messagebox.showwarning("No directory", "Please select a directory first."); return
+        if not self.db: messagebox.showwarning("No directory", "Please select a directory first."); return
         
         popup = tk.Toplevel(self); popup.title("Create New Profile"); popup.transient(self); popup.grab_set()
         
@@ -658,78 +1155,109 @@ class HealthApp(tk.Tk):
             except Exception:
                 messagebox.showerror("Invalid input", "Please enter valid numeric values for height and weight."); return
             bmi = calculate_bmi(weight_kg, height_cm); cat = bmi_category(bmi); water_l = recommend_water_liters(bmi); step_goal = recommend_step_goal(bmi)
-            cur = self.conn.cursor(); cur.execute("""INSERT OR REPLACE INTO profiles (name, height_cm, weight_kg, bmi, category, water_l, step_goal, created_at)
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?);""", (name, height_cm, weight_kg, bmi, cat, water_l, step_goal, datetime.now().isoformat()))
-            self.conn.commit(); popup.destroy(); self.refresh_profiles_list(); cur.execute("SELECT id FROM profiles WHERE name=?;", (name,)); row = cur.fetchone()
-            if row: self.load_profile(profile_id=row[0])
+            popup.destroy()
+            def created(pid):
+                self.refresh_profiles_list()
+                if pid: self.load_profile(profile_id=pid)
+            self.db.submit(health_db.create_profile, name, height_cm, weight_kg, bmi, cat, water_l, step_goal, datetime.now().isoformat(),
+                           write=True, on_done=created)
 
         ttk.Button(pf, text="Create", command=create_and_close, style='Accent.TButton').grid(row=3, column=0, columnspan=2, pady=12)
 
     def on_profile_select(self, event):
-        if not self.conn: return
+        if not self.db: return
         sel = self.profile_list.curselection(); 
         if not sel: return
         text = self.profile_list.get(sel[0]); pid = int(text.split(":",1)[0]); self.load_profile(profile_id=pid)
 
     def load_profile(self, profile_id=None):
-        if not self.conn: messagebox.showwarning("No directory", "Please select a directory first."); return
+        if not self.db: messagebox.showwarning("No directory", "Please select a directory first."); return
         
         if profile_id is None:
             sel = self.profile_list.curselection()
             if not sel:
-                rows = self.conn.execute("SELECT id, name FROM profiles ORDER BY name;").fetchall()
-                if not rows: messagebox.showinfo("No profiles", "No profiles available. Create a new profile first."); return
-                
-                popup = tk.Toplevel(self); popup.title("Load Profile"); popup.transient(self); popup.grab_set()
-                colors = self._get_current_colors()
-                popup.configure(bg=colors['panel'])
-                
-                lb = tk.Listbox(popup, bg=colors['panel'], fg=colors['button_fg'], highlightbackground=colors['border'])
-                lb.pack(fill='both', expand=True, padx=10, pady=10)
-                for r in rows: lb.insert(tk.END, f"{r[0]}: {r[1]}")
-                
-                def on_choose():
-                    s = lb.curselection()
-                    if not s: return
-                    txt = lb.get(s[0])
-                    pid = int(txt.split(":",1)[0])
-                    popup.destroy()
-                    self.load_profile(profile_id=pid)
-                    
-                ttk.Button(popup, text="Load", command=on_choose, style='Accent.TButton').pack(pady=(0,10))
-                self.wait_window(popup)
+                self.db.submit(health_db.list_profiles, channel='profiles_popup', on_done=self._choose_profile_popup)
                 return
             else:
                 text = self.profile_list.get(sel[0]); profile_id = int(text.split(":",1)[0])
         
         if not profile_id: return 
 
-        cur = self.conn.cursor()
-        cur.execute("SELECT id, name, height_cm, weight_kg, bmi, category, water_l, step_goal FROM profiles WHERE id=?;", (profile_id,))
-        row = cur.fetchone()
+        row = self.profile_cache.get(profile_id, 'profile')
+        if row is not None:
+            self.db.cancel('profile'); self._show_profile(row); return
+        # a newer load on the 'profile' channel makes this one stale, so fast clicking only shows the last pick
+        token = self.profile_cache.token(profile_id)
+        def loaded(row):
+            if row: self.profile_cache.put(profile_id, 'profile', row, token)
+            self._show_profile(row)
+        self.db.submit(health_db.get_profile, profile_id, channel='profile', on_done=loaded)
+
+    def _choose_profile_popup(self, rows):
+        if not rows: messagebox.showinfo("No profiles", "No profiles available. Create a new profile first."); return
+        
+        popup = tk.Toplevel(self); popup.title("Load Profile"); popup.transient(self); popup.grab_set()
+        colors = self._get_current_colors()
+        popup.configure(bg=colors['panel'])
+        
+        lb = tk.Listbox(popup, bg=colors['panel'], fg=colors['button_fg'], highlightbackground=colors['border'])
+        lb.pack(fill='both', expand=True, padx=10, pady=10)
+        for r in rows: lb.insert(tk.END, f"{r[0]}: {r[1]}")
+        
+        def on_choose():
+            s = lb.curselection()
+            if not s: return
+            txt = lb.get(s[0])
+            pid = int(txt.split(":",1)[0])
+            popup.destroy()
+            self.load_profile(profile_id=pid)
+            
+        ttk.Button(popup, text="Load", command=on_choose, style='Accent.TButton').pack(pady=(0,10))
+
+    def _show_profile(self, row):
         if not row: messagebox.showerror("Not found", "Profile not found."); return
         self.current_profile_id = row[0]; self.title(f"Health Metric Calculator — {row[1]}")
         self.bmi_value_var.set(str(row[4])); self.bmi_cat_var.set(row[5]); self.step_goal_var.set(f"{row[7]} steps"); self.water_rec_var.set(f"{row[6]} L")
         self.refresh_steps_view(); self.refresh_water_view(); self.refresh_recommendations()
 
     def delete_profile(self):
-        if not self.conn: return
+        if not self.db: return
         sel = self.profile_list.curselection(); 
         if not sel: messagebox.showinfo("Select profile", "Please select a profile from the list to delete."); return
         text = self.profile_list.get(sel[0]); pid = int(text.split(":",1)[0])
         confirm = messagebox.askyesno("Confirm delete", "Delete profile and all associated logs? This cannot be undone.")
         if not confirm: return
-        cur = self.conn.cursor(); cur.execute("DELETE FROM steps WHERE profile_id=?;", (pid,)); cur.execute("DELETE FROM water_logs WHERE profile_id=?;", (pid,)); cur.execute("DELETE FROM profiles WHERE id=?;", (pid,))
-        self.conn.commit(); self.current_profile_id = None; self.title("Health Metric Calculator"); self.refresh_profiles_list(); self.bmi_value_var.set("—"); self.bmi_cat_var.set("—"); self.step_goal_var.set("—"); self.water_rec_var.set("—")
-        for t in self.steps_tree.get_children(): self.steps_tree.delete(t)
-        for t in self.water_tree.get_children(): self.water_tree.delete(t)
-        self.txt_recs.config(state='normal'); self.txt_recs.delete("1.0", tk.END); self.txt_recs.config(state='disabled')
+        for channel in ('profile', 'steps_page', 'water_page', 'insights', 'graph'): self.db.cancel(channel)
+        self.db.submit(health_db.delete_profile, pid, write=True, on_done=lambda _: self._profile_deleted(pid))
+
+    def export_data(self):
+        """CSV export of the loaded profile (every profile when none is loaded), streamed on a reader thread."""
+        if not self.db: return
+        out = filedialog.askdirectory(title="Select folder for the export")
+        if not out: return
+        import health_export
+        pid = self.current_profile_id
+        def done(written):
+            messagebox.showinfo("Exported", "\n".join(f"{os.path.basename(p)}: {n} rows" for p, n in written))
+        self.db.submit(health_export.export_folder, out, 'csv', pid, channel='export', on_done=done)
+
+    def _profile_deleted(self, pid):
+        health_analytics.CACHE.invalidate(pid); self.profile_cache.invalidate(pid)
+        self._series_cache = {k: v for k, v in self._series_cache.items() if k[0] != pid}
+        self._forget_years(pid)
+        self.current_profile_id = None; self.title("Health Metric Calculator"); self.refresh_profiles_list(); self.bmi_value_var.set("—"); self.bmi_cat_var.set("—"); self.step_goal_var.set("—"); self.water_rec_var.set("—")
+        for history in (self.steps_history, self.water_history):
+            if history is not None: history.clear()
+        self._update_rec_text("")
 
     def edit_bmi(self):
-        if not self.conn: messagebox.showwarning("No directory", "Please select a directory first."); return
+        if not self.db: messagebox.showwarning("No directory", "Please select a directory first."); return
         if not self.current_profile_id: messagebox.showinfo("No profile", "Load or create a profile first."); return
-        cur = self.conn.cursor(); cur.execute("SELECT name, height_cm, weight_kg FROM profiles WHERE id=?;", (self.current_profile_id,)); row = cur.fetchone()
-        if not row: messagebox.showerror("Not found", "Profile not found."); return
+        self.db.submit(health_db.get_profile, self.current_profile_id, channel='edit', on_done=self._edit_bmi_popup)
+
+    def _edit_bmi_popup(self, profile):
+        if not profile: messagebox.showerror("Not found", "Profile not found."); return
+        pid = profile[0]; row = (profile[1], profile[2], profile[3])   # name, height_cm, weight_kg
         
         popup = tk.Toplevel(self); popup.title("Edit BMI / Profile Data"); popup.transient(self); popup.grab_set()
         colors = self._get_current_colors()
@@ -769,18 +1297,22 @@ class HealthApp(tk.Tk):
             except Exception:
                 messagebox.showerror("Invalid", "Enter numeric values for height and weight."); return
             bmi = calculate_bmi(w, h); cat = bmi_category(bmi); water_l = recommend_water_liters(bmi); step_goal = recommend_step_goal(bmi)
-            cur.execute("UPDATE profiles SET height_cm=?, weight_kg=?, bmi=?, category=?, water_l=?, step_goal=? WHERE id=?;", (h, w, bmi, cat, water_l, step_goal, self.current_profile_id))
-            self.conn.commit(); popup.destroy(); self.load_profile(profile_id=self.current_profile_id)
+            popup.destroy()
+            self.db.submit(health_db.update_profile, pid, h, w, bmi, cat, water_l, step_goal, write=True,
+                           on_done=lambda _: self._profile_updated(pid))
 
         ttk.Button(pf, text="Save", command=save_changes, style='Accent.TButton').grid(row=3, column=0, columnspan=2, pady=12)
 
     def recalculate_bmi(self):
         if not self.current_profile_id: messagebox.showinfo("No profile", "Load a profile first."); return
-        cur = self.conn.cursor(); cur.execute("SELECT height_cm, weight_kg FROM profiles WHERE id=?;", (self.current_profile_id,)); row = cur.fetchone()
-        if not row: return
-        bmi = calculate_bmi(row[1], row[0]); cat = bmi_category(bmi); water_l = recommend_water_liters(bmi); step_goal = recommend_step_goal(bmi)
-        cur.execute("UPDATE profiles SET bmi=?, category=?, water_l=?, step_goal=? WHERE id=?;", (bmi, cat, water_l, step_goal, self.current_profile_id))
-        self.conn.commit(); self.load_profile(profile_id=self.current_profile_id)
+        pid = self.current_profile_id
+        self.db.submit(health_db.recalculate_profile, pid, write=True,
+                       on_done=lambda found: found and self._profile_updated(pid))
+
+    def _profile_updated(self, pid):
+        self.profile_cache.invalidate(pid, 'profile'); health_analytics.CACHE.invalidate(pid)
+        self._series_cache.pop((pid, 'bmi'), None); self._forget_years(pid)   # goals changed
+        self.load_profile(profile_id=pid)
 
     # steps & water logging
     def save_steps(self):
@@ -789,13 +1321,38 @@ class HealthApp(tk.Tk):
         except Exception: messagebox.showerror("Invalid date", "Please enter date in YYYY-MM-DD format."); return
         try: steps = int(self.steps_entry.get())
         except Exception: messagebox.showerror("Invalid steps", "Enter a whole number for steps."); return
-        cur = self.conn.cursor(); cur.execute("INSERT INTO steps (profile_id, date, steps) VALUES (?, ?, ?) ON CONFLICT(profile_id, date) DO UPDATE SET steps=excluded.steps;", (self.current_profile_id, d, steps)); self.conn.commit(); messagebox.showinfo("Saved", "Steps saved."); self.refresh_steps_view(); self.refresh_recommendations()
+        pid = self.current_profile_id   # the user may switch profiles before the write lands
+        self.db.submit(health_db.upsert_log, 'steps', pid, d, steps, write=True,
+                       on_done=lambda _: self._log_saved(pid, 'steps', d, steps))
+
+    def _log_saved(self, pid, kind, day, value):
+        messagebox.showinfo("Saved", "Steps saved." if kind == 'steps' else "Water log saved.")
+        health_analytics.CACHE.invalidate(pid, kind, since=day); self.profile_cache.invalidate(pid, kind)
+        self._invalidate_series(pid, kind)
+        if pid == self.current_profile_id:   # otherwise the other profile's views reload when it is opened
+            history = self.steps_history if kind == 'steps' else self.water_history
+            if history is not None: history.upsert(day, value)   # not built yet: it loads fresh when opened
+            self.refresh_recommendations()
+        self.scan_flags()
+
+    def _fetch_log_page(self, kind, done, **kw):
+        if not self.current_profile_id or not self.db: done([]); return
+        pid = self.current_profile_id; first = kw.get('before') is None and kw.get('after') is None
+        if first:   # the newest page is what every profile switch shows, keep it in the snapshot
+            part = f'{kind}_page'; rows = self.profile_cache.get(pid, part)
+            if rows is not None:
+                self.db.cancel(part); done(rows); return
+            token = self.profile_cache.token(pid)
+            def loaded(rows):
+                self.profile_cache.put(pid, part, rows, token); done(rows)
+            self.db.submit(health_db.log_page, pid, kind, channel=part, on_done=loaded, **kw)
+            return
+        self.db.submit(health_db.log_page, pid, kind, channel=f'{kind}_page', on_done=done, **kw)
 
     def refresh_steps_view(self):
-        for r in self.steps_tree.get_children(): self.steps_tree.delete(r)
-        if not self.current_profile_id: return
-        cur = self.conn.cursor(); rows = cur.execute("SELECT date, steps FROM steps WHERE profile_id=? ORDER BY date DESC LIMIT 100;", (self.current_profile_id,)).fetchall()
-        for r in rows: self.steps_tree.insert("", "end", values=(r[0], r[1]))
+        if self.steps_history is None: return
+        if not self.current_profile_id: self.steps_history.clear(); return
+        self.steps_history.reset()
 
     def save_water(self):
         if not self.current_profile_id: messagebox.showinfo("No profile", "Load or create a profile first."); return
@@ -803,78 +1360,61 @@ class HealthApp(tk.Tk):
         except Exception: messagebox.showerror("Invalid date", "Please enter date in YYYY-MM-DD format."); return
         try: ml = int(self.water_entry.get())
         except Exception: messagebox.showerror("Invalid amount", "Enter a whole number for ml."); return
-        cur = self.conn.cursor(); cur.execute("INSERT INTO water_logs (profile_id, date, ml) VALUES (?, ?, ?) ON CONFLICT(profile_id, date) DO UPDATE SET ml=excluded.ml;", (self.current_profile_id, d, ml)); self.conn.commit(); messagebox.showinfo("Saved", "Water log saved."); self.refresh_water_view(); self.refresh_recommendations()
+        pid = self.current_profile_id
+        self.db.submit(health_db.upsert_log, 'water', pid, d, ml, write=True,
+                       on_done=lambda _: self._log_saved(pid, 'water', d, ml))
+
+    def add_water_entry(self):
+        """Log one more drink for the day (an intraday event) instead of replacing the day's total."""
+        if not self.current_profile_id: messagebox.showinfo("No profile", "Load or create a profile first."); return
+        try: d = datetime.fromisoformat(self.water_date_entry.get()).date()
+        except Exception: messagebox.showerror("Invalid date", "Please enter date in YYYY-MM-DD format."); return
+        try: ml = int(self.water_entry.get())
+        except Exception: messagebox.showerror("Invalid amount", "Enter a whole number for ml."); return
+        now = datetime.now()
+        when = now if d == now.date() else datetime.combine(d, now.time())
+        import health_intraday
+        pid = self.current_profile_id
+        self.db.submit(health_intraday.add_event, 'water', pid, when, ml, write=True,
+                       on_done=lambda total: self._log_saved(pid, 'water', d.isoformat(), total))
 
     def refresh_water_view(self):
-        for r in self.water_tree.get_children(): self.water_tree.delete(r)
-        if not self.current_profile_id: return
-        cur = self.conn.cursor(); rows = cur.execute("SELECT date, ml FROM water_logs WHERE profile_id=? ORDER BY date DESC LIMIT 100;", (self.current_profile_id,)).fetchall()
-        for r in rows: self.water_tree.insert("", "end", values=(r[0], r[1]))
+        if self.water_history is None: return
+        if not self.current_profile_id: self.water_history.clear(); return
+        self.water_history.reset()
 
     def refresh_recommendations(self):
-        if not self.current_profile_id or not self.conn:
+        if not self.current_profile_id or not self.db:
             self._update_rec_text("Please load a profile to see recommendations.")
             return
-
-        cur = self.conn.cursor()
-
-        #  analyze BMI
-        cur.execute("SELECT bmi, category, step_goal, water_l FROM profiles WHERE id=?", (self.current_profile_id,))
-        p_row = cur.fetchone()
-        if not p_row: return
-        bmi, cat, s_goal, w_goal_l = p_row
-        
-        lines = []
-        lines.append(f"• BMI Status: {cat} ({bmi})")
-        if cat == "Overweight" or cat == "Obese":
-            lines.append("  Tip: Focus on a slight caloric deficit and consistent cardio.")
-        elif cat == "Underweight":
-            lines.append("  Tip: Ensure you are eating enough nutrient-dense foods.")
-        else:
-            lines.append("  Tip: Maintain your current routine!")
-        lines.append("-" * 40)
-
-        # analyze Steps
-        cur.execute("SELECT count(*), avg(steps) FROM steps WHERE profile_id=?", (self.current_profile_id,))
-        s_count, s_avg = cur.fetchone()
-        s_avg = int(s_avg) if s_avg else 0
-
-        lines.append(f"• Steps Analysis ({s_count} entries)")
-        if s_count < 5:
-            lines.append(f"  Result: Lacking Data (Need {5 - s_count} more entries)")
-            lines.append("  Advice: Log your steps daily to get a personalized analysis.")
-        else:
-            diff = s_avg - s_goal
-            if diff >= 0:
-                lines.append(f"  Result: Excellent! Averaging {s_avg} steps.")
-                lines.append("  Advice: You are consistently beating your goal. Consider raising it!")
-            else:
-                lines.append(f"  Result: Averaging {s_avg} steps (Goal: {s_goal})")
-                lines.append(f"  Advice: You are under by ~{abs(diff)} steps. Try a 10-minute walk after dinner.")
-        lines.append("-" * 40)
-
-        #  analyze water (Convert L to ml for comparison)
-        w_goal_ml = w_goal_l * 1000
-        cur.execute("SELECT count(*), avg(ml) FROM water_logs WHERE profile_id=?", (self.current_profile_id,))
-        w_count, w_avg = cur.fetchone()
-        w_avg = int(w_avg) if w_avg else 0
-
-        lines.append(f"• Hydration Analysis ({w_count} entries)")
-        if w_count < 5:
-            lines.append(f"  Result: Lacking Data (Need {5 - w_count} more entries)")
-            lines.append("  Advice: Track your water intake for a few more days.")
-        else:
-            if w_avg >= (w_goal_ml * 0.9):
-                lines.append(f"  Result: Great hydration! Averaging {w_avg} ml.")
-                lines.append("  Advice: Keep it up. Clear skin and energy come from water.")
-            else:
-                lines.append(f"  Result: Averaging {w_avg} ml (Goal: {int(w_goal_ml)} ml)")
-                lines.append("  Advice: Try carrying a water bottle with you to meet your target.")
-
-        final_text = "\n".join(lines)
-        self._update_rec_text(final_text)
+        pid = self.current_profile_id; today = date.today()
+        exclude = self.exclude_flagged_var.get()
+        cached = self.profile_cache.get(pid, 'insights')
+        if cached is not None and cached[:2] == (today, exclude):   # streaks and windows move with the date
+            self.db.cancel('insights'); self._update_rec_text(cached[2]); return
+        token = self.profile_cache.token(pid)
+        def loaded(bundle):
+            if not bundle: return
+            text = health_insights.insights_text(*bundle)
+            self.profile_cache.put(pid, 'insights', (today, exclude, text), token); self._update_rec_text(text)
+        self.db.submit(health_insights.insights_bundle, pid, exclude_flagged=exclude, channel='insights', on_done=loaded)
+
+    SCAN_BUDGET = 200000   # rows per scan request, so saves never wait long behind a first scan
+
+    def scan_flags(self):
+        """Bring the data-quality flags up to date with the logs (health_quality.scan, incremental)."""
+        if not self.db: return
+        import health_quality
+        def done(result):
+            for pid in result['profiles']:
+                health_analytics.CACHE.invalidate(pid, since=result.get('since'), flagged=True); self.profile_cache.invalidate(pid, 'flags')
+            if self.current_profile_id in result['profiles'] and self.exclude_flagged_var.get(): self.refresh_recommendations()
+            if result['more']: self.scan_flags()
+        self.db.submit(health_quality.scan, budget=self.SCAN_BUDGET, write=True, on_done=done)
 
     def _update_rec_text(self, text):
+        self._rec_text = text
+        if self.txt_recs is None: return
         self.txt_recs.config(state='normal')
         self.txt_recs.delete("1.0", tk.END)
         self.txt_recs.insert("1.0", text)
@@ -882,69 +1422,95 @@ class HealthApp(tk.Tk):
 
     # plotting
     def plot_steps(self):
-        if not self.current_profile_id: messagebox.showinfo("No profile", "Load a profile first."); return
-        if plt is None: messagebox.showerror("Plotting unavailable", "matplotlib not installed. Install with: pip install matplotlib"); return
-        
-        cur = self.conn.cursor(); rows = cur.execute("SELECT date, steps FROM steps WHERE profile_id=? ORDER BY date ASC;", (self.current_profile_id,)).fetchall()
-        if not rows: messagebox.showinfo("No data", "No steps data to plot."); return
-        
-        dates = [r[0] for r in rows]; values = [r[1] for r in rows]
-        
-        # Get current theme colors
-        c = self._get_current_colors()
-        
-        with plt.rc_context({
-            'axes.facecolor': c['panel'],
-            'figure.facecolor': c['bg'],
-            'text.color': c['button_fg'],
-            'xtick.color': c['button_fg'],
-            'ytick.color': c['button_fg'],
-            'axes.labelcolor': c['button_fg'],
-            'axes.edgecolor': c['border'],
-            'axes.titlecolor': c['button_fg']
-        }):
-            plt.figure(figsize=(8,4))
-            plt.plot(dates, values, marker='o', color=c['accent'], linewidth=2)
-            plt.xticks(rotation=45)
-            plt.xlabel("Date")
-            plt.ylabel("Steps")
-            plt.title("Steps over time")
-            plt.tight_layout()
-            plt.show()
+        self.show_graph('steps')
 
     def plot_water(self):
+        self.show_graph('water')
+
+    def show_graph(self, kind):
         if not self.current_profile_id: messagebox.showinfo("No profile", "Load a profile first."); return
-        if plt is None: messagebox.showerror("Plotting unavailable", "matplotlib not installed. Install with: pip install matplotlib cuh just do it its a requirement for the graph"); return
-        
-        cur = self.conn.cursor(); rows = cur.execute("SELECT date, ml FROM water_logs WHERE profile_id=? ORDER BY date ASC;", (self.current_profile_id,)).fetchall()
-        if not rows: messagebox.showinfo("No data", "No water data to plot."); return
-        
-        dates = [r[0] for r in rows]; values = [r[1] for r in rows]
-        
-        c = self._get_current_colors()
-        
-        with plt.rc_context({
-            'axes.facecolor': c['panel'],
-            'figure.facecolor': c['bg'],
-            'text.color': c['button_fg'],
-            'xtick.color': c['button_fg'],
-            'ytick.color': c['button_fg'],
-            'axes.labelcolor': c['button_fg'],
-            'axes.edgecolor': c['border'],
-            'axes.titlecolor': c['button_fg']
-        }):
-            plt.figure(figsize=(8,4))
-            plt.plot(dates, values, marker='o', color=c['accent'], linewidth=2)
-            plt.xticks(rotation=45)
-            plt.xlabel("Date")
-            plt.ylabel("Water (ml)")
-            plt.title("Water intake over time")
-            plt.tight_layout()
-            plt.show()
+        if not _load_plotting(): messagebox.showerror("Plotting unavailable", "matplotlib not installed. Install with: pip install matplotlib"); return
+
+        key = (self.current_profile_id, kind)
+        series = self._series_cache.get(key)
+        if series is None:
+            def loaded(series):
+                self._series_cache[key] = series
+                if self.current_profile_id == key[0]: self.show_graph(kind)
+            self.db.submit(health_charts.load_series, key[0], kind, channel='graph', on_done=loaded)
+            return
+        x, y = series
+        if not len(x): messagebox.showinfo("No data", f"No {'BMI' if kind == 'bmi' else kind} data to plot."); return
+
+        if self.chart_panel is None:
+            self.chart_panel = ChartPanel(self.tab_graph, style='Card.TFrame')
+            self.theme.exclude(self.chart_panel.canvas.get_tk_widget())   # recolored by apply_colors()
+        if self.year_panel is not None: self.year_panel.pack_forget()
+        self.chart_panel.pack(fill='both', expand=True)
+        ylabel, title = health_charts.CHART_META[kind]
+        self.chart_panel.set_series(key, x, y, ylabel, title, self._get_current_colors())
+        self.notebook.select(self.tab_graph)
+
+    def _invalidate_series(self, pid, kind):
+        key = (pid, kind)
+        self._series_cache.pop(key, None)
+        self._forget_years(pid, kind)
+        if self.notebook.select() != str(self.tab_graph): return
+        if self.chart_panel is not None and self.chart_panel.winfo_ismapped() and self.chart_panel.key == key:
+            self.show_graph(kind)
+        elif self.year_panel is not None and self.year_panel.winfo_ismapped() and self.year_panel.key[:2] == key:
+            self.show_year(kind, self.year_panel.year, self.year_panel.mode)
+
+    def show_year(self, kind, year=None, mode=None):
+        """Year heatmap of one log in the Graph tab (this year by default)."""
+        if not self.current_profile_id: messagebox.showinfo("No profile", "Load a profile first."); return
+        if not _load_plotting(): messagebox.showerror("Plotting unavailable", "matplotlib not installed. Install with: pip install matplotlib"); return
+        year = year or date.today().year; mode = mode or (self.year_panel.mode if self.year_panel is not None else 'amount')
+        key = (self.current_profile_id, kind, year)
+        data = self._year_cache.get(key)
+        if data is None:
+            def loaded(data):
+                self._year_cache[key] = data
+                if self.current_profile_id == key[0]: self.show_year(kind, year, mode)
+            self.db.submit(health_charts.year_matrix, key[0], kind, year, channel='graph', on_done=loaded)
+            return
+        if self.year_panel is None:
+            self.year_panel = YearPanel(self.tab_graph, lambda y, m: self.show_year(self.year_panel.key[1], y, m), style='Card.TFrame')
+            self.theme.exclude(self.year_panel.canvas.get_tk_widget())
+        if self.chart_panel is not None: self.chart_panel.pack_forget()
+        self.year_panel.pack(fill='both', expand=True)
+        self.year_panel.set_year(key, data, kind, mode, self._get_current_colors())
+        self.notebook.select(self.tab_graph)
+
+    def _forget_years(self, profile_id=None, kind=None):
+        self._year_cache = {k: v for k, v in self._year_cache.items()
+                            if profile_id is not None and (k[0] != profile_id or (kind is not None and k[1] != kind))}
+        if self.year_panel is not None: self.year_panel.forget(profile_id)
 
     def on_unit_change(self):
         if self.current_profile_id: self.load_profile(profile_id=self.current_profile_id)
 
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Health Metric Calculator")
+    parser.add_argument('--db', metavar='FOLDER', help="open this data folder at startup")
+    parser.add_argument('--server', metavar='URL', help="connect to a health_server instead of a folder")
+    parser.add_argument('--profile-startup', action='store_true', help="print a cold-start timing report and exit")
+    parser.add_argument('--trace', action='store_true', help="record hot-path timings and show the Diagnostics tab")
+    return parser.parse_args(argv)
+
 if __name__ == '__main__':
+    args = _parse_args()
+    if args.trace: TRACER.enabled = True
     app = HealthApp()
-    app.mainloop()
\ No newline at end of file
+    if args.trace: app.show_diagnostics()
+    if args.db: app._open_folder(os.path.abspath(args.db))
+    elif args.server: app._open_server(args.server)
+    if args.profile_startup:
+        app.update(); app.startup.mark('first paint')
+        extra = []
+        if app.db is not None:
+            app.db.wait_ready(); extra.append(('db open (bg thread)', app.db.connect_seconds))
+        print(app.startup.report(extra))
+        app._on_close()
+    else:
+        app.mainloop()
\ No newline at end of file
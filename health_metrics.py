@@ -0,0 +1,179 @@
+"""GUI-free BMI / goal math shared by the desktop app, the importers and batch jobs.
+
+Nothing in here may import tkinter or matplotlib: batch jobs import this module
+on headless servers and should not pay for the GUI stack.
+"""
+import math
+
+#numpy is optional, the batch helpers fall back to plain python lists. It is imported on
+#the first batch call so the desktop app (scalar functions only) starts without it.
+np = None
+_numpy_tried = False
+
+def _have_numpy():
+    global np, _numpy_tried
+    if not _numpy_tried:
+        _numpy_tried = True
+        try:
+            import numpy as np
+        except Exception:
+            np = None
+    return np is not None
+
+BMI_CATEGORIES = [
+    (0, 18.5, "Underweight"),
+    (18.5, 24.9, "Normal"),
+    (25.0, 29.9, "Overweight"),
+    (30.0, 1000, "Obese"),
+]
+
+# category codes used by the batch API are indexes into BMI_CATEGORIES
+CATEGORY_LABELS = [label for _, _, label in BMI_CATEGORIES]
+UNKNOWN_CODE = -1
+
+WATER_LITERS_BY_CATEGORY = {"Underweight": 2.5, "Normal": 3.0, "Overweight": 3.5, "Obese": 4.0}
+STEP_GOAL_BY_CATEGORY = {"Underweight": 11000, "Normal": 10000, "Overweight": 8000, "Obese": 6000}
+DEFAULT_WATER_LITERS = 3.0; NO_BMI_WATER_LITERS = 2.0
+DEFAULT_STEP_GOAL = 10000; NO_BMI_STEP_GOAL = 10000
+
+# calculation helpers
+def calculate_bmi(weight_kg, height_cm):
+    """BMI rounded to 2 places; None when an input is missing or not finite, or the height is zero."""
+    try:
+        if not (math.isfinite(weight_kg) and math.isfinite(height_cm)): return None
+        h_m = height_cm / 100.0
+        bmi = weight_kg / (h_m * h_m)
+        return round(bmi, 2) if math.isfinite(bmi) else None
+    except Exception:
+        return None
+
+def bmi_category(bmi):
+    for low, high, label in BMI_CATEGORIES:
+        if bmi >= low and bmi <= high:
+            return label
+    return "Unknown"
+
+def recommend_water_liters(bmi):
+    if bmi is None: return NO_BMI_WATER_LITERS
+    cat = bmi_category(bmi)
+    return WATER_LITERS_BY_CATEGORY.get(cat, DEFAULT_WATER_LITERS)
+
+def recommend_step_goal(bmi):
+    if bmi is None: return NO_BMI_STEP_GOAL
+    cat = bmi_category(bmi)
+    return STEP_GOAL_BY_CATEGORY.get(cat, DEFAULT_STEP_GOAL)
+
+def profile_metrics(weight_kg, height_cm):
+    """(bmi, category, water_l, step_goal) exactly as the profile dialogs store them."""
+    bmi = calculate_bmi(weight_kg, height_cm)
+    cat = bmi_category(bmi) if bmi is not None else "Unknown"
+    return bmi, cat, recommend_water_liters(bmi), recommend_step_goal(bmi)
+
+# unit converters
+def kg_to_lb(kg): return kg * 2.2046226218
+def lb_to_kg(lb): return lb / 2.2046226218
+def cm_to_inches(cm): return cm / 2.54
+def inches_to_cm(inches): return inches * 2.54
+def cm_to_ft_in(cm):
+    total_inches = cm_to_inches(cm)
+    ft = int(total_inches // 12)
+    inches = round(total_inches - ft*12, 2)
+    return ft, inches
+def ft_in_to_cm(ft, inches): return inches_to_cm(ft*12 + inches)
+
+# batch (vectorized) API
+#
+# Inputs can be numpy arrays, array.array / memoryview buffers or plain sequences.
+# Rows where calculate_bmi() would return None (a None, NaN or infinite input, or zero
+# height) come back as NaN bmi with the "no BMI" goals; everything else matches the
+# scalar functions exactly.
+
+def _round2(values):
+    """np.round(x, 2) that agrees with python's round() on near-ties too."""
+    scaled = values * 100.0
+    out = np.rint(scaled) / 100.0
+    # rint(x*100) can only pick a different integer than round() when x*100
+    # lands within float error of a .5 boundary, redo those few with python
+    with np.errstate(invalid='ignore'):
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-7
+    for i in np.flatnonzero(near_tie):
+        out.flat[i] = round(float(values.flat[i]), 2)
+    return out
+
+def _bmi_array(weights_kg, heights_cm):
+    # None becomes NaN here, so missing inputs land in no_bmi with the non-finite ones
+    w = np.asarray(weights_kg, dtype=np.float64); h = np.asarray(heights_cm, dtype=np.float64)
+    h_m = h / 100.0; denom = h_m * h_m
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        raw = w / denom
+        no_bmi = (denom == 0) | ~np.isfinite(w) | ~np.isfinite(h) | ~np.isfinite(raw)
+        bmi = _round2(np.where(no_bmi, 0.0, raw))
+    bmi[no_bmi] = np.nan
+    return bmi, no_bmi
+
+def _category_codes_array(bmi):
+    bmi = np.asarray(bmi, dtype=np.float64)
+    codes = np.full(bmi.shape, UNKNOWN_CODE, dtype=np.int8)
+    # walk the table backwards so the first matching bucket wins, like bmi_category()
+    with np.errstate(invalid='ignore'):
+        for code in range(len(BMI_CATEGORIES) - 1, -1, -1):
+            low, high, _ = BMI_CATEGORIES[code]
+            codes[(bmi >= low) & (bmi <= high)] = code
+    return codes
+
+def _lookup_tables():
+    water = [WATER_LITERS_BY_CATEGORY.get(label, DEFAULT_WATER_LITERS) for label in CATEGORY_LABELS] + [DEFAULT_WATER_LITERS]
+    steps = [STEP_GOAL_BY_CATEGORY.get(label, DEFAULT_STEP_GOAL) for label in CATEGORY_LABELS] + [DEFAULT_STEP_GOAL]
+    return water, steps   # index -1 (UNKNOWN_CODE) hits the trailing default
+
+def _code_of(bmi):
+    for code, (low, high, _) in enumerate(BMI_CATEGORIES):
+        if bmi >= low and bmi <= high:
+            return code
+    return UNKNOWN_CODE
+
+def calculate_bmi_batch(weights_kg, heights_cm):
+    """Vectorized calculate_bmi(); NaN where the scalar version returns None."""
+    if _have_numpy():
+        return _bmi_array(weights_kg, heights_cm)[0]
+    out = []
+    for w, h in zip(weights_kg, heights_cm):
+        bmi = calculate_bmi(w, h)
+        out.append(math.nan if bmi is None else bmi)
+    return out
+
+def bmi_category_codes(bmis):
+    """Category code per BMI (index into CATEGORY_LABELS, UNKNOWN_CODE otherwise)."""
+    if _have_numpy():
+        return _category_codes_array(bmis)
+    return [_code_of(b) for b in bmis]
+
+def category_labels(codes):
+    """Turn category codes back into the labels bmi_category() returns."""
+    return [CATEGORY_LABELS[c] if c != UNKNOWN_CODE else "Unknown" for c in codes]
+
+def recommend_batch(weights_kg, heights_cm):
+    """BMI, category codes and both goals for many profiles in one pass.
+
+    Returns a dict of equally long columns: bmi, category, water_l, step_goal.
+    """
+    water_table, steps_table = _lookup_tables()
+    if _have_numpy():
+        bmi, no_bmi = _bmi_array(weights_kg, heights_cm)
+        codes = _category_codes_array(bmi)
+        water = np.asarray(water_table, dtype=np.float64)[codes]
+        steps = np.asarray(steps_table, dtype=np.int64)[codes]
+        water[no_bmi] = NO_BMI_WATER_LITERS; steps[no_bmi] = NO_BMI_STEP_GOAL
+        return {'bmi': bmi, 'category': codes, 'water_l': water, 'step_goal': steps}
+
+    out = {'bmi': [], 'category': [], 'water_l': [], 'step_goal': []}
+    for w, h in zip(weights_kg, heights_cm):
+        bmi = calculate_bmi(w, h)
+        if bmi is None:
+            out['bmi'].append(math.nan); out['category'].append(UNKNOWN_CODE)
+            out['water_l'].append(NO_BMI_WATER_LITERS); out['step_goal'].append(NO_BMI_STEP_GOAL)
+            continue
+        code = _code_of(bmi)
+        out['bmi'].append(bmi); out['category'].append(code)
+        out['water_l'].append(water_table[code]); out['step_goal'].append(steps_table[code])
+    return out
@@ -0,0 +1,110 @@
+"""Keep several profiles.db folders open at once, and query them together.
+
+WorkerPool holds a DbWorker per database, least recently used first out, so
+switching back to a recent folder skips reconnecting and the schema check.
+CombinedView ATTACHes several databases read-only to one connection and
+exposes UNION ALL views over them, tagged with the source folder.
+"""
+import collections
+import os
+import pathlib
+import sqlite3
+
+import health_db
+from health_worker import DbWorker
+
+POOL_SIZE = 4
+
+class WorkerPool:
+    def __init__(self, capacity=POOL_SIZE, factory=DbWorker):
+        self.capacity = max(1, capacity); self.factory = factory
+        self._workers = collections.OrderedDict()   # db path -> worker, most recent last
+
+    def get(self, db_path):
+        """(worker, reused) for db_path; opens it and evicts the least recently used if full."""
+        key = os.path.abspath(db_path)
+        worker = self._workers.pop(key, None)
+        reused = worker is not None
+        if worker is None:
+            worker = self.factory(key)
+            while len(self._workers) >= self.capacity:
+                _, old = self._workers.popitem(last=False); old.close()
+        self._workers[key] = worker
+        return worker, reused
+
+    def recent(self):
+        """Open database paths, most recently used first."""
+        return list(reversed(self._workers))
+
+    def discard(self, db_path):
+        worker = self._workers.pop(os.path.abspath(db_path), None)
+        if worker is not None: worker.close()
+
+    def close_all(self, wait=True, timeout=5.0):
+        workers = list(self._workers.values()); self._workers.clear()
+        for w in workers: w.close()
+        if wait:
+            for w in workers: w.close(wait=True, timeout=timeout)
+
+    def __len__(self): return len(self._workers)
+
+# combined (ATTACH) view
+
+# view name -> (source table, columns)
+COMBINED_TABLES = {
+    'all_profiles': ('profiles', 'id, name, height_cm, weight_kg, bmi, category, water_l, step_goal, created_at'),
+    'all_steps': ('steps', 'profile_id, date, steps'),
+    'all_water_logs': ('water_logs', 'profile_id, date, ml'),
+    'all_log_totals': ('log_totals', 'profile_id, kind, n, n_values, total'),
+}
+
+class CombinedViewError(Exception):
+    """A source database can't be combined (its schema is older than this version's)."""
+
+class CombinedView:
+    """Read-only connection over several databases; every view row starts with `source`,
+    the index into self.sources."""
+    def __init__(self, db_paths):
+        self.sources = [os.path.abspath(p) for p in db_paths]
+        missing = [p for p in self.sources if not os.path.exists(p)]
+        if missing: raise FileNotFoundError(f"no database at {missing[0]}")
+        self.conn = sqlite3.connect(':memory:', uri=True, cached_statements=health_db.CACHED_STATEMENTS)
+        limit = self.conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(self.conn, 'getlimit') else 10
+        if len(self.sources) > limit:
+            self.conn.close(); raise ValueError(f"SQLite can attach at most {limit} databases at once")
+        for i, path in enumerate(self.sources):
+            self.conn.execute(f"ATTACH DATABASE ? AS src{i};", (f"{pathlib.Path(path).resolve().as_uri()}?mode=ro",))
+        # sources are read-only here, so one that was never opened by this version lacks the
+        # newer tables (log_totals) the views read; say so instead of "no such table"
+        for i, path in enumerate(self.sources):
+            version = self.conn.execute(f"PRAGMA src{i}.user_version;").fetchone()[0]
+            if version < health_db.SCHEMA_VERSION:
+                self.conn.close()
+                raise CombinedViewError(f"{os.path.dirname(path)} has an older database (schema {version}, this version "
+                                        f"uses {health_db.SCHEMA_VERSION}); open that folder once to upgrade it, then retry")
+        for view, (table, cols) in COMBINED_TABLES.items():
+            union = " UNION ALL ".join(f"SELECT {i} AS source, {cols} FROM src{i}.{table}" for i in range(len(self.sources)))
+            self.conn.execute(f"CREATE TEMP VIEW {view} AS {union};")
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def folder(self, source):
+        return os.path.dirname(self.sources[source])
+
+    def profile_summary(self):
+        """[(folder, profile id, name, category, step goal, avg steps, water goal ml, avg water)] over all sources."""
+        rows = self.conn.execute("""
+            SELECT p.source, p.id, p.name, p.category, p.step_goal, s.total * 1.0 / nullif(s.n_values, 0),
+                   p.water_l * 1000, w.total * 1.0 / nullif(w.n_values, 0)
+            FROM all_profiles p
+            LEFT JOIN all_log_totals s ON s.source = p.source AND s.profile_id = p.id AND s.kind = 'steps'
+            LEFT JOIN all_log_totals w ON w.source = p.source AND w.profile_id = p.id AND w.kind = 'water'
+            ORDER BY p.source, p.name;""").fetchall()
+        return [(self.folder(r[0]),) + tuple(r[1:]) for r in rows]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
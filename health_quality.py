@@ -0,0 +1,147 @@
+"""Data-quality scan of the steps / water logs (no GUI imports).
+
+Each profile's live rows are walked in date order, a batch at a time, and
+flagged into health_db's log_flags table:
+
+    range     outside LIMITS (negative, or more than anyone logs in a day)
+    outlier   more than OUTLIER_Z robust standard deviations from the median of
+              the previous WINDOW logged days (1.4826 * MAD, floored so a very
+              steady history doesn't flag ordinary days); needs MIN_HISTORY days
+    repeat    the same non-zero count REPEAT_RUN or more days running, the usual
+              trace of an import that copied one row over a date range
+    gap       the first day after more than GAP_DAYS days without a log
+
+Scans are incremental. scan_state keeps, per kind, the sync_rows seq
+(health_db._m005_sync_log) the last pass reached. The next pass reads the
+changes after it and rescans each touched profile from its earliest changed
+day, taking enough earlier rows for the window. A pass can stop after
+`budget` rows; it records the profile to resume from and carries on on the
+next call. Archived history isn't scanned.
+"""
+import bisect
+import collections
+
+import health_db
+
+LIMITS = {'steps': (0, 100000), 'water': (0, 10000)}   # plausible per-day range, ml for water
+WINDOW = 28
+MIN_HISTORY = 7
+OUTLIER_Z = 3.5
+MIN_SCALE = 0.1    # the robust scale is at least this share of the median
+REPEAT_RUN = 3
+REPEAT_KINDS = ('steps',)   # people do drink the same 2000 ml every day
+GAP_DAYS = 14
+FETCH_ROWS = 5000
+REASONS = {'range': "impossible value", 'outlier': "outlier", 'repeat': "repeated value", 'gap': "gap before"}
+
+def _flags_for(kind, rows, emit_from):
+    """Yield (date, reason, value, detail) for (date, day number, value) rows in date order.
+
+    Rows dated before emit_from only fill the window.
+    """
+    lo, hi = LIMITS[kind]
+    window = collections.deque(); ordered = []
+    prev_day = prev_value = None; run = 1
+    for day, jd, value in rows:
+        emit = emit_from is None or day >= emit_from
+        if prev_day is not None and jd - prev_day > GAP_DAYS and emit:
+            yield day, 'gap', value, f"{jd - prev_day - 1} days without a log"
+        if value < lo or value > hi:
+            if emit: yield day, 'range', value, f"outside {lo:,}..{hi:,}"
+            prev_day = jd; prev_value = None; run = 1
+            continue
+        if len(ordered) >= MIN_HISTORY:
+            n = len(ordered); med = (ordered[(n - 1) // 2] + ordered[n // 2]) / 2
+            devs = sorted(abs(v - med) for v in ordered); mad = (devs[(n - 1) // 2] + devs[n // 2]) / 2
+            z = (value - med) / max(1.4826 * mad, MIN_SCALE * abs(med), 1.0)
+            if abs(z) > OUTLIER_Z and emit: yield day, 'outlier', value, f"median {med:,.0f}, robust z {z:+.1f}"
+        run = run + 1 if value and value == prev_value and jd == prev_day + 1 else 1
+        if run >= REPEAT_RUN and kind in REPEAT_KINDS and emit:
+            yield day, 'repeat', value, f"same value {run} days running"
+        window.append(value); bisect.insort(ordered, value)
+        if len(window) > WINDOW: del ordered[bisect.bisect_left(ordered, window.popleft())]
+        prev_day = jd; prev_value = value
+
+def scan_profile(conn, kind, profile_id, start=None):
+    """Re-flag one profile's rows dated `start` or later (all with None); returns (rows read, flags written).
+
+    Doesn't commit.
+    """
+    table, col = health_db.LOG_TABLES[kind]
+    ctx = ''
+    if start is None:
+        conn.execute("DELETE FROM log_flags WHERE profile_id=? AND kind=?;", (profile_id, kind))
+    else:
+        conn.execute("DELETE FROM log_flags WHERE profile_id=? AND kind=? AND date >= ?;", (profile_id, kind, start))
+        # enough earlier rows to fill the window (range-flagged ones don't count towards it)
+        row = conn.execute(f"SELECT date FROM {table} WHERE profile_id=? AND date < ? AND {col} IS NOT NULL "
+                           f"ORDER BY date DESC LIMIT 1 OFFSET ?;", (profile_id, start, 2 * WINDOW - 1)).fetchone()
+        ctx = row[0] if row else ''
+    cur = conn.execute(f"SELECT date, CAST(julianday(date) AS INTEGER), {col} FROM {table} WHERE profile_id=? AND date >= ? "
+                       f"AND {col} IS NOT NULL AND date = date(julianday(date)) ORDER BY date;", (profile_id, ctx))
+    read = [0]
+    def rows():
+        while True:
+            batch = cur.fetchmany(FETCH_ROWS)
+            if not batch: return
+            read[0] += len(batch); yield from batch
+    flags = [(profile_id, kind, day, reason, value, detail) for day, reason, value, detail in _flags_for(kind, rows(), start)]
+    conn.executemany("INSERT OR REPLACE INTO log_flags (profile_id, kind, date, reason, value, detail) VALUES (?, ?, ?, ?, ?, ?);", flags)
+    return read[0], len(flags)
+
+def _touched(conn, kind, since, target, after):
+    """[(profile id, earliest changed day or None for everything)] past `after`, by id."""
+    if since == 0:
+        return [(pid, None) for (pid,) in conn.execute("SELECT id FROM profiles WHERE id >= ? ORDER BY id;", (after,))]
+    # +r.kind keeps the planner on the seq index
+    return conn.execute("SELECT p.id, min(r.day) FROM sync_rows r JOIN profiles p ON p.name = r.name "
+                        "WHERE r.seq > ? AND r.seq <= ? AND +r.kind = ? AND p.id >= ? GROUP BY p.id ORDER BY p.id;",
+                        (since, target, kind, after)).fetchall()
+
+def scan(conn, full=False, budget=None):
+    """Flag what changed since the last scan (everything with full=True); commits.
+
+    Returns {'rows': n, 'flags': n, 'profiles': [ids rescanned], 'since': earliest day
+    rescanned (None when a profile was rescanned whole), 'more': bool}. With a row
+    budget the pass may stop early ('more'); call again to finish it.
+    """
+    out = {'rows': 0, 'flags': 0, 'profiles': [], 'since': None, 'more': False}
+    touched_ids = set(); starts = []
+    with conn:
+        target_now = conn.execute("SELECT coalesce(max(seq), 0) FROM sync_rows;").fetchone()[0]
+        for kind in health_db.LOG_TABLES:
+            row = conn.execute("SELECT seq, target, next_profile FROM scan_state WHERE kind=?;", (kind,)).fetchone()
+            since, target, after = row or (0, None, None)
+            if full: since, target, after = 0, None, None
+            if target is None:
+                target, after = target_now, 0
+                if target <= since and not full: continue
+            for pid, start in _touched(conn, kind, since, target, after):
+                if budget is not None and out['rows'] >= budget:
+                    conn.execute("INSERT OR REPLACE INTO scan_state (kind, seq, target, next_profile) VALUES (?, ?, ?, ?);",
+                                 (kind, since, target, pid))
+                    out['more'] = True
+                    break
+                n, flagged = scan_profile(conn, kind, pid, start)
+                out['rows'] += n; out['flags'] += flagged; touched_ids.add(pid); starts.append(start)
+            else:
+                conn.execute("INSERT OR REPLACE INTO scan_state (kind, seq, target, next_profile) VALUES (?, ?, NULL, NULL);", (kind, target))
+    out['profiles'] = sorted(touched_ids)
+    if starts and None not in starts: out['since'] = min(starts)
+    return out
+
+# reading
+
+def flag_rows(conn, profile_id, kind=None, limit=500):
+    """[(kind, date, reason, value, detail)] newest first."""
+    sql = "SELECT kind, date, reason, value, detail FROM log_flags WHERE profile_id=?"
+    params = [profile_id]
+    if kind: sql += " AND kind=?"; params.append(kind)
+    return conn.execute(sql + " ORDER BY date DESC, kind, reason LIMIT ?;", params + [limit]).fetchall()
+
+def flag_counts(conn, profile_id=None):
+    """{(kind, reason): flagged days}, for one profile or all."""
+    where = "" if profile_id is None else " WHERE profile_id=?"
+    rows = conn.execute(f"SELECT kind, reason, count(*) FROM log_flags{where} GROUP BY kind, reason;",
+                        () if profile_id is None else (profile_id,))
+    return {(kind, reason): n for kind, reason, n in rows}
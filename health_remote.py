@@ -0,0 +1,112 @@
+"""Client for health_server: a DbWorker whose requests run on the server instead of a local file.
+
+RemoteWorker keeps DbWorker's interface, with channels, staleness, attach and
+detach. The app can therefore submit the same health_db / health_insights
+functions whether it opened a folder or a server URL. Each thread keeps one
+keep-alive HTTP connection. Writes stay on one thread, so a client's own
+saves reach the server in order. Only the functions in health_server.CALLS can
+run remotely.
+"""
+import http.client
+import json
+import time
+from datetime import date, datetime
+from urllib.parse import urlsplit
+
+from health_worker import DbWorker, _STOP
+
+DEFAULT_PORT = 8765   # health_server's default
+TIMEOUT = 30.0
+
+class RemoteError(Exception):
+    """The server answered with an error (or could not be reached)."""
+
+def _encode(o):
+    if isinstance(o, (date, datetime)): return o.isoformat()
+    if hasattr(o, 'tolist'): return o.tolist()
+    raise TypeError(f"{type(o).__name__} can't be sent to the server")
+
+def _series(result):
+    import numpy as np
+    return np.asarray(result[0], dtype=np.float64), np.asarray(result[1], dtype=np.float64)
+
+def _year(result):
+    import numpy as np
+    return dict(result, values=np.asarray(result['values'], dtype=np.float64), goals=np.asarray(result['goals'], dtype=np.float64),
+                inside=np.asarray(result['inside'], dtype=bool))
+
+# results JSON can't carry as-is
+DECODERS = {'health_charts.load_series': _series, 'health_charts.year_matrix': _year}
+
+class RemoteConnection:
+    """One keep-alive connection to the server; reconnects once if the server dropped it."""
+    def __init__(self, url, token=None, timeout=TIMEOUT):
+        parts = urlsplit(url if '://' in url else f"http://{url}")
+        if parts.scheme not in ('http', 'https'): raise RemoteError(f"unsupported server URL {url!r}")
+        self._cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host = parts.hostname or '127.0.0.1'; self.port = parts.port; self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout; self.token = token; self._conn = None
+
+    def request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body, default=_encode).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.token: headers['Authorization'] = f"Bearer {self.token}"
+        while True:
+            fresh = self._conn is None
+            if fresh: self._conn = self._cls(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request(method, self.prefix + path, body=data, headers=headers)
+                resp = self._conn.getresponse(); raw = resp.read()
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                self.close()
+                # only a reused keep-alive connection the server closed gets a second try
+                if fresh: raise RemoteError(f"server unreachable: {e}") from None
+        try: payload = json.loads(raw) if raw else None
+        except ValueError: raise RemoteError(f"bad response from server (HTTP {resp.status})") from None
+        if resp.status >= 400: raise RemoteError((payload or {}).get('error') or f"HTTP {resp.status}")
+        return payload
+
+    def call(self, name, args=(), kwargs=None):
+        result = self.request('POST', f"/call/{name}", {'args': list(args), 'kwargs': kwargs or {}})['result']
+        decode = DECODERS.get(name)
+        return decode(result) if decode and result is not None else result
+
+    def close(self):
+        if self._conn is not None: self._conn.close(); self._conn = None
+
+class RemoteWorker(DbWorker):
+    def __init__(self, url, readers=2, token=None):
+        self.url = url; self.token = token
+        super().__init__(url, readers=readers)
+
+    def _call(self, conn, req):
+        return conn.call(f"{req.fn.__module__}.{req.fn.__name__}", req.args, req.kwargs)
+
+    def _run_writer(self):
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = RemoteConnection(self.url, self.token); health = conn.request('GET', '/health')
+        except RemoteError as e:
+            if conn is not None: conn.close()
+            self._init_error = e; self._ready.set()
+            self._fail_queue(self._writes, e); return
+        self.connect_seconds = time.perf_counter() - started; self.server_schema = health.get('schema')
+        self._ready.set()
+        self._serve(conn, self._writes)
+
+    def _run_reader(self):
+        self._ready.wait()
+        if self._init_error is not None:
+            self._fail_queue(self._reads, self._init_error); return
+        self._serve(RemoteConnection(self.url, self.token), self._reads)
+
+    def _serve(self, conn, q):
+        try:
+            while True:
+                req = q.get()
+                if req is _STOP: break
+                self._execute(conn, req)
+        finally:
+            conn.close()
@@ -0,0 +1,355 @@
+"""Local sync server: one process owns profiles.db and clients talk JSON over HTTP.
+
+Run it next to the data folder and point the app at it with --server:
+
+    python health_server.py path/to/folder --port 8765
+    python "health_metric_app final.py" --server http://host:8765
+
+asyncio handles the sockets; SQLite work happens on threads. All writes go
+through one queue to a single writer connection. Whatever is queued when the
+writer frees up is taken as one batch, and runs of log upserts in a batch share
+one transaction (50 people saving at 9am cost a handful of commits, not 50).
+Reads run on a small pool of WAL reader connections. Identical reads that
+arrive while the same read is already running share its result, as long as no
+write has been committed in between.
+
+Endpoints (JSON bodies and responses, errors as {"error": message}):
+
+    GET    /health                          server and schema version
+    GET    /stats                           request / batching counters
+    GET    /profiles                        [[id, name], ...]
+    POST   /profiles                        {"name", "height_cm", "weight_kg"} -> {"id"}
+    GET    /profiles/<id>                   profile row
+    PUT    /profiles/<id>                   {"height_cm", "weight_kg"} (BMI and goals recomputed)
+    DELETE /profiles/<id>
+    GET    /profiles/<id>/<steps|water>     ?before=&after=&limit= one history page, newest first
+    POST   /logs                            {"kind", "rows": [[profile_id, "YYYY-MM-DD", value], ...]}
+    POST   /call/<module.function>          {"args", "kwargs"} -> {"result"}, for the functions in CALLS
+    POST   /batch                           {"calls": [{"fn", "args", "kwargs"}, ...]} -> {"results"}
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from urllib.parse import parse_qs, urlsplit
+
+import health_analytics
+import health_db
+import health_metrics
+
+DEFAULT_PORT = 8765
+READERS = 4
+MAX_BATCH = 256      # write requests taken per writer turn
+MAX_BODY = 16 << 20
+MAX_LOG_ROWS = 100000
+
+# module.function -> runs on the writer. What /call and /batch (and so the app's
+# RemoteWorker) may run; everything takes the connection as its first argument.
+CALLS = {
+    'health_db.list_profiles': False,
+    'health_db.get_profile': False,
+    'health_db.log_page': False,
+    'health_db.log_stats': False,
+    'health_db.measurements': False,
+    'health_db.insights_data': False,
+    'health_insights.insights_bundle': False,
+    'health_cohort.cohort_rows': False,
+    'health_charts.load_series': False,
+    'health_analytics.calendar_month': False,
+    'health_charts.year_matrix': False,
+    'health_quality.flag_rows': False,
+    'health_quality.flag_counts': False,
+    'health_db.create_profile': True,
+    'health_db.update_profile': True,
+    'health_db.recalculate_profile': True,
+    'health_db.delete_profile': True,
+    'health_db.upsert_log': True,
+    'health_db.upsert_logs': True,
+    'health_intraday.add_event': True,
+    'health_quality.scan': True,
+}
+_LOG_WRITES = ('health_db.upsert_log', 'health_db.upsert_logs')
+
+def _forget_analytics(batch):
+    """Invalidate the analytics a write batch may have changed: log upserts by profile,
+    kind and earliest day (so streak state before it survives), anything else clears."""
+    try:
+        first = {}
+        for name, _, args, kwargs, _ in batch:
+            if name not in _LOG_WRITES or kwargs: raise ValueError(name)
+            kind, rows = (args[0], [args[1:]]) if name == 'health_db.upsert_log' else args
+            for pid, day, _ in rows:
+                key = (pid, kind)
+                if key not in first or str(day) < first[key]: first[key] = str(day)
+    except (ValueError, TypeError):
+        health_analytics.CACHE.clear(); return
+    for (pid, kind), day in first.items(): health_analytics.CACHE.invalidate(pid, kind, since=day)
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message); self.status = status
+
+def _jsonable(o):
+    if hasattr(o, 'tolist'): return o.tolist()   # numpy arrays and scalars
+    if isinstance(o, (date, datetime)): return o.isoformat()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+def _resolve(name):
+    if name not in CALLS: raise HttpError(404, f"unknown function {name!r}")
+    module, fn = name.rsplit('.', 1)
+    return getattr(importlib.import_module(module), fn)
+
+def _log_rows(kind, rows):
+    if kind not in health_db.LOG_TABLES: raise HttpError(400, f"kind must be one of {sorted(health_db.LOG_TABLES)}")
+    if not isinstance(rows, list) or len(rows) > MAX_LOG_ROWS: raise HttpError(400, f"rows must be a list of at most {MAX_LOG_ROWS}")
+    out = []
+    for i, row in enumerate(rows):
+        try:
+            pid, day, value = row
+            if not (isinstance(pid, int) and isinstance(value, int) and value >= 0): raise ValueError
+            day = date.fromisoformat(day).isoformat()
+        except (TypeError, ValueError):
+            raise HttpError(400, f"row {i}: expected [profile_id, \"YYYY-MM-DD\", non-negative int], got {row!r}") from None
+        out.append((pid, day, value))
+    return out
+
+class HealthServer:
+    def __init__(self, db_path, readers=READERS, token=None, storage=None):
+        self.db_path = db_path; self.token = token; self.storage = storage
+        self._write_exec = ThreadPoolExecutor(1, thread_name_prefix='server-writer')
+        self._read_exec = ThreadPoolExecutor(readers, thread_name_prefix='server-reader')
+        self._local = threading.local(); self._read_conns = []; self._conns_lock = threading.Lock()
+        self._writer_conn = None; self._writes = None; self._inflight = {}
+        self.write_generation = 0   # bumped after every committed batch, keeps coalesced reads fresh
+        self.stats = {'requests': 0, 'reads': 0, 'coalesced_reads': 0, 'writes': 0, 'write_batches': 0, 'log_rows': 0, 'errors': 0}
+        self.started = time.time()
+
+    # connections (threads)
+    def _open_writer(self):
+        self._writer_conn = health_db.connect(self.db_path, storage=self.storage)
+
+    def _reader_conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=health_db.CACHED_STATEMENTS, check_same_thread=False)
+            health_db.apply_storage_profile(conn, self.storage or health_db.DEFAULT_STORAGE)
+            self._local.conn = conn
+            with self._conns_lock: self._read_conns.append(conn)
+        return conn
+
+    def _run_read(self, fn, args, kwargs):
+        return fn(self._reader_conn(), *args, **kwargs)
+
+    def _run_one(self, conn, fn, args, kwargs):
+        try:
+            value = fn(conn, *args, **kwargs)
+            if conn.in_transaction: conn.commit()   # upsert_logs and friends leave committing to the caller
+            return True, value
+        except Exception as e:
+            try: conn.rollback()
+            except sqlite3.Error: pass
+            return False, e
+
+    @staticmethod
+    def _log_write(conn, name, args, kwargs):
+        # upsert_log commits on its own; inside a group it becomes a one-row upsert_logs
+        if name == 'health_db.upsert_log':
+            kind, pid, day, value = args; health_db.upsert_logs(conn, kind, [(pid, day, value)]); return None
+        return health_db.upsert_logs(conn, *args, **kwargs)
+
+    def _run_writes(self, batch):
+        """[(ok, value)] for one writer turn; consecutive log upserts share a transaction."""
+        conn = self._writer_conn; out = []; i = 0
+        while i < len(batch):
+            j = i
+            while j < len(batch) and batch[j][0] in _LOG_WRITES: j += 1
+            if j - i > 1:
+                group = batch[i:j]
+                try:
+                    with conn:
+                        results = [self._log_write(conn, name, args, kwargs) for name, _, args, kwargs, _ in group]
+                    out += [(True, r) for r in results]; i = j; continue
+                except Exception:
+                    pass   # rolled back; run them one by one so only the bad request fails
+            end = max(j, i + 1)
+            for _, fn, args, kwargs, _ in batch[i:end]: out.append(self._run_one(conn, fn, args, kwargs))
+            i = end
+        return out
+
+    # async side
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._writes.get()
+            if item is None: break
+            batch = [item]
+            while len(batch) < MAX_BATCH:
+                try: nxt = self._writes.get_nowait()
+                except asyncio.QueueEmpty: break
+                if nxt is None: self._writes.put_nowait(None); break
+                batch.append(nxt)
+            results = await loop.run_in_executor(self._write_exec, self._run_writes, batch)
+            _forget_analytics(batch)   # readers compute Insights through health_analytics.CACHE
+            self.write_generation += 1; self.stats['write_batches'] += 1; self.stats['writes'] += len(batch)
+            for (_, _, _, _, fut), (ok, value) in zip(batch, results):
+                if fut.done(): continue
+                if ok: fut.set_result(value)
+                else: fut.set_exception(value)
+
+    async def call(self, name, args=(), kwargs=None):
+        fn = _resolve(name); kwargs = kwargs or {}
+        if CALLS[name]:
+            fut = asyncio.get_running_loop().create_future()
+            await self._writes.put((name, fn, tuple(args), kwargs, fut))
+            return await fut
+        self.stats['reads'] += 1
+        key = (name, json.dumps([args, kwargs], sort_keys=True, default=str), self.write_generation)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats['coalesced_reads'] += 1
+        else:
+            task = asyncio.ensure_future(asyncio.get_running_loop().run_in_executor(self._read_exec, self._run_read, fn, args, kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _route(self, method, path, query, body):
+        parts = [p for p in path.split('/') if p]
+        if method == 'GET' and parts == ['health']:
+            return {'ok': True, 'schema': health_db.SCHEMA_VERSION, 'uptime_s': round(time.time() - self.started, 1)}
+        if method == 'GET' and parts == ['stats']:
+            return dict(self.stats, inflight_reads=len(self._inflight), queued_writes=self._writes.qsize())
+        if method == 'POST' and len(parts) == 2 and parts[0] == 'call':
+            return {'result': await self.call(parts[1], body.get('args', []), body.get('kwargs'))}
+        if method == 'POST' and parts == ['batch']:
+            calls = body.get('calls')
+            if not isinstance(calls, list): raise HttpError(400, "calls must be a list")
+            results = await asyncio.gather(*(self.call(c.get('fn'), c.get('args', []), c.get('kwargs')) for c in calls), return_exceptions=True)
+            return {'results': [{'error': str(r)} if isinstance(r, BaseException) else {'result': r} for r in results]}
+        if method == 'POST' and parts == ['logs']:
+            rows = _log_rows(body.get('kind'), body.get('rows'))
+            self.stats['log_rows'] += len(rows)
+            return {'rows': await self.call('health_db.upsert_logs', [body['kind'], rows])}
+        if parts[:1] != ['profiles'] or len(parts) > 3: raise HttpError(404, f"no route for {method} {path}")
+        if len(parts) == 1:
+            if method == 'GET': return await self.call('health_db.list_profiles')
+            if method == 'POST':
+                name = str(body.get('name') or '').strip()
+                if not name: raise HttpError(400, "name is required")
+                h, w = self._body_metrics(body)
+                pid = await self.call('health_db.create_profile', [name, h, w, *health_metrics.profile_metrics(w, h), datetime.now().isoformat()])
+                return {'id': pid}
+        try: pid = int(parts[1])
+        except ValueError: raise HttpError(404, f"bad profile id {parts[1]!r}") from None
+        if len(parts) == 3:
+            if method != 'GET' or parts[2] not in health_db.LOG_TABLES: raise HttpError(404, f"no route for {method} {path}")
+            kw = {k: v[0] for k, v in query.items() if k in ('before', 'after')}
+            if 'limit' in query: kw['limit'] = min(int(query['limit'][0]), 5000)
+            return await self.call('health_db.log_page', [pid, parts[2]], kw)
+        if method == 'GET':
+            row = await self.call('health_db.get_profile', [pid])
+            if row is None: raise HttpError(404, f"no profile {pid}")
+            return row
+        if method == 'PUT':
+            h, w = self._body_metrics(body)
+            await self.call('health_db.update_profile', [pid, h, w, *health_metrics.profile_metrics(w, h)])
+            return {'id': pid}
+        if method == 'DELETE':
+            await self.call('health_db.delete_profile', [pid]); return {'id': pid}
+        raise HttpError(405, f"{method} not allowed on {path}")
+
+    @staticmethod
+    def _body_metrics(body):
+        try: return float(body['height_cm']), float(body['weight_kg'])
+        except (KeyError, TypeError, ValueError): raise HttpError(400, "height_cm and weight_kg must be numbers") from None
+
+    # HTTP/1.1 with keep-alive, just enough for JSON clients
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                try: method, target, version = line.decode('latin-1').split()
+                except ValueError: break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b'\r\n', b'\n', b''): break
+                    k, _, v = h.decode('latin-1').partition(':'); headers[k.strip().lower()] = v.strip()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                status, payload = await self._respond(method, target, headers, reader)
+                data = json.dumps(payload, default=_jsonable).encode()
+                writer.write(f"{version} {status} {'OK' if status < 400 else 'Error'}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive: break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method, target, headers, reader):
+        self.stats['requests'] += 1
+        try:
+            length = int(headers.get('content-length') or 0)
+            if length > MAX_BODY: raise HttpError(413, "request body too large")
+            raw = await reader.readexactly(length) if length else b''
+            if self.token and headers.get('authorization') != f"Bearer {self.token}": raise HttpError(401, "missing or wrong token")
+            try: body = json.loads(raw) if raw else {}
+            except ValueError: raise HttpError(400, "body is not valid JSON") from None
+            if not isinstance(body, dict): raise HttpError(400, "body must be a JSON object")
+            url = urlsplit(target)
+            return 200, await self._route(method, url.path, parse_qs(url.query), body)
+        except HttpError as e:
+            self.stats['errors'] += 1; return e.status, {'error': str(e)}
+        except asyncio.IncompleteReadError:
+            raise
+        except Exception as e:
+            self.stats['errors'] += 1; return 500, {'error': f"{type(e).__name__}: {e}"}
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT, ready=None):
+        """Run until cancelled; `ready` (a threading.Event) is set once the socket is listening."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._write_exec, self._open_writer)   # schema / migrations before anyone reads
+        self._writes = asyncio.Queue()
+        writer_task = asyncio.ensure_future(self._writer_loop())
+        server = await asyncio.start_server(self._handle, host, port)
+        self.address = server.sockets[0].getsockname()[:2]
+        if ready is not None: ready.set()
+        try:
+            async with server: await server.serve_forever()
+        finally:
+            await self._writes.put(None); await writer_task
+            await loop.run_in_executor(self._write_exec, self._close_writer)
+            self._read_exec.shutdown(wait=True); self._write_exec.shutdown(wait=True)
+            for conn in self._read_conns: conn.close()
+
+    def _close_writer(self):
+        try: self._writer_conn.execute("PRAGMA optimize;")
+        except sqlite3.Error: pass
+        self._writer_conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a profiles.db to Health Metric Calculator clients over HTTP/JSON")
+    parser.add_argument('db', help="path to profiles.db (or the folder containing it)")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to listen on (0.0.0.0 for the whole network)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--readers', type=int, default=READERS, help="read connections")
+    parser.add_argument('--token', default=os.environ.get('HEALTH_SERVER_TOKEN'), help="require 'Authorization: Bearer TOKEN'")
+    args = parser.parse_args(argv)
+    path = os.path.join(args.db, health_db.DB_FILENAME) if os.path.isdir(args.db) else args.db
+    server = HealthServer(path, readers=max(1, args.readers), token=args.token)
+    print(f"serving {os.path.abspath(path)} on http://{args.host}:{args.port}", flush=True)
+    try: asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt: pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
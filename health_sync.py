@@ -0,0 +1,125 @@
+"""Delta sync between two copies of profiles.db (say a laptop's and one on a shared drive).
+
+Every write is recorded in sync_rows (see health_db._m005_sync_log) with its UTC
+time and a sequence number. sync_meta remembers, per peer database, the last of
+the peer's sequence numbers already pulled. A pull therefore reads only the
+peer's changes since then, walking its seq index, and a sync is a pull in each
+direction. Conflicts go to the newest write (last writer wins, by mtime). On a
+tie the copy being pulled into keeps its row. Profiles are matched by name,
+because ids differ between copies. Applied rows are recorded with the peer's
+mtime, so they don't bounce back on the next sync; they get a local seq, so they
+travel on to this copy's other peers.
+
+Archived history (health_archive) isn't synced, each copy archives its own.
+"""
+import os
+import time
+import urllib.request
+
+import health_archive
+import health_db
+
+FETCH_ROWS = 5000
+PROFILE_FIELDS = ('height_cm', 'weight_kg', 'bmi', 'category', 'water_l', 'step_goal', 'created_at')
+PROFILE_KIND = "r.kind = 'profile'"
+RECORD_SQL = ("INSERT INTO sync_rows (kind, name, day, mtime, deleted, seq) VALUES (?, ?, ?, ?, ?, ?) "
+              "ON CONFLICT(kind, name, day) DO UPDATE SET mtime=excluded.mtime, deleted=excluded.deleted, seq=excluded.seq;")
+
+class SyncError(Exception):
+    """Raised when two databases can't be synced with each other."""
+
+def db_id(conn, schema='main'):
+    return conn.execute(f"SELECT value FROM {schema}.sync_meta WHERE key = 'db_id';").fetchone()[0]
+
+def _newer(kind_sql):
+    # the peer's change wins unless this copy has one for the same row at least as new;
+    # r.kind is wrapped so the planner walks the seq range instead of every row of the kind
+    return (f"r.seq > ? AND r.seq <= ? AND +{kind_sql} AND NOT EXISTS (SELECT 1 FROM main.sync_rows m "
+            f"WHERE m.kind = r.kind AND m.name = r.name AND m.day = r.day AND m.mtime >= r.mtime)")
+
+def pull(conn, peer_path):
+    """Apply the peer's changes since the last pull to conn in one transaction.
+
+    Returns {'profile': n, 'steps': n, 'water': n, 'skipped': n}; skipped are log
+    rows of a profile this copy doesn't have (it was deleted here more recently).
+    The peer must already have the sync tables (sync() migrates it first).
+    """
+    if not os.path.exists(peer_path): raise FileNotFoundError(f"no database at {peer_path}")
+    conn.execute("ATTACH DATABASE ? AS peer;", (f"file:{urllib.request.pathname2url(os.path.abspath(peer_path))}?mode=ro",))
+    try:
+        peer_id = db_id(conn, 'peer')
+        if peer_id == db_id(conn): raise SyncError("both paths are the same database (or a file copy of it)")
+        mark = f"seen:{peer_id}"
+        row = conn.execute("SELECT value FROM sync_meta WHERE key = ?;", (mark,)).fetchone()
+        since = int(row[0]) if row else 0
+        upto = conn.execute("SELECT coalesce(max(seq), 0) FROM peer.sync_rows;").fetchone()[0]
+        counts = dict.fromkeys(('profile',) + tuple(health_db.LOG_TABLES), 0); counts['skipped'] = 0
+        if upto <= since: return counts
+        with conn:
+            health_db.pause_change_log(conn, 'sync')
+            seq = conn.execute("SELECT coalesce(max(seq), 0) FROM sync_rows;").fetchone()[0]
+            def record(applied):
+                nonlocal seq
+                conn.executemany(RECORD_SQL, (row + (seq + i,) for i, row in enumerate(applied, 1))); seq += len(applied)
+            applied = []; removed = []
+            fields = ', '.join(f"p.{f}" for f in PROFILE_FIELDS)
+            rows = conn.execute(f"SELECT r.name, r.mtime, r.deleted OR p.id IS NULL, {fields} FROM peer.sync_rows r "
+                                f"LEFT JOIN peer.profiles p ON p.name = r.name WHERE {_newer(PROFILE_KIND)} "
+                                f"ORDER BY r.seq;", (since, upto)).fetchall()
+            cols = ', '.join(PROFILE_FIELDS)
+            for name, mtime, deleted, *values in rows:
+                if deleted:
+                    pid = health_db.profile_id_by_name(conn, name)
+                    if pid is not None: health_db.delete_profile_rows(conn.cursor(), pid); removed.append(pid)
+                else:
+                    conn.execute(f"INSERT INTO profiles (name, {cols}) VALUES (?{', ?' * len(PROFILE_FIELDS)}) "
+                                 f"ON CONFLICT(name) DO UPDATE SET {', '.join(f'{f}=excluded.{f}' for f in PROFILE_FIELDS)};",
+                                 (name, *values))
+                applied.append(('profile', name, '', mtime, 1 if deleted else 0))
+            record(applied); counts['profile'] = len(rows)
+            ids = dict(conn.execute("SELECT name, id FROM profiles;"))
+            for kind, (table, col) in health_db.LOG_TABLES.items():
+                cur = conn.execute(f"SELECT r.name, r.day, r.mtime, r.deleted OR l.profile_id IS NULL, l.{col} FROM peer.sync_rows r "
+                                   f"LEFT JOIN peer.profiles p ON p.name = r.name "
+                                   f"LEFT JOIN peer.{table} l ON l.profile_id = p.id AND l.date = r.day "
+                                   f"WHERE {_newer('r.kind = ?')} ORDER BY r.seq;", (since, upto, kind))
+                while True:
+                    batch = cur.fetchmany(FETCH_ROWS)
+                    if not batch: break
+                    upserts = []; deletes = []; applied = []
+                    for name, day, mtime, deleted, value in batch:
+                        pid = ids.get(name)
+                        if deleted:
+                            if pid is not None: deletes.append((pid, day))
+                        elif pid is None: counts['skipped'] += 1; continue
+                        else: upserts.append((pid, day, value))
+                        applied.append((kind, name, day, mtime, 1 if deleted else 0)); counts[kind] += 1
+                    health_db.upsert_logs(conn, kind, upserts)
+                    conn.executemany(f"DELETE FROM {table} WHERE profile_id=? AND date=?;", deletes)
+                    record(applied)
+            conn.execute("INSERT OR REPLACE INTO sync_meta (key, value) VALUES (?, ?);", (mark, str(upto)))
+            health_db.resume_change_log(conn)
+        folder = health_archive.archive_folder(conn)
+        for pid in removed: health_archive.delete_archives(folder, pid)
+        return counts
+    finally:
+        conn.execute("DETACH DATABASE peer;")
+
+def sync(conn, peer_path):
+    """Pull from the peer, then push to it; returns (pulled counts, pushed counts, seconds).
+
+    peer_path is a profiles.db or its folder. The peer is opened (and migrated)
+    with health_db.connect, so it must be a database this machine can write.
+    """
+    started = time.perf_counter()
+    local = health_db.db_file(conn)
+    if not local: raise SyncError("an in-memory database can't be synced")
+    if os.path.isdir(peer_path): peer_path = os.path.join(peer_path, health_db.DB_FILENAME)
+    if not os.path.exists(peer_path): raise FileNotFoundError(f"no database at {peer_path}")
+    peer = health_db.connect(peer_path)   # creates sync_rows there if the peer predates them
+    try:
+        pulled = pull(conn, peer_path)
+        pushed = pull(peer, local)
+    finally:
+        peer.close()
+    return pulled, pushed, time.perf_counter() - started
@@ -0,0 +1,141 @@
+"""Lightweight tracing for the app's hot paths (SQL, theme frames, tree fills, plots).
+
+Spans are recorded into bounded ring buffers: per-name latency samples for
+p50/p95/p99 and a flat event list that exports as Chrome trace JSON (load it
+in chrome://tracing or https://ui.perfetto.dev). While disabled, span() hands
+back one shared no-op context manager, so instrumented code pays one attribute
+check per call.
+
+Enable with HEALTH_TRACE=1, `--trace`, or from the Diagnostics tab.
+"""
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SAMPLES_PER_NAME = 2048    # latency ring buffer per span name
+EVENTS_KEPT = 20000        # chrome trace events ring buffer
+SQL_NAME_CHARS = 90
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered: return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+class _NullSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'start')
+    def __init__(self, tracer, name, cat):
+        self.tracer = tracer; self.name = name; self.cat = cat
+
+    def __enter__(self):
+        self.start = time.perf_counter(); return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.cat, self.start, time.perf_counter() - self.start)
+        return False
+
+class _Stat:
+    __slots__ = ('cat', 'count', 'total', 'max', 'recent')
+    def __init__(self, cat):
+        self.cat = cat; self.count = 0; self.total = 0.0; self.max = 0.0
+        self.recent = collections.deque(maxlen=SAMPLES_PER_NAME)
+
+class Tracer:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}; self._events = collections.deque(maxlen=EVENTS_KEPT)
+
+    def span(self, name, cat='app'):
+        """`with TRACER.span('name', 'cat'):` times the block when tracing is on."""
+        if not self.enabled: return _NULL_SPAN
+        return _Span(self, name, cat)
+
+    def traced(self, name=None, cat='app'):
+        """Decorator form of span()."""
+        def wrap(fn):
+            label = name or fn.__qualname__
+            def wrapper(*args, **kwargs):
+                if not self.enabled: return fn(*args, **kwargs)
+                with _Span(self, label, cat): return fn(*args, **kwargs)
+            wrapper.__name__ = fn.__name__; wrapper.__qualname__ = fn.__qualname__; wrapper.__doc__ = fn.__doc__
+            return wrapper
+        return wrap
+
+    def record(self, name, cat, start, seconds):
+        with self._lock:
+            stat = self._stats.get(name)
+            if stat is None: stat = self._stats[name] = _Stat(cat)
+            stat.count += 1; stat.total += seconds; stat.recent.append(seconds)
+            if seconds > stat.max: stat.max = seconds
+            self._events.append((name, cat, start, seconds, threading.get_ident()))
+
+    # reading / export
+    def stats(self):
+        """{name: {cat, count, total_ms, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}, p* over the recent samples."""
+        with self._lock:
+            snapshot = [(name, s.cat, s.count, s.total, s.max, list(s.recent)) for name, s in self._stats.items()]
+        out = {}
+        for name, cat, count, total, worst, recent in snapshot:
+            out[name] = {'cat': cat, 'count': count, 'total_ms': total * 1000, 'mean_ms': total / count * 1000,
+                         'p50_ms': percentile(recent, 50) * 1000, 'p95_ms': percentile(recent, 95) * 1000,
+                         'p99_ms': percentile(recent, 99) * 1000, 'max_ms': worst * 1000}
+        return out
+
+    def chrome_events(self):
+        with self._lock: events = list(self._events)
+        pid = os.getpid()
+        return [{'name': name, 'cat': cat, 'ph': 'X', 'ts': (start - self._t0) * 1e6, 'dur': seconds * 1e6,
+                 'pid': pid, 'tid': tid} for name, cat, start, seconds, tid in events]
+
+    def export_json(self, path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump({'enabled': self.enabled, 'stats': self.stats()}, fh, indent=2)
+
+    def export_chrome(self, path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump({'traceEvents': self.chrome_events(), 'displayTimeUnit': 'ms'}, fh)
+
+TRACER = Tracer(enabled=os.environ.get('HEALTH_TRACE', '') not in ('', '0'))
+span = TRACER.span
+traced = TRACER.traced
+
+# SQL
+
+_sql_names = {}
+
+def sql_name(sql):
+    """Short, stable span name for a statement (its text with whitespace collapsed)."""
+    label = _sql_names.get(sql)
+    if label is None:
+        label = 'sql: ' + ' '.join(sql.split())[:SQL_NAME_CHARS]
+        if len(_sql_names) < 4096: _sql_names[sql] = label
+    return label
+
+class TracedConnection(sqlite3.Connection):
+    """sqlite3 connection factory that times execute / executemany while tracing is on.
+
+    Times the statement up to its first row; fetches after that are part of the
+    span of whoever issued the query (e.g. the DbWorker request).
+    """
+    def execute(self, sql, *args):
+        if not TRACER.enabled: return super().execute(sql, *args)
+        with _Span(TRACER, sql_name(sql), 'sql'): return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        if not TRACER.enabled: return super().executemany(sql, *args)
+        with _Span(TRACER, sql_name(sql), 'sql'): return super().executemany(sql, *args)
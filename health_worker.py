@@ -0,0 +1,167 @@
+"""Background SQLite executor so the Tk mainloop never waits on the database.
+
+One writer thread owns the connection that runs schema setup and every write;
+a few reader threads hold their own connections (WAL lets them read while the
+writer commits). Results are handed back through a queue that the GUI drains
+with `after`, so callbacks always run on the Tk thread.
+
+Requests can be tagged with a channel: submitting a new request on the same
+channel makes older ones stale, they are skipped if not started yet and their
+results are dropped otherwise (e.g. clicking quickly through the profile list).
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+import health_db
+from health_trace import TRACER, TracedConnection
+
+_STOP = object()
+
+class DbRequest:
+    __slots__ = ('fn', 'args', 'kwargs', 'channel', 'generation', 'epoch', 'on_done', 'on_error', 'cancelled')
+
+    def __init__(self, fn, args, kwargs, channel, generation, epoch, on_done, on_error):
+        self.fn = fn; self.args = args; self.kwargs = kwargs
+        self.channel = channel; self.generation = generation; self.epoch = epoch
+        self.on_done = on_done; self.on_error = on_error; self.cancelled = False
+
+class DbWorker:
+    def __init__(self, db_path, readers=2, storage=None):
+        self.db_path = db_path; self.storage = storage
+        self.on_error = None      # default error callback (runs on the Tk thread)
+        self._writes = queue.Queue(); self._reads = queue.Queue(); self._results = queue.Queue()
+        self._generations = {}; self._lock = threading.Lock()
+        self._epoch = 0; self._ticker = 0   # detach() bumps both: pending callbacks are dropped, polling stops
+        self._ready = threading.Event(); self._init_error = None; self._closed = False
+        self.connect_seconds = None   # time the writer spent opening / migrating the database
+        self._threads = [threading.Thread(target=self._run_writer, name='db-writer', daemon=True)]
+        self._threads += [threading.Thread(target=self._run_reader, name=f'db-reader-{i}', daemon=True) for i in range(readers)]
+        for t in self._threads: t.start()
+
+    # submitting (any thread, normally Tk)
+    def submit(self, fn, *args, channel=None, on_done=None, on_error=None, write=False, **kwargs):
+        """Run fn(conn, *args, **kwargs) in the background; returns the request."""
+        if self._closed: raise RuntimeError("database worker is closed")
+        with self._lock:
+            gen = self._generations.get(channel, 0) + 1
+            if channel is not None: self._generations[channel] = gen
+        req = DbRequest(fn, args, kwargs, channel, gen, self._epoch, on_done, on_error)
+        (self._writes if write or not self._threads[1:] else self._reads).put(req)
+        return req
+
+    def wait_ready(self, timeout=None):
+        """Block until the schema is ready (only for tools and timing, never from Tk callbacks)."""
+        return self._ready.wait(timeout)
+
+    def cancel(self, channel):
+        """Mark everything queued or running on `channel` as stale."""
+        with self._lock:
+            self._generations[channel] = self._generations.get(channel, 0) + 1
+
+    def _stale(self, req):
+        if req.cancelled or req.epoch != self._epoch: return True
+        if req.channel is None: return False
+        with self._lock:
+            return self._generations.get(req.channel) != req.generation
+
+    # result delivery (Tk thread)
+    def poll(self, limit=100):
+        """Run callbacks for finished requests; returns how many were delivered."""
+        delivered = 0
+        while delivered < limit:
+            try: req, ok, value = self._results.get_nowait()
+            except queue.Empty: break
+            if self._stale(req): continue
+            delivered += 1
+            cb = req.on_done if ok else (req.on_error or self.on_error)
+            if cb is None:
+                if not ok: raise value
+                continue
+            cb(value)
+        return delivered
+
+    def attach(self, widget, interval_ms=15):
+        """Drain results from the widget's event loop every interval_ms."""
+        self._ticker += 1; ticker = self._ticker
+        def tick():
+            if self._closed or ticker != self._ticker: return
+            try: self.poll()
+            finally: widget.after(interval_ms, tick)
+        widget.after(interval_ms, tick)
+
+    def detach(self):
+        """Stop polling and drop the callbacks of everything submitted so far.
+
+        Queries still run (writes still land); only their results are discarded.
+        Used when a pooled worker goes idle because the app switched folders.
+        """
+        self._ticker += 1; self._epoch += 1
+        while True:
+            try: self._results.get_nowait()
+            except queue.Empty: break
+
+    def close(self, wait=False, timeout=5.0):
+        """Stop the threads after the queued work; wait=True joins them (connections closed)."""
+        if not self._closed:
+            self._closed = True
+            self._writes.put(_STOP)
+            for _ in self._threads[1:]: self._reads.put(_STOP)
+        if wait:
+            for t in self._threads: t.join(timeout)
+
+    # threads
+    def _execute(self, conn, req):
+        if self._stale(req): return
+        try:
+            with TRACER.span(f"db: {getattr(req.fn, '__name__', 'call')}", 'db'):
+                value = self._call(conn, req)
+            ok = True
+        except Exception as e:
+            try: conn.rollback()
+            except Exception: pass
+            value = e; ok = False
+        self._results.put((req, ok, value))
+
+    def _call(self, conn, req):
+        return req.fn(conn, *req.args, **req.kwargs)
+
+    def _run_writer(self):
+        started = time.perf_counter()
+        try:
+            conn = health_db.connect(self.db_path, storage=self.storage, factory=TracedConnection)
+        except Exception as e:
+            self._init_error = e; self._ready.set()
+            self._fail_queue(self._writes, e); return
+        self.connect_seconds = time.perf_counter() - started
+        self._ready.set()
+        try:
+            while True:
+                req = self._writes.get()
+                if req is _STOP: break
+                self._execute(conn, req)
+            try: conn.execute("PRAGMA optimize;")   # refresh planner stats for the next session
+            except sqlite3.Error: pass
+        finally:
+            conn.close()
+
+    def _run_reader(self):
+        self._ready.wait()   # let the writer create / migrate the schema first
+        if self._init_error is not None:
+            self._fail_queue(self._reads, self._init_error); return
+        conn = sqlite3.connect(self.db_path, factory=TracedConnection, cached_statements=health_db.CACHED_STATEMENTS)
+        health_db.apply_storage_profile(conn, self.storage or health_db.DEFAULT_STORAGE)
+        try:
+            while True:
+                req = self._reads.get()
+                if req is _STOP: break
+                self._execute(conn, req)
+        finally:
+            conn.close()
+
+    def _fail_queue(self, q, error):
+        while True:
+            req = q.get()
+            if req is _STOP: return
+            self._results.put((req, False, error))
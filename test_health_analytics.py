@@ -0,0 +1,45 @@
+"""The calendar's indexed goal lookups agree with the full goal timeline (python -m unittest)."""
+import calendar
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+import health_analytics
+import health_db
+
+class CalendarGoalsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.conn = health_db.connect(os.path.join(self.folder, health_db.DB_FILENAME))
+        self.pid = health_db.create_profile(self.conn, 'ann', 170, 70, 24.2, 'Normal', 2.5, 8000, '2024-01-01')
+        with self.conn:
+            self.conn.executemany("INSERT INTO measurements (profile_id, measured_at, height_cm, weight_kg, bmi, category, water_l, step_goal) "
+                                  "VALUES (?, ?, 170, 70, 24.2, 'Normal', ?, ?);",
+                                  [(self.pid, '2024-01-20 08:00:00', 2.0, 9000), (self.pid, '2024-01-20 19:00:00', 2.2, 9500),
+                                   (self.pid, '2024-02-03 10:00:00', 3.0, 10000), (self.pid, '2024-02-29 23:00:00', 3.0, 11000)])
+
+    def tearDown(self):
+        self.conn.close(); shutil.rmtree(self.folder)
+
+    def timeline_goals(self, kind, year, month):
+        changes = health_analytics.goal_timeline(self.conn, self.pid)[kind]
+        first = date(year, month, 1).toordinal(); goal = changes[0][1]; goals = []
+        for ordinal in range(first, first + calendar.monthrange(year, month)[1]):
+            goal = next((g for d, g in reversed(changes) if d <= ordinal), goal); goals.append(goal)
+        return goals
+
+    def test_month_goals_match_timeline(self):
+        for year, month in ((2023, 12), (2024, 1), (2024, 2), (2024, 3)):
+            for kind in health_db.LOG_TABLES:
+                with self.subTest(kind=kind, month=(year, month)):
+                    self.assertEqual(health_analytics.calendar_month(self.conn, self.pid, kind, year, month)[1],
+                                     self.timeline_goals(kind, year, month))
+
+    def test_goal_as_of_takes_last_change_of_the_day(self):
+        self.assertEqual(health_analytics.goals_as_of(self.conn, self.pid, date(2023, 6, 1)), {'steps': 9500, 'water': 2200.0})
+        self.assertEqual(health_analytics.goals_as_of(self.conn, self.pid, date(2024, 2, 10))['steps'], 10000)
+
+if __name__ == '__main__':
+    unittest.main()
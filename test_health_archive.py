@@ -0,0 +1,63 @@
+"""Rollups stay in step with the merged history across compaction (python -m unittest)."""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+import health_archive
+import health_db
+
+class CompactionTotalsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.conn = health_db.connect(os.path.join(self.folder, health_db.DB_FILENAME))
+        self.pid = health_db.create_profile(self.conn, 'ann', 170, 70, 24.2, 'Normal', 2.5, 8000, '2024-01-01')
+        with self.conn:
+            health_db.upsert_logs(self.conn, 'steps', [(self.pid, (date(2024, 1, 1) + timedelta(i)).isoformat(), 1000 + 100 * i)
+                                                       for i in range(10)])
+
+    def tearDown(self):
+        self.conn.close(); shutil.rmtree(self.folder)
+
+    def merged(self):
+        """(entries, average) of the archive merged with the live rows, the way readers see it."""
+        archive = health_archive.open_archive(self.folder, self.pid, 'steps')
+        live = [(date.fromisoformat(d).toordinal(), v) for d, v in
+                self.conn.execute("SELECT date, steps FROM steps WHERE profile_id=? ORDER BY date;", (self.pid,))]
+        values = [v for _, v in health_archive.merge_rows(archive.rows() if archive else [], live)]
+        return len(values), sum(values) / len(values)
+
+    def test_resaved_archived_day_replaces_archived_value(self):
+        health_archive.compact(self.conn, date(2024, 1, 6))
+        health_db.upsert_log(self.conn, 'steps', self.pid, '2024-01-02', 700)
+        self.assertEqual(health_db.log_stats(self.conn, self.pid, 'steps'), self.merged())
+        self.assertEqual(health_db.log_stats(self.conn, self.pid, 'steps'), (10, 1410.0))
+        month = health_db.rollups(self.conn, self.pid, 'steps', 'month')
+        self.assertEqual([(n, total) for _, n, total, _ in month], [(10, 14100)])
+        # deleting the live row brings the archived value back; compacting it again keeps the totals
+        with self.conn: self.conn.execute("DELETE FROM steps WHERE profile_id=? AND date='2024-01-02';", (self.pid,))
+        self.assertEqual(health_db.log_stats(self.conn, self.pid, 'steps'), (10, 1450.0))
+        health_db.upsert_log(self.conn, 'steps', self.pid, '2024-01-02', 700)
+        health_archive.compact(self.conn, date(2024, 1, 8))
+        self.assertEqual(health_db.log_stats(self.conn, self.pid, 'steps'), (10, 1410.0))
+        self.assertEqual(health_db.log_stats(self.conn, self.pid, 'steps'), self.merged())
+
+    def test_failed_compaction_leaves_archive_and_totals(self):
+        health_archive.compact(self.conn, date(2024, 1, 4))
+        health_db.upsert_log(self.conn, 'steps', self.pid, '2024-01-02', 700)
+        apply = health_archive._apply_rollup_deltas
+        def fail(*args): raise sqlite3.OperationalError("disk I/O error")
+        health_archive._apply_rollup_deltas = fail
+        try:
+            with self.assertRaises(sqlite3.OperationalError): health_archive.compact(self.conn, date(2024, 1, 7))
+        finally:
+            health_archive._apply_rollup_deltas = apply
+        self.assertEqual(len(health_archive.open_archive(self.folder, self.pid, 'steps')), 3)
+        health_archive.compact(self.conn, date(2024, 1, 7))
+        self.assertEqual(health_db.log_stats(self.conn, self.pid, 'steps'), (10, 1410.0))
+        self.assertEqual(health_db.log_stats(self.conn, self.pid, 'steps'), self.merged())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+"""Importer column matching (python -m unittest)."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import health_db
+import health_import
+
+class HeaderCaseTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.conn = health_db.connect(os.path.join(self.folder, health_db.DB_FILENAME))
+        self.pid = health_db.create_profile(self.conn, 'ann', 170, 70, 24.2, 'Normal', 2.5, 8000, '2024-01-01')
+
+    def tearDown(self):
+        self.conn.close(); shutil.rmtree(self.folder)
+
+    def write(self, text):
+        path = os.path.join(self.folder, 'export.csv')
+        with open(path, 'w', newline='') as fh: fh.write(text)
+        return path
+
+    def test_capitalized_header(self):
+        report = health_import.import_file(self.conn, self.write("Date,Steps\n2024-01-01,5000\n2024-01-02,6000\n"), profile_id=self.pid)
+        self.assertEqual((report.kind, report.rows_written, report.rows_rejected), ('steps', 2, 0))
+        self.assertEqual(health_db.log_stats(self.conn, self.pid, 'steps'), (2, 5500.0))
+
+    def test_capitalized_profile_column(self):
+        report = health_import.import_file(self.conn, self.write(f" Profile_ID ,DATE,ML\n{self.pid},2024-01-01,1500\n"))
+        self.assertEqual((report.kind, report.rows_written, report.rows_rejected), ('water', 1, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+"""Batch metrics agree with the scalar functions (python -m unittest)."""
+import math
+import unittest
+
+import health_metrics
+
+INF = float('inf'); NAN = float('nan')
+CASES = [(70, 170), (0, 170), (70, 0), (None, 170), (70, None), (None, None),
+         (NAN, 170), (70, NAN), (INF, 170), (70, INF), (-INF, 170), (1e308, 1e-150), (54.3, 181.2)]
+
+class BatchMatchesScalarTest(unittest.TestCase):
+    def check(self):
+        out = health_metrics.recommend_batch([w for w, _ in CASES], [h for _, h in CASES])
+        labels = health_metrics.category_labels(out['category'])
+        for i, (w, h) in enumerate(CASES):
+            bmi, cat, water, steps = health_metrics.profile_metrics(w, h)
+            got = float(out['bmi'][i])
+            with self.subTest(weight=w, height=h):
+                self.assertEqual(None if math.isnan(got) else got, bmi)
+                self.assertEqual((labels[i], float(out['water_l'][i]), int(out['step_goal'][i])), (cat, water, steps))
+
+    def test_numpy(self):
+        if not health_metrics._have_numpy(): self.skipTest("numpy not installed")
+        self.check()
+
+    def test_pure_python(self):
+        health_metrics._have_numpy()
+        saved = health_metrics.np; health_metrics.np = None
+        try: self.check()
+        finally: health_metrics.np = saved
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""CombinedView over folders of different schema versions (python -m unittest)."""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import health_db
+import health_pool
+
+class CombinedViewTest(unittest.TestCase):
+    def setUp(self):
+        self.folders = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        self.paths = [os.path.join(f, health_db.DB_FILENAME) for f in self.folders]
+        for i, path in enumerate(self.paths):
+            conn = health_db.connect(path)
+            health_db.create_profile(conn, f'p{i}', 170, 70, 24.2, 'Normal', 2.5, 8000, '2024-01-01')
+            health_db.upsert_log(conn, 'steps', 1, '2024-01-02', 5000 + i)
+            conn.close()
+
+    def tearDown(self):
+        for f in self.folders: shutil.rmtree(f)
+
+    def test_combines_current_sources(self):
+        with health_pool.CombinedView(self.paths) as view:
+            self.assertEqual([(r[2], r[5]) for r in view.profile_summary()], [('p0', 5000.0), ('p1', 5001.0)])
+
+    def test_older_source_names_the_folder(self):
+        # a folder last opened by the first release: base tables only, user_version 0
+        os.remove(self.paths[1])
+        with sqlite3.connect(self.paths[1]) as old:
+            old.executescript("""
+                CREATE TABLE profiles (id INTEGER PRIMARY KEY, name TEXT UNIQUE, height_cm REAL, weight_kg REAL, bmi REAL,
+                                       category TEXT, water_l REAL, step_goal INTEGER, created_at TEXT);
+                CREATE TABLE steps (id INTEGER PRIMARY KEY, profile_id INTEGER, date TEXT, steps INTEGER, UNIQUE(profile_id, date));
+                CREATE TABLE water_logs (id INTEGER PRIMARY KEY, profile_id INTEGER, date TEXT, ml INTEGER, UNIQUE(profile_id, date));
+                INSERT INTO profiles VALUES (1, 'p1', 170, 70, 24.2, 'Normal', 2.5, 8000, '2024-01-01');
+                INSERT INTO steps (profile_id, date, steps) VALUES (1, '2024-01-02', 5001);""")
+        old.close()
+        with self.assertRaises(health_pool.CombinedViewError) as cm: health_pool.CombinedView(self.paths)
+        self.assertIn(self.folders[1], str(cm.exception))
+        # opening it once migrates it, after which it combines
+        health_db.connect(self.paths[1]).close()
+        with health_pool.CombinedView(self.paths) as view: self.assertEqual(view.profile_summary()[1][5], 5001.0)
+
+if __name__ == '__main__':
+    unittest.main()